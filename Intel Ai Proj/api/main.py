@@ -1,9 +1,18 @@
+import gzip
+import io
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from api.routes import document_routes, query_routes
 from generation.llm_engine import PDFQueryEngine
+from monitoring.metrics import REGISTRY
+from api.serialization import DefaultResponse
+from starlette.datastructures import Headers, MutableHeaders
 
-app = FastAPI(title="Enterprise PDF Knowledge Base API", version="1.0.0")
+# orjson-backed responses when orjson is installed, stdlib json otherwise
+app = FastAPI(title="Enterprise PDF Knowledge Base API", version="1.0.0",
+              default_response_class=DefaultResponse)
 
 # Configure CORS for frontend
 app.add_middleware(
@@ -14,12 +23,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load engine on startup to avoid reloading per request
+# Streamed media types: each event / line must reach the client as produced
+STREAMING_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
+class _GZipExceptStreams:
+    """
+    gzip bodies over minimum_size (answers + sources, chunk lists) but never
+    streamed responses: Server-Sent Events and the NDJSON batch endpoint.
+    gzip buffers output and would hold back tokens and completed answers.
+
+    Decided per response from its Content-Type, so every streaming route is
+    covered whatever its path.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http"
+                or "gzip" not in Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False, "gzip": None, "buffer": None}
+
+        async def send_maybe_gzip(message):
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if media_type in STREAMING_MEDIA_TYPES or "content-encoding" in headers:
+                    state["passthrough"] = True
+                    await send(message)
+                else:
+                    state["start"] = message   # held until the first body decides
+                return
+            if state["passthrough"] or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start, state["start"] = state["start"], None
+            if state["gzip"] is None:
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                state["buffer"] = io.BytesIO()
+                state["gzip"] = gzip.GzipFile(mode="wb", fileobj=state["buffer"],
+                                              compresslevel=self.compresslevel)
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+                del headers["Content-Length"]
+
+            state["gzip"].write(body)
+            if more_body:
+                state["gzip"].flush()
+            else:
+                state["gzip"].close()
+            compressed = state["buffer"].getvalue()
+            state["buffer"].seek(0)
+            state["buffer"].truncate()
+            if start is not None:
+                if not more_body:
+                    MutableHeaders(scope=start)["Content-Length"] = str(len(compressed))
+                await send(start)
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_maybe_gzip)
+        if state["start"] is not None:   # the app never sent a body
+            await send(state["start"])
+
+app.add_middleware(_GZipExceptStreams, minimum_size=1024)
+
+def _load_engine(engine: PDFQueryEngine):
+    try:
+        engine.load()
+        print("LLM Engine loaded successfully.")
+    except Exception as exc:
+        print(f"LLM Engine failed to load: {exc}")
+
+# Load engine on startup to avoid reloading per request. Components load
+# concurrently in the background so /health answers immediately and /ready
+# reports progress until the instance is warm.
 @app.on_event("startup")
 async def startup_event():
     print("Loading LLM Engine...")
-    app.state.engine = PDFQueryEngine()
-    print("LLM Engine loaded successfully.")
+    app.state.engine = PDFQueryEngine(load=False)
+    threading.Thread(
+        target=_load_engine, args=(app.state.engine,), name="engine-loader", daemon=True
+    ).start()
 
 # Include routers
 app.include_router(document_routes.router, prefix="/api")
@@ -29,6 +126,27 @@ app.include_router(query_routes.router, prefix="/api")
 async def health_check():
     return {"status": "ok", "message": "API is running"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Per-component load state and timings; 503 until every component is warm."""
+    engine = getattr(app.state, "engine", None)
+    if engine is None:
+        return JSONResponse(status_code=503, content={"ready": False, "components": {}})
+    ready = engine.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "load_seconds": engine.load_seconds,
+            "components": engine.readiness
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition: per-stage latency histograms and counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,57 +1,82 @@
+from typing import Optional
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 import os
 import shutil
 
+from monitoring.tracing import DebugSession, DEBUG_MODES
+from runtime.thread_budget import BUDGET
+
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_document(request: Request, file: UploadFile = File(...)):
+async def upload_document(request: Request, file: UploadFile = File(...),
+                          summarize: bool = True, debug: Optional[str] = None):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    if debug is not None and debug not in DEBUG_MODES:
+        raise HTTPException(status_code=400,
+                            detail=f"debug must be one of: {', '.join(DEBUG_MODES)}")
 
-    # Save PDF
-    os.makedirs("storage", exist_ok=True)
-    pdf_path = os.path.join("storage", file.filename)
-    
-    with open(pdf_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    engine = getattr(request.app.state, "engine", None)
 
-    try:
+    def ingest():
         from ingestion.pdf_reader import extract_pages
         from ingestion.chunker import semantic_chunk
-        from retrieval.vector_store import VectorStore
-        from retrieval.bm25_store import BM25Store
+        from ingestion.entity_extractor import extract_entities
+        from retrieval.index_generations import IndexGenerations
+
+        # Save PDF
+        os.makedirs("storage", exist_ok=True)
+        pdf_path = os.path.join("storage", file.filename)
+        with open(pdf_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
 
-        print(f"Extracting pages from {file.filename}...")
-        pages = extract_pages(pdf_path)
-        if not pages or all(len(p["text"].strip()) == 0 for p in pages):
-            raise HTTPException(status_code=400, detail="No text extracted. Scanned PDF?")
+        # Build into the live engine's index generations when it is up, so
+        # the new indexes are published to it atomically
+        indexes = engine.retriever.indexes if engine is not None else IndexGenerations()
 
-        print("Chunking into semantic units...")
-        chunks = semantic_chunk(pages)
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Chunking produced no results.")
+        # Counted against the CPU budget's ingest side while it runs
+        with DebugSession("upload", debug) as session, BUDGET.task("ingest"):
+            print(f"Extracting pages from {file.filename}...")
+            pages = extract_pages(pdf_path)
+            if not pages or all(len(p["text"].strip()) == 0 for p in pages):
+                raise HTTPException(status_code=400, detail="No text extracted. Scanned PDF?")
 
-        # Re-build indexes
-        print("Building vector index...")
-        vs = VectorStore()
-        vs.clear()
-        vs.add_documents(chunks)
+            print("Chunking into semantic units...")
+            chunks = semantic_chunk(pages)
+            if not chunks:
+                raise HTTPException(status_code=400, detail="Chunking produced no results.")
+
+            # Build a new index generation next to the serving one;
+            # queries keep using the old indexes until it is published
+            print("Building vector, BM25 and entity indexes...")
+            gen = indexes.build(chunks, extract_entities(chunks))
+            indexes.publish(gen)
+        return pages, chunks, gen, session.report()
+
+    try:
+        # Off the event loop: queries, /ready and /metrics keep being served
+        # while the upload is parsed, embedded and indexed
+        pages, chunks, gen, report = await run_in_threadpool(ingest)
 
-        print("Building BM25 index...")
-        bm25 = BM25Store()
-        bm25.build(chunks)
-        
-        # If engine is already loaded, update its retriever instances
-        if hasattr(request.app.state, "engine"):
-            request.app.state.engine.retriever.vector_store = vs
-            request.app.state.engine.retriever.bm25_store = bm25
+        # Optional background stage: hierarchical summaries (skipped if unchanged)
+        summaries = "disabled"
+        if summarize and engine is not None and engine.is_ready():
+            queued = engine.summaries.schedule(pages)
+            summaries = "scheduled" if queued else "current"
 
-        return {
+        response = {
             "message": "Upload successful and knowledge base built.",
             "filename": file.filename,
-            "chunks_count": len(chunks)
+            "chunks_count": len(chunks),
+            "entities_count": gen.entity_index.count(),
+            "index_generation": gen.gen_id,
+            "summaries": summaries
         }
+        if report is not None:
+            response["debug"] = report   # ?debug=trace|profile
+        return response
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
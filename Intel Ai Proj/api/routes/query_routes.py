@@ -1,26 +1,189 @@
+from typing import List, Optional
 from fastapi import APIRouter, Request, HTTPException
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from generation.profiles import PROFILES, DEFAULT_PROFILE, get_profile
+from generation.scheduler import QueueFullError, DeadlineExceededError
+from monitoring.tracing import DebugSession, DEBUG_MODES
+from runtime.thread_budget import BUDGET
+from api.serialization import dumps, shape_sources
 
-class QueryRequest(BaseModel):
+class ResponseShape(BaseModel):
+    """How much of each source to return (default: everything)."""
+    snippet_chars: Optional[int] = Field(None, ge=1)   # cut source text to N chars
+    fields: Optional[List[str]] = None     # keep only these source keys
+    ids_only: bool = False                 # sources as chunk IDs; see /chunks/{id}
+
+    def apply(self, sources):
+        return shape_sources(sources, self.snippet_chars, self.fields, self.ids_only)
+
+class QueryRequest(ResponseShape):
     query: str
+    profile: str = DEFAULT_PROFILE
+    deadline_s: Optional[float] = None
+
+class BatchQueryRequest(ResponseShape):
+    queries: List[str]
+    profile: str = DEFAULT_PROFILE
+    deadline_s: Optional[float] = None   # per generation, from when it is queued
+
+MAX_BATCH_QUERIES = 1000
 
 router = APIRouter()
 
+def _get_engine(request: Request):
+    engine = getattr(request.app.state, "engine", None)
+    if not engine:
+        raise HTTPException(status_code=500, detail="Engine not loaded yet")
+    if not engine.is_ready():
+        raise HTTPException(status_code=503, detail="Engine warming up; see /ready",
+                            headers={"Retry-After": "5"})
+    return engine
+
+def _check_debug(debug: Optional[str]):
+    if debug is not None and debug not in DEBUG_MODES:
+        raise HTTPException(status_code=400,
+                            detail=f"debug must be one of: {', '.join(DEBUG_MODES)}")
+
 @router.post("/query")
-async def ask_question(request: Request, body: QueryRequest):
+async def ask_question(request: Request, body: QueryRequest, debug: Optional[str] = None):
+    """
+    ?debug=trace adds the request's span tree under "debug";
+    ?debug=profile also writes a folded-stack profile (path in "debug").
+    """
     query = body.query.strip()
     if not query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
+    try:
+        get_profile(body.profile)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    _check_debug(debug)
         
-    engine = getattr(request.app.state, "engine", None)
-    if not engine:
-        raise HTTPException(status_code=500, detail="Engine not loaded yet")
+    engine = _get_engine(request)
+
+    def run():
+        with DebugSession("query", debug) as session:
+            answer, sources = engine.answer_question(
+                query, profile=body.profile, deadline_s=body.deadline_s
+            )
+        return answer, sources, session.report()
 
     try:
-        answer, sources = engine.answer_question(query)
-        return {
+        # Run off the event loop so queries are served concurrently; the
+        # engine's scheduler serialises the LLM itself.
+        answer, sources, report = await run_in_threadpool(run)
+        response = {
             "answer": answer,
-            "sources": sources
+            "sources": body.apply(sources),
+            "profile": body.profile
         }
+        if report is not None:
+            response["debug"] = report
+        return response
+    except QueueFullError as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "5"})
+    except DeadlineExceededError as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
+
+@router.post("/query/stream")
+async def ask_question_stream(request: Request, body: QueryRequest):
+    """
+    Server-Sent Events stream: one "sources" event, then "token" events as
+    the LLM decodes, then a final "done" event with the cleaned answer.
+    """
+    query = body.query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    try:
+        get_profile(body.profile)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    engine = _get_engine(request)
+
+    if engine.scheduler.at_capacity():
+        raise HTTPException(status_code=503, detail="Generation queue full. Retry shortly.",
+                            headers={"Retry-After": "5"})
+
+    def event_source():
+        try:
+            for event in engine.stream_answer(query, profile=body.profile,
+                                              deadline_s=body.deadline_s):
+                data = body.apply(event["data"]) if event["event"] == "sources" else event["data"]
+                yield f"event: {event['event']}\ndata: {dumps(data)}\n\n"
+        except Exception as exc:
+            yield f"event: error\ndata: {dumps({'detail': str(exc)})}\n\n"
+
+    # A sync generator is iterated in the threadpool, so decoding never
+    # blocks the event loop.
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query/batch")
+async def ask_questions_batch(request: Request, body: BatchQueryRequest):
+    """
+    Answer a list of questions with batched retrieval and generation.
+
+    Streams JSON lines in completion order, one per question:
+      {"index", "question", "answer", "sources"}  or
+      {"index", "question", "error", "status"}
+    """
+    if not body.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(body.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413,
+                            detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    try:
+        get_profile(body.profile)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    engine = _get_engine(request)
+
+    def json_lines():
+        try:
+            for result in engine.answer_batch(body.queries, profile=body.profile,
+                                              deadline_s=body.deadline_s):
+                if "sources" in result:
+                    result["sources"] = body.apply(result["sources"])
+                yield dumps(result) + "\n"
+        except Exception as exc:
+            yield dumps({"error": str(exc), "status": 500}) + "\n"
+
+    # Sync generator -> iterated in the threadpool, off the event loop
+    return StreamingResponse(json_lines(), media_type="application/x-ndjson")
+
+@router.get("/chunks/{chunk_id}")
+async def get_chunk(request: Request, chunk_id: str):
+    """Full text + metadata of a source returned by ID (ids_only / chunk_id)."""
+    engine = _get_engine(request)
+    chunk = engine.retriever.get_chunk(chunk_id)
+    if chunk is None:
+        raise HTTPException(status_code=404, detail=f"Unknown chunk '{chunk_id}'")
+    return chunk
+
+@router.get("/profiles")
+async def list_profiles():
+    return {"default": DEFAULT_PROFILE, "profiles": PROFILES}
+
+@router.get("/stats")
+async def retrieval_stats(request: Request):
+    engine = _get_engine(request)
+    stats = {
+        "rerank": engine.retriever.rerank_stats(),
+        "indexes": engine.retriever.indexes.stats(),
+        "generation_queue": engine.scheduler.stats(),
+        "cpu_budget": BUDGET.stats()
+    }
+    if engine.pool is not None:
+        stats["llm_pool"] = engine.pool.stats()
+    if engine.prefix_cache is not None:
+        stats["prompt_prefix"] = engine.prefix_cache.stats()
+    return stats
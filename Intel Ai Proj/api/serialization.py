@@ -0,0 +1,57 @@
+"""
+Response serialization and shaping.
+
+- orjson (optional, `pip install orjson`) serializes the answer / sources
+  payloads several times faster than the stdlib encoder; without it we fall
+  back to json transparently
+- shape_sources trims what each source carries: snippet length, selected
+  fields, or just chunk IDs (full text via GET /api/chunks/{id})
+"""
+from typing import Dict, List, Optional, Union
+import json
+
+from fastapi.responses import JSONResponse
+from retrieval.chunk_store import chunk_id
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    orjson = None
+    DefaultResponse = JSONResponse
+
+
+def dumps(obj) -> str:
+    """JSON text for streamed lines / SSE events (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+def shape_sources(
+    sources: List[Dict],
+    snippet_chars: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    ids_only: bool = False
+) -> List[Union[Dict, str]]:
+    """
+    Args:
+        snippet_chars: Cut each source "text" to this many characters
+        fields:        Keep only these keys (e.g. ["chunk_id", "page", "rerank_score"])
+        ids_only:      Return just the chunk IDs; sources without one
+                       (precomputed summaries) are dropped
+    """
+    shaped = []
+    for src in sources:
+        if "chunk_index" in src:
+            src = dict(src, chunk_id=chunk_id(src))
+        if ids_only:
+            if "chunk_id" in src:
+                shaped.append(src["chunk_id"])
+            continue
+        if snippet_chars is not None and len(src.get("text", "")) > snippet_chars:
+            src = dict(src, text=src["text"][:snippet_chars].rstrip() + "…")
+        if fields is not None:
+            src = {k: src[k] for k in fields if k in src}
+        shaped.append(src)
+    return shaped
@@ -15,6 +15,9 @@ import time
 from tinydb import TinyDB, Query
 import pandas as pd
 
+from runtime.thread_budget import BUDGET
+from generation.scheduler import QueueFullError, DeadlineExceededError
+
 # ── Page config ──────────────────────────────────────────────────────────────
 st.set_page_config(
     page_title="Enterprise PDF Knowledge Base",
@@ -124,6 +127,7 @@ def _render_sources(sources: list):
             )
 
 
+@BUDGET.task("ingest")
 def _run_ingestion(pdf_file):
     """Full ingestion pipeline: extract → chunk → index (vector + BM25)."""
     # Save PDF
@@ -154,28 +158,42 @@ def _run_ingestion(pdf_file):
                 st.error("Chunking produced no results. Check the PDF content.")
                 return
 
-            # Step 3: Build ChromaDB vector index
+            # Steps 3-5 build a new index generation next to the serving one,
+            # in the manager the cached engine serves from
+            indexes = load_indexes()
+            gen = indexes.new_generation()
+
+            # Step 3: Chunk store (the one copy of the text) + ChromaDB vector index
             st.write("🧠 Building vector index (ChromaDB)...")
-            from retrieval.vector_store import VectorStore
-            vs = VectorStore()
-            vs.clear()
-            vs.add_documents(chunks)
+            gen.build_chunks(chunks)
+            gen.build_vectors(chunks)
             st.write(f"✅ {len(chunks)} chunks indexed in ChromaDB")
 
             # Step 4: Build BM25 keyword index
             st.write("🔑 Building BM25 keyword index...")
-            from retrieval.bm25_store import BM25Store
-            bm25 = BM25Store()
-            bm25.build(chunks)
+            gen.build_bm25(chunks)
             st.write("✅ BM25 index built")
 
+            # Step 5: Entity index for instant factual answers
+            st.write("🏷️ Indexing dates, times, amounts, IDs and emails...")
+            from ingestion.entity_extractor import extract_entities
+            gen.build_entities(extract_entities(chunks))
+            st.write(f"✅ {gen.entity_index.count()} entities indexed")
+
+            from retrieval.shards import RETRIEVAL_SHARDS
+            if RETRIEVAL_SHARDS > 1:
+                gen.build_shards(RETRIEVAL_SHARDS)
+
+            # Atomically switch to the new generation (live in the engine too)
+            indexes.publish(gen)
+
             # Update session state
             st.session_state.current_file = pdf_file.name
             st.session_state.chunk_count = len(chunks)
             st.session_state.messages = []   # clear chat history for new doc
-
-            # Reload the QA engine with fresh indexes
-            st.cache_resource.clear()
+            if st.session_state.get("precompute_summaries", True):
+                # picked up once the reloaded engine is available
+                st.session_state.pending_summary_pages = pages
 
             status.update(label="✅ Knowledge base ready!", state="complete")
             time.sleep(1)
@@ -187,10 +205,21 @@ def _run_ingestion(pdf_file):
             st.code(traceback.format_exc())
 
 
+@st.cache_resource(show_spinner=False)
+def load_indexes():
+    """
+    The process-wide index generation manager, shared by every session's
+    ingestion and the engine. A second manager would treat the first one's
+    in-progress and serving generations as stale and delete them.
+    """
+    from retrieval.index_generations import IndexGenerations
+    return IndexGenerations()
+
+
 @st.cache_resource(show_spinner="Loading AI engine...")
 def load_engine():
     from generation.llm_engine import PDFQueryEngine
-    return PDFQueryEngine()
+    return PDFQueryEngine(indexes=load_indexes())
 
 
 
@@ -222,6 +251,21 @@ with st.sidebar:
 
     st.divider()
 
+    # ── Latency profile ───────────────────────────────────────────────────────
+    from generation.profiles import PROFILES, DEFAULT_PROFILE
+    profile = st.selectbox(
+        "⚡ Answer profile",
+        list(PROFILES),
+        index=list(PROFILES).index(DEFAULT_PROFILE),
+        format_func=lambda name: name.capitalize(),
+        help="fast: no reranker, extractive answer · "
+             "balanced: adaptive reranking + LLM · "
+             "accurate: full reranking + LLM"
+    )
+    st.caption(PROFILES[profile]["description"])
+
+    st.divider()
+
     # ── File uploader ─────────────────────────────────────────────────────────
     pdf_file = st.file_uploader("Upload PDF", type=["pdf"])
 
@@ -231,6 +275,14 @@ with st.sidebar:
         else:
             st.success(f"✅ Indexed: **{pdf_file.name}**  ({st.session_state.chunk_count} chunks)")
 
+        st.checkbox(
+            "Precompute summaries (background)",
+            value=True,
+            key="precompute_summaries",
+            help="Summaries are generated after indexing so 'Summarize the "
+                 "document' answers instantly. Unchanged documents are skipped."
+        )
+
         if st.button("🔨 Build / Reset Knowledge Base", use_container_width=True):
             _run_ingestion(pdf_file)
     else:
@@ -265,6 +317,9 @@ except Exception as exc:
     st.info("Make sure all dependencies are installed: `pip install -r requirements.txt`")
     st.stop()
 
+if st.session_state.get("pending_summary_pages"):
+    engine.summaries.schedule(st.session_state.pop("pending_summary_pages"))
+
 
 # ── Chat history ──────────────────────────────────────────────────────────────
 for msg in st.session_state.messages:
@@ -289,12 +344,32 @@ if prompt := st.chat_input("Ask anything about your document..."):
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Generate answer
+    # Generate answer (tokens render as the LLM produces them)
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            answer, sources = engine.answer_question(prompt)
-
-        st.markdown(answer)
+        sources: list = []
+        final: dict = {}
+
+        def _tokens():
+            for event in engine.stream_answer(prompt, profile=profile):
+                if event["event"] == "sources":
+                    sources.extend(event["data"])
+                elif event["event"] == "token":
+                    yield event["data"]
+                elif event["event"] == "done":
+                    final.update(event["data"])
+
+        slot = st.empty()
+        try:
+            streamed = slot.write_stream(_tokens())
+        except QueueFullError:
+            st.warning("⏳ Too many questions are waiting for the model. Please try again in a moment.")
+            st.stop()
+        except DeadlineExceededError:
+            st.warning("⌛ The answer took too long to generate. Try again, or pick the fast profile.")
+            st.stop()
+        answer = final.get("answer", streamed)
+        if answer != streamed:
+            slot.markdown(answer)   # post-processing replaced the raw output
         if sources:
             _render_sources(sources)
 
@@ -0,0 +1,81 @@
+"""
+Recall / latency benchmark: hierarchical (coarse-to-fine) vs flat retrieval.
+
+Queries are sampled from the serving index itself: the first words of a
+random chunk, so every query has a known "home" chunk. For each doc_fanout
+the benchmark reports
+  recall@k vs flat   overlap of the hierarchical top-k with the flat top-k
+  home hit rate      queries whose home chunk is in the top-k
+  p50 / p95 ms       retrieval latency (dense + BM25 + fusion, no reranker)
+
+Build a multi-document index first (python -m ingestion.cli corpus/), then
+run from the project root:
+    python -m benchmarks.hierarchical_recall --queries 200 --fanouts 5 10 20
+"""
+import argparse
+import random
+import statistics
+import time
+
+from retrieval.hybrid_retriever import HybridRetriever
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(retriever, queries, top_k, fanout):
+    results, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = retriever.retrieve(query, top_k=top_k, dense_k=top_k, bm25_k=top_k,
+                                  rerank=False, doc_fanout=fanout)
+        times.append((time.perf_counter() - start) * 1000)
+        results.append([h["chunk_id"] for h in hits])
+    return results, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200, help="Sampled queries")
+    parser.add_argument("--words", type=int, default=12, help="Words per sampled query")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--fanouts", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    retriever = HybridRetriever(load=False)
+    retriever.load_vector_store()
+    retriever.indexes.load_bm25()
+    if not retriever.indexes.load_documents():
+        print("No document index in the serving generation: re-ingest to build it.")
+        return
+
+    chunks = list(retriever.chunk_store.iter_chunks())
+    rng = random.Random(args.seed)
+    sample = rng.sample(chunks, min(args.queries, len(chunks)))
+    queries = [" ".join(c["text"].split()[:args.words]) for c in sample]
+    homes = [c["chunk_id"] for c in sample]
+    print(f"{len(chunks)} chunks in {retriever.indexes.current().document_index.count()} "
+          f"documents, {len(queries)} queries, top-{args.top_k}\n")
+
+    flat, flat_ms = run(retriever, queries, args.top_k, None)
+    print(f"{'mode':<14}{'recall@k':>10}{'home hit':>10}{'p50 ms':>10}{'p95 ms':>10}")
+
+    def report(label, results, times):
+        recall = statistics.mean(
+            len(set(r) & set(f)) / len(f) if f else 1.0 for r, f in zip(results, flat)
+        )
+        home = statistics.mean(h in r for h, r in zip(homes, results))
+        print(f"{label:<14}{recall:>10.3f}{home:>10.3f}"
+              f"{statistics.median(times):>10.1f}{_percentile(times, 95):>10.1f}")
+
+    report("flat", flat, flat_ms)
+    for fanout in args.fanouts:
+        results, times = run(retriever, queries, args.top_k, fanout)
+        report(f"fanout={fanout}", results, times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Import-time budget for the service entry points.
+
+Each entry point is imported in a fresh interpreter (so nothing is already
+cached in sys.modules) and checked for two things:
+
+  - wall-clock import time stays under its budget
+  - none of the heavy ML libraries were pulled in at import — torch,
+    transformers, sentence-transformers, chromadb and llama-cpp must only
+    be imported when a model is actually loaded
+
+Exits non-zero if any entry point is over budget or imports a heavy
+module, so it can gate CI / pre-release checks.
+
+Run from the project root:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --verbose     # top offenders via -X importtime
+The same budgets are enforced by tests/test_import_budget.py.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# module -> budget in seconds (warm disk cache, single import)
+ENTRY_POINTS = {
+    "api.main": 1.5,                 # FastAPI app; fastapi + pydantic dominate
+    "ingestion.cli": 0.3,            # ingestion CLI (deps load inside main())
+    "generation.worker_pool": 0.3,   # what each spawned Phi-3 worker imports first
+}
+
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "chromadb", "llama_cpp")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    """Import a module in a fresh interpreter; returns seconds + heavy modules seen."""
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, cwd=PROJECT_ROOT
+    )
+    if proc.returncode != 0:
+        err = proc.stderr.strip().splitlines()
+        return {"error": err[-1] if err else f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def top_imports(module: str, n: int = 10) -> list:
+    """Largest cumulative imports reported by `python -X importtime`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=PROJECT_ROOT
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every budget (e.g. 2.0 on slow CI machines)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show the slowest imports of each entry point")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'entry point':<26}{'import s':>10}{'budget s':>10}  result")
+    for module, budget in ENTRY_POINTS.items():
+        budget *= args.scale
+        res = measure(module)
+        if "error" in res:
+            failed = True
+            print(f"{module:<26}{'-':>10}{budget:>10.2f}  ERROR: {res['error']}")
+            continue
+        problems = []
+        if res["seconds"] > budget:
+            problems.append("over budget")
+        if res["heavy"]:
+            problems.append("imports " + ", ".join(res["heavy"]))
+        failed = failed or bool(problems)
+        print(f"{module:<26}{res['seconds']:>10.3f}{budget:>10.2f}  "
+              f"{'; '.join(problems) or 'ok'}")
+        if args.verbose:
+            for us, name in top_imports(module):
+                print(f"    {us / 1e6:8.3f}s  {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
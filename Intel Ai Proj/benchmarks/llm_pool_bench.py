@@ -0,0 +1,84 @@
+"""
+Throughput benchmark for the multi-process Phi-3 worker pool.
+
+Runs the same batch of prompts through pools of different sizes (each
+worker gets cpu_count / N threads) and reports aggregate throughput.
+
+Run from the project root:
+    python -m benchmarks.llm_pool_bench --sizes 1 2 4 --requests 16
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from generation.llm_engine import (MODEL_PATH, PHI3_N_CTX, PHI3_N_BATCH, _PHI3_PREFIX,
+                                   _SYS_END, _ASST_OPEN)
+from generation.worker_pool import LLMWorkerPool
+
+
+SAMPLE_CONTEXT = (
+    "[Page 1] The KHacks 3.0 hackathon was held on 14 March 2024 at the main "
+    "auditorium. Over 300 students from 40 colleges took part in 36-hour "
+    "challenges covering AI, web development and IoT. The winning team built "
+    "an offline document assistant for rural clinics."
+)
+QUESTIONS = [
+    "When was the hackathon held?",
+    "How many students took part?",
+    "What did the winning team build?",
+    "Summarize the event.",
+]
+
+
+def _prompt(question: str) -> str:
+    return (f"{_PHI3_PREFIX}{SAMPLE_CONTEXT}\n\nQuestion: {question}\n\n"
+            f"Answer:{_SYS_END}\n{_ASST_OPEN}\n")
+
+
+def bench(pool_size: int, n_requests: int, max_tokens: int) -> dict:
+    pool = LLMWorkerPool(MODEL_PATH, pool_size, n_ctx=PHI3_N_CTX, n_batch=PHI3_N_BATCH,
+                         prefix=_PHI3_PREFIX)
+    pool.start()
+    params = dict(max_tokens=max_tokens, temperature=0.0, stop=[_SYS_END])
+    prompts = [_prompt(QUESTIONS[i % len(QUESTIONS)]) for i in range(n_requests)]
+    try:
+        pool.generate(prompts[0], params)   # warm page cache
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=pool_size) as ex:
+            outputs = list(ex.map(lambda p: pool.generate(p, params), prompts))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+    words = sum(len(o.split()) for o in outputs)
+    return {
+        "workers": pool_size,
+        "threads_per_worker": pool.threads_per_worker,
+        "seconds": round(elapsed, 2),
+        "req_per_s": round(n_requests / elapsed, 3),
+        "words_per_s": round(words / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    if not os.path.exists(MODEL_PATH):
+        raise SystemExit(f"Model not found at {MODEL_PATH}")
+
+    print(f"{'workers':>8} {'thr/wkr':>8} {'seconds':>8} {'req/s':>8} {'words/s':>8}")
+    baseline = None
+    for size in args.sizes:
+        r = bench(size, args.requests, args.max_tokens)
+        baseline = baseline or r["req_per_s"]
+        print(f"{r['workers']:>8} {r['threads_per_worker']:>8} {r['seconds']:>8} "
+              f"{r['req_per_s']:>8} {r['words_per_s']:>8}   "
+              f"x{r['req_per_s'] / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Mixed-load benchmark: queries answered while an ingest runs, with and
+without the CPU thread budget (runtime/thread_budget.py).
+
+Each mode runs the same workload:
+  ingest side   one thread re-ingesting a PDF in a loop (text extraction /
+                OCR, chunking, chunk embedding; nothing is published,
+                only the PDF's rows in the table store are rewritten)
+  query side    --concurrency threads answering --requests questions
+and reports query throughput, p50 / p95 latency and ingest pages/s.
+"off" is the previous behaviour: llama.cpp, torch and tesseract each size
+their threads for the whole machine.
+
+Run from the project root with a knowledge base built:
+    python -m benchmarks.mixed_load storage/report.pdf --requests 24 --concurrency 2
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from generation.llm_engine import PDFQueryEngine
+from runtime.thread_budget import BUDGET
+
+
+QUESTIONS = [
+    "What is this document about?",
+    "When was the event held?",
+    "Who is the author?",
+    "Summarize the key findings.",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _ingest_loop(pdf_path, embedder, ocr, stop, counts):
+    from ingestion.pdf_reader import extract_pages
+    from ingestion.chunker import semantic_chunk
+    from retrieval.embedding_pool import encode_texts
+    from retrieval.vector_store import EMBEDDING_MODEL
+
+    while not stop.is_set():
+        with BUDGET.task("ingest"):
+            pages = extract_pages(pdf_path, use_ocr=ocr)
+            chunks = semantic_chunk(pages)
+            if chunks:
+                encode_texts([c["text"] for c in chunks], embedder, EMBEDDING_MODEL, workers=1)
+        counts["pages"] += len(pages)
+
+
+def bench(engine, pdf_path, enabled, n_requests, concurrency, profile, ocr):
+    BUDGET.enabled = enabled
+    engine.retriever.rerank_cache.clear()   # every mode scores the same pairs
+    stop = threading.Event()
+    counts = {"pages": 0}
+    embedder = engine.retriever.vector_store.embedding_model
+    ingest = threading.Thread(target=_ingest_loop, args=(pdf_path, embedder, ocr, stop, counts),
+                              daemon=True)
+    latencies = []
+
+    def ask(i):
+        start = time.perf_counter()
+        engine.answer_question(QUESTIONS[i % len(QUESTIONS)], profile=profile)
+        latencies.append(time.perf_counter() - start)
+
+    ingest.start()
+    time.sleep(1.0)   # let the ingest reach its steady state
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(ask, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    ingest.join()
+    return {
+        "budget": "on" if enabled else "off",
+        "q_per_s": n_requests / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": _percentile(latencies, 95),
+        "pages_per_s": counts["pages"] / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pdf", help="PDF re-ingested in the background")
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--profile", default="balanced")
+    parser.add_argument("--ocr", action="store_true", help="OCR sparse pages during ingest")
+    args = parser.parse_args()
+
+    engine = PDFQueryEngine()
+    for q in QUESTIONS:   # page in weights and kernels before timing
+        engine.answer_question(q, profile=args.profile)
+
+    print(f"{BUDGET.total} cores, ingest share {BUDGET.ingest_share}\n")
+    print(f"{'budget':<8}{'q/s':>8}{'p50 s':>8}{'p95 s':>8}{'pages/s':>9}")
+    results = []
+    for enabled in (False, True):
+        r = bench(engine, args.pdf, enabled, args.requests, args.concurrency,
+                  args.profile, args.ocr)
+        results.append(r)
+        print(f"{r['budget']:<8}{r['q_per_s']:>8.2f}{r['p50_s']:>8.2f}"
+              f"{r['p95_s']:>8.2f}{r['pages_per_s']:>9.2f}")
+    off, on = results
+    print(f"\nquery throughput x{on['q_per_s'] / off['q_per_s']:.2f}, "
+          f"ingest throughput x{on['pages_per_s'] / max(off['pages_per_s'], 1e-9):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Token-budgeted context packer for generation.
+
+Why?
+- The chunker overlaps neighbouring chunks by 40 words, so sending adjacent
+  chunks verbatim repeats text the model has already read
+- flan-T5 silently truncated prompts at 1024 tokens, often cutting off the
+  question that sits at the end of the prompt
+- Fewer prompt tokens = faster prompt evaluation on CPU
+
+Packing steps:
+  1. Merge adjacent / overlapping chunks from the same page (overlap removed)
+  2. Drop repeated sentences, within a block and across blocks (the
+     better-ranked copy is kept)
+  3. Fill the token budget block by block in relevance order; the block that
+     no longer fits is added sentence by sentence until the budget is spent.
+     If not even the best block's first sentence fits, that block is cut
+     word by word instead of returning an empty context
+
+Tokens are counted with the active model's tokenizer (passed in as a
+callable) on the assembled context, headers and separators included, so
+the budget is exact for Phi-3 and flan-T5 alike.
+"""
+import re
+from typing import Callable, Dict, List, Tuple
+
+
+SEPARATOR = "\n\n---\n\n"
+
+
+def _relevance(chunk: Dict) -> float:
+    """Best available ranking signal for a chunk."""
+    for key in ("rerank_score", "fusion_score", "score", "bm25_score"):
+        if key in chunk:
+            return float(chunk[key])
+    return 0.0
+
+
+def _merge_overlap(left: str, right: str) -> str:
+    """Join two texts, dropping the longest word overlap between them."""
+    lw, rw = left.split(), right.split()
+    for k in range(min(len(lw), len(rw)), 0, -1):
+        if lw[-k:] == rw[:k]:
+            return " ".join(lw + rw[k:])
+    return " ".join(lw + rw)
+
+
+def merge_adjacent(chunks: List[Dict]) -> List[Dict]:
+    """
+    Merge consecutive chunks (by chunk_index) from the same source + page.
+
+    Returns:
+        Blocks of {"text", "page", "source", "score"} where score is the
+        best relevance of the merged chunks, sorted by score descending
+    """
+    groups: Dict[Tuple, List[Dict]] = {}
+    for c in chunks:
+        groups.setdefault((c.get("source", ""), c.get("page", "?")), []).append(c)
+
+    blocks = []
+    for (source, page), members in groups.items():
+        members.sort(key=lambda c: c.get("chunk_index", -1))
+        current = None
+        for c in members:
+            idx = c.get("chunk_index", -1)
+            if current is not None and idx >= 0 and idx == current["last_index"] + 1:
+                current["text"] = _merge_overlap(current["text"], c["text"])
+                current["score"] = max(current["score"], _relevance(c))
+                current["last_index"] = idx
+                continue
+            if current is not None:
+                blocks.append(current)
+            current = {
+                "text": c["text"],
+                "page": page,
+                "source": source,
+                "score": _relevance(c),
+                "last_index": idx,
+            }
+        if current is not None:
+            blocks.append(current)
+
+    blocks.sort(key=lambda b: b["score"], reverse=True)
+    return blocks
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+
+
+def _norm(sentence: str) -> str:
+    return re.sub(r'\W+', ' ', sentence.lower()).strip()
+
+
+def _longest_fit(items: List[str], render: Callable[[List[str]], str],
+                 count_tokens: Callable[[str], int], budget: int) -> int:
+    """Largest n with count_tokens(render(items[:n])) <= budget (binary search)."""
+    lo, hi = 0, len(items)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(render(items[:mid])) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def pack_context(
+    chunks: List[Dict],
+    count_tokens: Callable[[str], int],
+    budget: int
+) -> Tuple[str, int]:
+    """
+    Build the prompt context from ranked chunks within a token budget.
+
+    Args:
+        chunks:       Retrieved chunks (any order; relevance keys are used)
+        count_tokens: Tokenizer-backed counter for the active model
+        budget:       Max tokens the context may occupy
+
+    Returns:
+        (context string, tokens used)
+    """
+    seen = set()
+    parts: List[str] = []
+
+    for block in merge_adjacent(chunks):
+        sentences = []
+        for s in _sentences(block["text"]):
+            key = _norm(s)
+            if key and key not in seen:
+                seen.add(key)
+                sentences.append(s)
+        if not sentences:
+            continue
+
+        header = f"[Page {block['page']}] "
+
+        def render(kept: List[str]) -> str:
+            return SEPARATOR.join(parts + [header + " ".join(kept)])
+
+        n = _longest_fit(sentences, render, count_tokens, budget)
+        if n == 0 and not parts:
+            # The best block's first sentence alone is over budget: cut it by words
+            words = " ".join(sentences).split()
+            n_words = _longest_fit(words, render, count_tokens, budget)
+            if n_words:
+                parts.append(header + " ".join(words[:n_words]))
+            break
+        if n == 0:
+            break
+        parts.append(header + " ".join(sentences[:n]))
+        if n < len(sentences):
+            break
+
+    context = SEPARATOR.join(parts)
+    return context, count_tokens(context) if context else 0
@@ -1,6 +1,7 @@
 import re
 import logging
 from typing import List, Dict, Optional
+from ingestion.entity_extractor import ENTITY_PATTERNS
 
 # Setup logging
 logger = logging.getLogger("rag_extraction")
@@ -17,42 +18,55 @@ def classify_query(query: str) -> str:
     factual_keywords = [
         "when", "where", "who", "whose", "how many", "how much", 
         "date", "time", "number", "id", "code", "name", "venue", 
-        "location", "amount", "total", "roll number"
+        "location", "amount", "total", "roll number", "email"
     ]
     if any(k in low_q for k in factual_keywords):
         return "factual"
     return "descriptive"
 
+def is_summary_query(query: str) -> bool:
+    """True for whole-document summary requests answered from precomputed summaries."""
+    low_q = query.lower()
+    triggers = [
+        "summarize", "summarise", "summary", "overview", "tl;dr", "gist",
+        "what is this about", "what is this document about",
+        "what is the document about", "what is the pdf about"
+    ]
+    return any(t in low_q for t in triggers)
+
+def entity_type_for_query(query: str) -> Optional[str]:
+    """Map a factual query to the entity type that answers it (see ENTITY_PATTERNS)."""
+    low_q = query.lower()
+    words = set(re.findall(r'\w+', low_q))
+
+    if "email" in words or "e-mail" in low_q or "mail" in words:
+        return "email"
+    if "roll number" in low_q or words & {"id", "code", "registration"}:
+        return "id"
+    if "date" in words or "when" in words:
+        return "date"
+    if "time" in words:
+        return "time"
+    if words & {"amount", "total", "price", "cost", "fee", "fees"} or "how much" in low_q:
+        return "amount"
+    return None
+
 def extract_exact_answer(query: str, chunks: List[Dict]) -> Optional[str]:
     """Pattern matching for exact extraction on factual queries."""
-    low_q = query.lower()
-    
-    # Define regex patterns based on keywords in query
-    pattern = None
-    if "roll number" in low_q or "id" in low_q or "code" in low_q:
-        pattern = r'\b[A-Z0-9]{5,15}\b'
-    elif "date" in low_q or "when" in low_q:
-        pattern = r'\b(?:\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2}(?:st|nd|rd|th)?,? \d{4})\b'
-    elif "time" in low_q:
-        pattern = r'\b(?:[01]?\d|2[0-3]):[0-5]\d\s?(?:AM|PM|am|pm)?\b'
-    elif "amount" in low_q or "total" in low_q or "price" in low_q or "how much" in low_q:
-        pattern = r'\$\s?\d+(?:,\d{3})*(?:\.\d{2})?'
-        
-    if not pattern:
+    entity_type = entity_type_for_query(query)
+    if not entity_type:
         return None
         
-    logger.info(f"Factual query detected. Using pattern: {pattern}")
-    
-    compiled = re.compile(pattern, re.IGNORECASE)
+    # Patterns are compiled once at import time and shared with ingestion
+    compiled = ENTITY_PATTERNS[entity_type]
+    logger.info(f"Factual query detected. Using {entity_type} pattern: {compiled.pattern}")
     
     # Search chunks heavily matched to top docs
     for c in chunks:
-        # Sort sentences in chunk so we extract closest match if needed, but here we just regex the whole chunk.
-        # Find all matches
-        matches = compiled.findall(c['text'])
-        if matches:
-            # multiple found -> return best match only
-            best_match = matches[0] 
+        match = compiled.search(c['text'])
+        if match:
+            # multiple found -> return first (best ranked chunk) match only
+            best_match = match.group(0).strip()
             logger.info(f"Extracted answer: {best_match}")
             return best_match
             
@@ -88,3 +102,29 @@ def filter_context(query: str, chunks: List[Dict]) -> List[Dict]:
             
     # Fallback if too strict
     return filtered_chunks if filtered_chunks else chunks
+
+def extract_best_sentences(query: str, chunks: List[Dict], max_sentences: int = 3) -> Optional[str]:
+    """Extractive answer: the sentences sharing the most query keywords, in reading order."""
+    stop_words = {"what", "is", "the", "a", "an", "of", "in", "to", "for", "with", "on", "at", "by", "from", "how", "many", "much", "explain", "describe", "about", "does", "are", "was", "which"}
+    keywords = {w for w in re.sub(r'[^\w\s]', '', query.lower()).split() if w not in stop_words and len(w) > 2}
+
+    if not keywords:
+        return None
+
+    scored = []
+    for c_idx, c in enumerate(chunks):
+        for s_idx, s in enumerate(re.split(r'(?<=[.!?])\s+', c['text'])):
+            words = set(re.findall(r'\w+', s.lower()))
+            overlap = len(keywords & words)
+            if overlap:
+                scored.append((overlap, c_idx, s_idx, s.strip()))
+
+    if not scored:
+        return None
+
+    # Best overlap first, earlier (higher ranked) chunks win ties
+    best = sorted(scored, key=lambda x: (-x[0], x[1], x[2]))[:max_sentences]
+    best.sort(key=lambda x: (x[1], x[2]))
+    answer = " ".join(s for _, _, _, s in best)
+    logger.info(f"Extractive answer from {len(best)} sentence(s)")
+    return answer
@@ -14,10 +14,33 @@ Install llama-cpp-python (CPU-only build):
     pip install llama-cpp-python
 """
 import os
-from typing import Tuple, List, Dict
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict, Iterator, Optional
 from retrieval.hybrid_retriever import HybridRetriever
+from retrieval.index_generations import IndexGenerations
+from generation.profiles import get_profile, DEFAULT_PROFILE
+from generation.prompt_cache import build_prefix_cache
+from generation.context_packer import pack_context
+from generation.scheduler import GenerationScheduler, MAX_QUEUE_DEPTH, DeadlineExceededError
+from generation.summarizer import SummaryBuilder
+from generation import t5_serving
+from monitoring.metrics import LLM_BYPASS, QUERIES, STAGE_SECONDS, stage_timer
+from monitoring import tracing
+from runtime.thread_budget import BUDGET, set_llama_threads
+from runtime.tuning import TUNING
 
 MODEL_PATH = os.path.join("models", "phi3-mini-q4.gguf")
+PHI3_MAX_CTX = 4096      # Phi-3 Mini 4K context window
+PHI3_N_CTX = min(TUNING["llm_n_ctx"], PHI3_MAX_CTX)   # host tuning profile
+PHI3_N_BATCH = TUNING["llm_n_batch"]                  # llama.cpp prompt-eval batch
+T5_MAX_INPUT = 1024      # flan-T5 encoder input limit used by the tokenizer
+
+# >1 runs Phi-3 in a pool of worker processes sharing the mmap'd GGUF
+# (see generation/worker_pool.py); 1 keeps the in-process model.
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", "1"))
 
 # ---------------------------------------------------------------------------
 # Phi-3 ChatML tokens built at runtime so editors / linters don't choke on them
@@ -34,6 +57,49 @@ _SYS_END   = _tok("end")
 _USR_OPEN  = _tok("user")
 _ASST_OPEN = _tok("assistant")
 
+_PHI3_SYSTEM_MSG = (
+    "You are a highly accurate document QA system.\n"
+    "Answer ONLY using the provided context.\n"
+    "Return complete and meaningful answers, not fragments.\n"
+    "If the answer is a sentence, return the full sentence.\n"
+    "If it is a value (name, date, place), return it clearly.\n"
+    "If not found, return: Not found in the document."
+)
+
+# Constant start of every Phi-3 prompt — its KV state is cached once at load
+_PHI3_PREFIX = (
+    f"{_SYS_OPEN}\n{_PHI3_SYSTEM_MSG}{_SYS_END}\n"
+    f"{_USR_OPEN}\nDocument Context:\n"
+)
+
+def _timed_decode(pieces: Iterator[str]) -> Iterator[str]:
+    """
+    Pass decoded pieces through, recording time-to-first-piece as
+    "prompt_eval" and the rest of the decode as "generate".
+    """
+    start = time.perf_counter()
+    first_at = None
+    n_pieces = 0
+    for piece in pieces:
+        if first_at is None:
+            first_at = time.perf_counter()
+            STAGE_SECONDS.observe(first_at - start, stage="prompt_eval")
+        n_pieces += 1
+        yield piece
+    if first_at is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - first_at, stage="generate")
+        tracing.current_span().set(
+            prompt_eval_ms=round((first_at - start) * 1000, 1),
+            decode_ms=round((time.perf_counter() - first_at) * 1000, 1),
+            tokens=n_pieces   # llama.cpp / TextIteratorStreamer yield ~1 token per piece
+        )
+
+
+# Components loaded (in parallel) by PDFQueryEngine.load; the BM25 and entity
+# indexes may legitimately be absent before the first upload.
+_COMPONENTS = ("vector_store", "reranker", "bm25", "entity_index", "document_index", "llm")
+_REQUIRED = ("vector_store", "reranker", "llm")
+
 
 class PDFQueryEngine:
     """
@@ -41,15 +107,120 @@ class PDFQueryEngine:
     Automatically picks the best available local LLM.
     """
 
-    def __init__(self):
-        self.retriever = HybridRetriever()
+    def __init__(self, load: bool = True, indexes: Optional[IndexGenerations] = None):
+        """
+        Args:
+            load:    Load and warm up all components now. Pass False to create
+                     the engine instantly and call load() later (e.g. from a
+                     background thread while /ready reports progress).
+            indexes: Index generation manager to serve from (default: a new
+                     one over storage/indexes). Pass the one ingestion
+                     publishes to, so new generations go live in this engine.
+        """
+        self.retriever = HybridRetriever(load=False, indexes=indexes)
         self.use_phi3 = False
-        self._load_llm()
+        self.prefix_cache = None
+        self.pool = None
+        self.scheduler = None
+        self.summaries = None
+        self.readiness: Dict[str, Dict] = {
+            name: {"state": "pending"} for name in _COMPONENTS
+        }
+        self.load_seconds: Optional[float] = None
+        self._ready = threading.Event()
+        if load:
+            self.load()
 
     # ------------------------------------------------------------------
     # Model loading
     # ------------------------------------------------------------------
 
+    def load(self):
+        """
+        Load every component concurrently, then warm each one up.
+
+        Chroma + MiniLM, the cross-encoder, the BM25 pickle, the entity index
+        and the LLM are independent, so they load in parallel threads; each
+        then runs one tiny inference to trigger lazy initialisation (weight
+        paging, kernel selection, thread pools) before traffic arrives.
+
+        Raises:
+            RuntimeError: if a required component failed to load.
+        """
+        start = time.perf_counter()
+        steps = {
+            "vector_store": (self.retriever.load_vector_store, self._warm_vector_store),
+            "reranker": (self.retriever.load_reranker, self._warm_reranker),
+            "bm25": (self.retriever.indexes.load_bm25, None),
+            "entity_index": (self.retriever.indexes.load_entities, None),
+            "document_index": (self.retriever.indexes.load_documents, None),
+            "llm": (self._load_llm, self._warm_llm),
+        }
+        with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="warmup") as ex:
+            for name, (loader, warm) in steps.items():
+                ex.submit(self._load_component, name, loader, warm)
+
+        # One llama.cpp / T5 instance -> serialise generations through a queue;
+        # with a worker pool, run one generation per worker concurrently.
+        workers = self.pool.n_workers if self.pool else 1
+        self.scheduler = GenerationScheduler(
+            max_depth=max(MAX_QUEUE_DEPTH, 2 * workers), workers=workers
+        )
+        # Background hierarchical summaries, built after ingestion
+        self.summaries = SummaryBuilder(
+            self.summarize_parts,
+            fingerprint=lambda source: self.retriever.chunk_store.digest(source)
+        )
+        self.load_seconds = round(time.perf_counter() - start, 2)
+
+        failed = [n for n in _REQUIRED if self.readiness[n]["state"] != "ready"]
+        if failed:
+            raise RuntimeError(
+                "Failed to load: " + ", ".join(
+                    f"{n} ({self.readiness[n].get('error', 'unknown error')})" for n in failed
+                )
+            )
+        self._ready.set()
+        print(f"[Engine] All components ready in {self.load_seconds}s.")
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _load_component(self, name: str, loader, warm):
+        state = self.readiness[name]
+        state["state"] = "loading"
+        try:
+            t0 = time.perf_counter()
+            loader()
+            state["load_seconds"] = round(time.perf_counter() - t0, 3)
+            if warm is not None:
+                state["state"] = "warming"
+                t0 = time.perf_counter()
+                warm()
+                state["warmup_seconds"] = round(time.perf_counter() - t0, 3)
+            state["state"] = "ready"
+        except Exception as exc:
+            state["state"] = "failed"
+            state["error"] = f"{type(exc).__name__}: {exc}"
+            print(f"[Engine] {name} failed to load: {exc}")
+
+    def _warm_vector_store(self):
+        self.retriever.vector_store.embedding_model.encode(["warm up"])
+        self.retriever.vector_store.count()
+
+    def _warm_reranker(self):
+        self.retriever.reranker.predict([("warm up", "warm up")])
+
+    def _warm_llm(self):
+        if self.pool is not None:
+            return   # every worker warmed its own prompt prefix on start
+        if self.use_phi3:
+            if self.prefix_cache is None:
+                self.llm("Hi", max_tokens=1)
+            return
+        ids = self.tokenizer("warm up", return_tensors="pt").input_ids
+        self.t5_model.generate(ids, max_length=2)
+
     def _load_llm(self):
         """Load Phi-3 Mini if the GGUF file exists, otherwise fall back."""
         if os.path.exists(MODEL_PATH):
@@ -65,14 +236,19 @@ class PDFQueryEngine:
         """Load Phi-3 Mini via llama-cpp-python."""
         try:
             from llama_cpp import Llama
+            if LLM_WORKERS > 1:
+                self._load_phi3_pool(Llama)
+                return
             print("[LLM] Loading Phi-3 Mini (~8 seconds) ...")
             self.llm = Llama(
                 model_path=MODEL_PATH,
-                n_ctx=4096,                        # 4096-token context window
-                n_threads=os.cpu_count() or 4,    # use all CPU cores
+                n_ctx=PHI3_N_CTX,                  # up to the 4096-token window
+                n_batch=PHI3_N_BATCH,
+                n_threads=BUDGET.threads("llm"),  # re-set per generation from the CPU budget
                 n_gpu_layers=0,                   # set to 35 for NVIDIA GPU
                 verbose=False
             )
+            self.prefix_cache = build_prefix_cache(self.llm, _PHI3_PREFIX)
             self.use_phi3 = True
             print("[LLM] Phi-3 Mini ready.")
         except ImportError:
@@ -83,6 +259,19 @@ class PDFQueryEngine:
             print(f"[LLM] Phi-3 load error: {exc}. Falling back to flan-t5.")
             self._load_t5()
 
+    def _load_phi3_pool(self, Llama):
+        """Start the multi-process Phi-3 pool; keep only the tokenizer here."""
+        from generation.worker_pool import LLMWorkerPool
+        # vocab-only model: token counting for the context packer, no weights
+        self.llm = Llama(model_path=MODEL_PATH, vocab_only=True, verbose=False)
+        self.pool = LLMWorkerPool(
+            MODEL_PATH, LLM_WORKERS, n_ctx=PHI3_N_CTX, n_batch=PHI3_N_BATCH,
+            prefix=_PHI3_PREFIX
+        )
+        self.pool.start()
+        self.use_phi3 = True
+        print(f"[LLM] Phi-3 Mini ready ({LLM_WORKERS} worker processes).")
+
     def _load_t5(self):
         """Load flan-t5-base as a lightweight fallback."""
         from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
@@ -90,18 +279,33 @@ class PDFQueryEngine:
         self.tokenizer = AutoTokenizer.from_pretrained(t5_model)
         self.t5_model  = AutoModelForSeq2SeqLM.from_pretrained(t5_model)
         self.use_phi3  = False
+        if t5_serving.T5_FAST:
+            t5_serving.configure_torch_threads()
+            self.t5_model = t5_serving.quantize_t5(self.t5_model)
+            self.t5_prompt = t5_serving.T5PromptEncoder(self.tokenizer, T5_MAX_INPUT)
+            print(f"[LLM] flan-T5 low-latency mode: int8 linear layers, "
+                  f"{BUDGET.threads('torch')} torch threads.")
         print("[LLM] flan-t5-base loaded (fallback — limited quality).")
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
-    def answer_question(self, question: str) -> Tuple[str, List[Dict]]:
+    @tracing.traced("answer_question")
+    def answer_question(self, question: str,
+                        profile: str = DEFAULT_PROFILE,
+                        deadline_s: Optional[float] = None) -> Tuple[str, List[Dict]]:
         """
         Retrieve relevant chunks and generate an answer.
 
         Args:
-            question: Natural-language user question.
+            question:   Natural-language user question.
+            profile:    Latency profile name ("fast", "balanced", "accurate");
+                        see generation/profiles.py.
+            deadline_s: Max seconds to wait for the generation queue + LLM.
+
+        Raises:
+            QueueFullError / DeadlineExceededError from generation.scheduler.
 
         Returns:
             Tuple of:
@@ -111,16 +315,202 @@ class PDFQueryEngine:
         if not question.strip():
             return "Please provide a question.", []
 
+        cfg = get_profile(profile)   # raises ValueError for unknown names
+        QUERIES.inc(profile=profile)
+        tracing.current_span().set(profile=profile)
+        answer, chunks, context = self._prepare(question, cfg)
+        if answer is not None:
+            return answer, chunks
+
+        generate = self._generate_phi3 if self.use_phi3 else self._generate_t5
+        with tracing.span("generate", max_tokens=cfg["max_tokens"]):
+            # bind: the scheduler thread's decode spans nest under this one
+            answer = self.scheduler.submit(
+                tracing.bind(lambda: generate(question, context, max_tokens=cfg["max_tokens"])),
+                key=self._generation_key(question, context, cfg),
+                deadline_s=deadline_s
+            )
+
+        return self._postprocess(answer), chunks
+
+    def stream_answer(self, question: str,
+                      profile: str = DEFAULT_PROFILE,
+                      deadline_s: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Streaming variant of answer_question.
+
+        Yields events in order:
+            {"event": "sources", "data": List[Dict]}   — as soon as retrieval ends
+            {"event": "token",   "data": str}          — zero or more answer pieces
+            {"event": "done",    "data": {"answer": str}}
+
+        The "done" answer is post-processed and may differ from the
+        concatenated tokens (e.g. replaced by "Not found in the document.").
+        """
+        if not question.strip():
+            yield {"event": "sources", "data": []}
+            yield {"event": "done", "data": {"answer": "Please provide a question."}}
+            return
+
+        cfg = get_profile(profile)
+        QUERIES.inc(profile=profile)
+        answer, chunks, context = self._prepare(question, cfg)
+        yield {"event": "sources", "data": chunks}
+
+        if answer is not None:
+            yield {"event": "token", "data": answer}
+            yield {"event": "done", "data": {"answer": answer}}
+            return
+
+        stream = self._stream_phi3 if self.use_phi3 else self._stream_t5
+        pieces = self.scheduler.stream(
+            lambda: stream(question, context, max_tokens=cfg["max_tokens"]),
+            deadline_s=deadline_s
+        )
+
+        streamed = []
+        for piece in pieces:
+            streamed.append(piece)
+            yield {"event": "token", "data": piece}
+
+        yield {"event": "done", "data": {"answer": self._postprocess("".join(streamed))}}
+
+    def answer_batch(self, questions: List[str],
+                     profile: str = DEFAULT_PROFILE,
+                     deadline_s: Optional[float] = None) -> Iterator[Dict]:
+        """
+        Answer many questions with batched retrieval and generation.
+
+        Questions needing no retrieval are answered first. The rest share
+        one retrieve_batch call (one embedding pass, one BM25 pass, one
+        rerank pass), and their generations go to the scheduler as a batch
+        that never holds more than half the queue (see submit_batch).
+
+        Yields one dict per question, in completion order:
+            {"index", "question", "answer", "sources"}  or
+            {"index", "question", "error", "status"}    (504 deadline, else 500)
+
+        Args:
+            deadline_s: Per-generation deadline, counted from when each
+                        generation enters the queue.
+        """
+        cfg = get_profile(profile)
+        QUERIES.inc(len(questions), profile=profile)
+        generate = self._generate_phi3 if self.use_phi3 else self._generate_t5
+
+        to_retrieve = []
+        for i, question in enumerate(questions):
+            if not question.strip():
+                yield {"index": i, "question": question,
+                       "answer": "Please provide a question.", "sources": []}
+                continue
+            direct = self._direct_answer(question)
+            if direct is not None:
+                yield {"index": i, "question": question,
+                       "answer": direct[0], "sources": direct[1]}
+            else:
+                to_retrieve.append(i)
+        if not to_retrieve:
+            return
+
+        retrieved = self.retriever.retrieve_batch(
+            [questions[i] for i in to_retrieve], **self._retrieval_args(cfg)
+        )
+        calls, waiting = [], []
+        for i, chunks in zip(to_retrieve, retrieved):
+            question = questions[i]
+            answer, chunks, context = self._from_chunks(question, chunks, cfg)
+            if answer is not None:
+                yield {"index": i, "question": question, "answer": answer, "sources": chunks}
+                continue
+            calls.append((
+                lambda q=question, ctx=context: generate(q, ctx, max_tokens=cfg["max_tokens"]),
+                self._generation_key(question, context, cfg)
+            ))
+            waiting.append((i, chunks))
+
+        for pos, answer, error in self.scheduler.submit_batch(calls, deadline_s=deadline_s):
+            i, chunks = waiting[pos]
+            if error is None:
+                yield {"index": i, "question": questions[i],
+                       "answer": self._postprocess(answer), "sources": chunks}
+            else:
+                yield {"index": i, "question": questions[i], "error": str(error),
+                       "status": 504 if isinstance(error, DeadlineExceededError) else 500}
+
+    def summarize_parts(self, instruction: str, parts: List[Dict],
+                        max_tokens: int = 200) -> str:
+        """
+        Summarise page / section texts with the active LLM.
+
+        Used by the background SummaryBuilder; parts are {"text", "page"}
+        dicts packed into the model's window in order.
+        """
+        cfg = {"max_tokens": max_tokens, "context_tokens": PHI3_N_CTX}
+        context, _ = pack_context(parts, self._count_tokens,
+                                  self._context_budget(instruction, cfg))
+        generate = self._generate_phi3 if self.use_phi3 else self._generate_t5
+        return self.scheduler.submit(
+            lambda: generate(instruction, context, max_tokens=max_tokens),
+            deadline_s=600
+        ).strip()
+
+    # ------------------------------------------------------------------
+    # Pipeline stages
+    # ------------------------------------------------------------------
+
+    def _prepare(self, question: str, cfg: Dict) -> Tuple[Optional[str], List[Dict], Optional[str]]:
+        """
+        Everything before generation: direct replies, retrieval, extraction.
+
+        Returns:
+            (answer, chunks, context) — answer is set when no LLM call is
+            needed, otherwise context holds the prompt-ready chunk text.
+        """
+        with tracing.span("direct_answer") as span:
+            direct = self._direct_answer(question)
+            span.set(hit=direct is not None)
+        if direct is not None:
+            return direct[0], direct[1], None
+
+        # ── Hybrid retrieval ─────────────────────────────────────────────
+        chunks = self.retriever.retrieve(question, **self._retrieval_args(cfg))
+        return self._from_chunks(question, chunks, cfg)
+
+    @staticmethod
+    def _generation_key(question: str, context: str, cfg: Dict) -> Tuple:
+        """Scheduler coalescing key: identical inputs share one generation."""
+        return (question.strip().lower(), context, cfg["max_tokens"])
+
+    @staticmethod
+    def _retrieval_args(cfg: Dict) -> Dict:
+        return dict(
+            top_k=cfg["top_k"],
+            dense_k=cfg["dense_k"],
+            bm25_k=cfg["bm25_k"],
+            rerank=cfg["rerank"],
+            rerank_budget=cfg["rerank_budget"],
+            force_rerank=cfg["force_rerank"],
+            doc_fanout=cfg["doc_fanout"]
+        )
+
+    def _direct_answer(self, question: str) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Answers that need no retrieval: greetings / help, precomputed
+        summaries and entity-index hits. Returns (answer, sources) or None.
+        """
         lowq = question.lower().strip()
 
         # ── Direct responses (no retrieval needed) ──────────────────────
         greetings = {"hi", "hello", "hey", "how are you"}
         if lowq in greetings:
+            LLM_BYPASS.inc(reason="direct")
             return ("Hello! I am your document assistant. "
                     "Upload a PDF and ask me anything about it."), []
 
         help_triggers = ["what can i ask", "how to use", "capabilities", "guide me"]
         if any(k in lowq for k in help_triggers):
+            LLM_BYPASS.inc(reason="direct")
             return (
                 "You can ask me:\n"
                 "- **Summaries**: 'Summarize the document' or 'What is this about?'\n"
@@ -130,43 +520,126 @@ class PDFQueryEngine:
                 "- **Comparisons**: 'Compare X and Y from the document'"
             ), []
 
-        # ── Hybrid retrieval ─────────────────────────────────────────────
-        chunks = self.retriever.retrieve(question, top_k=5)
+        from generation.extractor import (
+            classify_query, entity_type_for_query, is_summary_query, logger
+        )
+
+        # ── Precomputed summaries (built at ingest, no LLM call) ────────
+        if is_summary_query(question):
+            stored = self._stored_summary()
+            if stored:
+                logger.info("Answered from precomputed document summary.")
+                LLM_BYPASS.inc(reason="summary")
+                return stored
+
+        # ── Entity index (ingest-time facts, no retrieval / LLM) ────────
+        intent = classify_query(question)
+        logger.info(f"Query classified as: {intent.upper()}")
+
+        if intent == "factual":
+            entity_type = entity_type_for_query(question)
+            hit = self.retriever.entity_index.lookup(entity_type, question) if entity_type else None
+            if hit:
+                logger.info(f"Entity index hit ({entity_type}). Final Output: {hit['value']}")
+                LLM_BYPASS.inc(reason="entity_index")
+                source = {
+                    "text": hit["context"],
+                    "page": hit["page"],
+                    "source": hit["source"],
+                    "chunk_index": hit["chunk_index"],
+                    "entity_type": entity_type,
+                    "proximity_score": hit["proximity_score"],
+                }
+                return hit["value"], [source]
+        return None
+
+    def _from_chunks(self, question: str, chunks: List[Dict],
+                     cfg: Dict) -> Tuple[Optional[str], List[Dict], Optional[str]]:
+        """Post-retrieval half of _prepare: extraction, then context packing."""
+        from generation.extractor import (
+            classify_query, extract_exact_answer, extract_best_sentences, logger
+        )
 
         if not chunks:
-            return "Not found in the document.", []
+            LLM_BYPASS.inc(reason="not_found")
+            return "Not found in the document.", [], None
             
-        from generation.extractor import classify_query, extract_exact_answer, logger
-        
         logger.info(f"Retrieved {len(chunks)} chunks for query: '{question}'")
         for idx, c in enumerate(chunks):
             logger.info(f"Chunk {idx+1} [Rerank: {c.get('rerank_score', 0)}]: {c['text'][:100]}...")
             
         # ── Answer Extraction Layer ──────────────────────────────────────
-        intent = classify_query(question)
-        logger.info(f"Query classified as: {intent.upper()}")
-        
-        if intent == "factual":
+        if classify_query(question) == "factual":
             exact_match = extract_exact_answer(question, chunks)
             if exact_match:
                 logger.info(f"LLM Bypassed. Final Output: {exact_match}")
-                return exact_match, chunks
+                LLM_BYPASS.inc(reason="extractor")
+                return exact_match, chunks, None
             else:
                 logger.info("Extraction failed. Falling back to LLM.")
+
+        if cfg["generator"] == "extractive":
+            answer = extract_best_sentences(question, chunks) or "Not found in the document."
+            logger.info(f"Extractive profile. Final Output: {answer}")
+            LLM_BYPASS.inc(reason="extractive")
+            return answer, chunks, None
                 
-        # ── Generate ─────────────────────────────────────────────────────
-        logger.info(f"Passing {len(chunks)} full chunks to LLM without filtering")
-        parts = [f"[Page {c['page']}] {c['text']}" for c in chunks]
-        context = "\n\n---\n\n".join(parts)
+        # ── Build context (token-budgeted, overlap-free) ────────────────
+        with tracing.span("pack_context", chunks=len(chunks)) as span:
+            budget = self._context_budget(question, cfg)
+            context, used = pack_context(chunks, self._count_tokens, budget)
+            span.set(tokens=used, budget=budget)
+        logger.info(f"Packed {len(chunks)} chunks into {used}/{budget} context tokens")
+        return None, chunks, context
+
+    def _stored_summary(self) -> Optional[Tuple[str, List[Dict]]]:
+        """Document summary + section sources for every indexed source, if built."""
+        chunk_store = self.retriever.chunk_store
+        indexed = chunk_store.sources()
+
+        answers, sources = [], []
+        for src in indexed:
+            # only summaries built for the text being served right now
+            rec = self.summaries.current(src, chunk_store.digest(src))
+            if not rec:
+                continue
+            answers.append(rec["document"] if len(indexed) == 1
+                           else f"**{src}**: {rec['document']}")
+            for sec in rec["sections"]:
+                sources.append({
+                    "text": sec["summary"],
+                    "page": f"{sec['pages'][0]}-{sec['pages'][1]}",
+                    "source": src,
+                    "summary": True,
+                })
+        if not answers:
+            return None
+        return "\n\n".join(answers), sources
+
+    def _count_tokens(self, text: str) -> int:
+        """Token count under the active model's tokenizer."""
+        if self.use_phi3:
+            return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
 
+    def _context_budget(self, question: str, cfg: Dict) -> int:
+        """
+        Tokens left for document context once instructions, question and
+        (for Phi-3) the generation allowance are reserved — so the question
+        is never truncated.
+        """
         if self.use_phi3:
-            answer = self._generate_phi3(question, context)
+            template = self._count_tokens(self._build_phi3_prompt(question, ""))
+            room = PHI3_N_CTX - cfg["max_tokens"] - template - 1       # BOS
         else:
-            answer = self._generate_t5(question, context)
-            
-        # Post-processing & Confidence Check
-        import re
-        
+            template = self._count_tokens(self._build_t5_prompt(question, ""))
+            room = T5_MAX_INPUT - template - 1                           # EOS
+        return max(0, min(cfg["context_tokens"], room))
+
+    def _postprocess(self, answer: str) -> str:
+        """Post-processing & confidence check on raw LLM output."""
+        from generation.extractor import logger
+
         # Strip to clean whitespace
         clean_ans = answer.strip()
         
@@ -178,47 +651,75 @@ class PDFQueryEngine:
             answer = "Not found in the document."
             
         logger.info(f"Final Output: {answer}")
-
-        return answer, chunks
+        return answer
 
     # ------------------------------------------------------------------
     # Generation backends
     # ------------------------------------------------------------------
 
-    def _generate_phi3(self, question: str, context: str) -> str:
-        """Phi-3 Mini with ChatML-format prompt."""
-        system_msg = (
-            "You are a highly accurate document QA system.\n"
-            "Answer ONLY using the provided context.\n"
-            "Return complete and meaningful answers, not fragments.\n"
-            "If the answer is a sentence, return the full sentence.\n"
-            "If it is a value (name, date, place), return it clearly.\n"
-            "If not found, return: Not found in the document."
-        )
-        user_msg = (
-            f"Document Context:\n{context}\n\n"
-            f"Question: {question}\n\n"
-            f"Answer:"
-        )
-
+    def _build_phi3_prompt(self, question: str, context: str) -> str:
+        """ChatML-format prompt for Phi-3 Mini, starting with _PHI3_PREFIX."""
         # Build ChatML prompt from token variables (no raw special tokens in source)
-        prompt = (
-            f"{_SYS_OPEN}\n{system_msg}{_SYS_END}\n"
-            f"{_USR_OPEN}\n{user_msg}{_SYS_END}\n"
+        return (
+            f"{_PHI3_PREFIX}{context}\n\n"
+            f"Question: {question}\n\n"
+            f"Answer:{_SYS_END}\n"
             f"{_ASST_OPEN}\n"
         )
 
-        result = self.llm(
-            prompt,
-            max_tokens=512,
+    def _reuse_prefix(self):
+        """Restore the cached prompt-prefix KV state before a Phi-3 call."""
+        if self.prefix_cache is None:
+            return
+        from generation.extractor import logger
+        saved = self.prefix_cache.prepare()
+        if saved:
+            logger.info(f"Prompt prefix restored ({len(self.prefix_cache.tokens)} tokens, "
+                        f"~{saved * 1000:.0f} ms prompt eval saved)")
+        else:
+            logger.info("Prompt prefix already resident in the llama context")
+
+    def _phi3_params(self, max_tokens: int) -> Dict:
+        return dict(
+            max_tokens=max_tokens,
             temperature=0.2,          # low = factual, focused output
             repeat_penalty=1.1,
             stop=[_USR_OPEN, _SYS_OPEN]  # stop before next turn starts
         )
-        return result["choices"][0]["text"].strip()
 
-    def _generate_t5(self, question: str, context: str) -> str:
-        """flan-t5-base fallback generation with intent-aware prompting."""
+    def _generate_phi3(self, question: str, context: str, max_tokens: int = 512) -> str:
+        """
+        Phi-3 Mini with ChatML-format prompt.
+
+        Decodes through the streaming path (same sampling, same text) so
+        prompt eval and token generation are timed separately.
+        """
+        return "".join(self._stream_phi3(question, context, max_tokens)).strip()
+
+    def _stream_phi3(self, question: str, context: str, max_tokens: int = 512) -> Iterator[str]:
+        """Phi-3 Mini, yielding text pieces as llama.cpp decodes them."""
+        prompt = self._build_phi3_prompt(question, context)
+        with BUDGET.task("query"):
+            n_threads = BUDGET.threads("llm")
+            if self.pool is not None:
+                pieces = self.pool.stream(
+                    prompt, dict(self._phi3_params(max_tokens), n_threads=n_threads)
+                )
+            else:
+                set_llama_threads(self.llm, n_threads)
+                self._reuse_prefix()
+                pieces = (part["choices"][0]["text"] for part in
+                          self.llm(prompt, stream=True, **self._phi3_params(max_tokens)))
+            first = True
+            for piece in _timed_decode(pieces):
+                if first:
+                    piece = piece.lstrip()   # mirror .strip() of the blocking path
+                    first = not piece
+                if piece:
+                    yield piece
+
+    def _build_t5_prompt(self, question: str, context: str) -> str:
+        """flan-T5 prompt with intent-aware instruction."""
         lowq = question.lower()
 
         if any(k in lowq for k in ["summarize", "summary", "about", "overview", "explain"]):
@@ -228,28 +729,80 @@ class PDFQueryEngine:
         else:
             instruction = "Use the context to answer the question accurately and completely."
 
-        prompt = (
-            f"You are a highly accurate document QA system.\n"
-            f"Answer ONLY using the provided context.\n"
-            f"Return complete and meaningful answers, not fragments.\n"
-            f"If the answer is a sentence, return the full sentence.\n"
-            f"If it is a value (name, date, place), return it clearly.\n"
-            f"If not found, return: Not found in the document.\n\n"
+        return (
+            f"{t5_serving.T5_PREAMBLE}"
             f"Context:\n{context}\n\n"
             f"Question: {question}\n\nAnswer:"
         )
 
+    @BUDGET.task("query")
+    def _generate_t5(self, question: str, context: str, max_tokens: int = 200) -> str:
+        """flan-t5-base fallback generation with intent-aware prompting."""
+        if t5_serving.T5_FAST:
+            with stage_timer("generate"):
+                outputs = self.t5_model.generate(
+                    self.t5_prompt.encode(question, context),
+                    **t5_serving.decoding_params(question, max_tokens)
+                )
+            answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            return answer.strip() or "Unable to generate an answer."
+
+        prompt = self._build_t5_prompt(question, context)
+
         inputs = self.tokenizer(
             prompt, return_tensors="pt", max_length=1024, truncation=True
         )
-        outputs = self.t5_model.generate(
-            inputs.input_ids,
-            max_length=200,
-            min_length=5,
-            num_beams=4,
-            repetition_penalty=1.2,
-            length_penalty=1.0,
-            early_stopping=True
-        )
+        with stage_timer("generate"):
+            outputs = self.t5_model.generate(
+                inputs.input_ids,
+                max_length=min(200, max_tokens),
+                min_length=5,
+                num_beams=4,
+                repetition_penalty=1.2,
+                length_penalty=1.0,
+                early_stopping=True
+            )
         answer = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
         return answer.strip() or "Unable to generate an answer."
+
+    def _stream_t5(self, question: str, context: str, max_tokens: int = 200) -> Iterator[str]:
+        """
+        flan-t5-base streaming via TextIteratorStreamer.
+
+        Streaming requires greedy decoding (beam search only knows the best
+        sequence at the end), so this path uses num_beams=1.
+        """
+        from threading import Thread
+        from transformers import TextIteratorStreamer
+
+        if t5_serving.T5_FAST:
+            input_ids = self.t5_prompt.encode(question, context)
+        else:
+            prompt = self._build_t5_prompt(question, context)
+            input_ids = self.tokenizer(
+                prompt, return_tensors="pt", max_length=1024, truncation=True
+            ).input_ids
+        streamer = TextIteratorStreamer(self.tokenizer, skip_special_tokens=True)
+
+        def generate(**kwargs):
+            BUDGET.apply_torch()   # torch threads are sized per calling thread
+            self.t5_model.generate(**kwargs)
+
+        worker = Thread(
+            target=generate,
+            kwargs=dict(
+                input_ids=input_ids,
+                max_length=min(200, max_tokens),
+                min_length=5,
+                num_beams=1,
+                repetition_penalty=1.2,
+                streamer=streamer
+            ),
+            daemon=True
+        )
+        with BUDGET.task("query"):
+            worker.start()
+            for piece in _timed_decode(streamer):
+                if piece:
+                    yield piece
+            worker.join()
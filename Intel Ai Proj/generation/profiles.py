@@ -0,0 +1,97 @@
+"""
+Latency-tiered retrieval profiles.
+
+Each profile is a named stage configuration for PDFQueryEngine.answer_question:
+
+  fast      BM25 + dense (10 + 10), RRF fusion, NO reranker,
+            extractive answer (regex / best sentences), no LLM call.
+            Target: < 1 s end-to-end on an 8-core CPU.
+
+  balanced  BM25 + dense (15 + 15), RRF fusion, adaptive reranking
+            (early exit on a clear winner, otherwise top-10 reranked),
+            LLM answer with up to 512 new tokens.      [default]
+            Target: < 1.5 s retrieval, < 10 s with Phi-3 on CPU.
+
+  accurate  BM25 + dense (25 + 25), RRF fusion, cross-encoder always
+            reranks the top-30, 6 chunks of context, LLM answer.
+            Target: < 3 s retrieval, < 30 s with Phi-3 on CPU.
+
+Keys:
+  top_k          chunks returned to the caller / used as context
+  dense_k        candidates from the vector store
+  bm25_k         candidates from the BM25 index
+  rerank         run the cross-encoder at all
+  rerank_budget  max fused candidates sent to the cross-encoder
+  force_rerank   disable the clear-winner early exit
+  doc_fanout     hierarchical retrieval: chunk search only within this many
+                 best-matching documents (flat while the corpus has fewer)
+  generator      "llm" (Phi-3 / flan-T5) or "extractive" (no LLM)
+  max_tokens     generation cap for the LLM backends
+  context_tokens token budget for the packed document context (further
+                 capped by what the active model's window leaves free)
+  target_ms      documented end-to-end latency target (CPU)
+"""
+from typing import Dict
+
+
+PROFILES: Dict[str, Dict] = {
+    "fast": {
+        "description": "Sub-second answers: hybrid search, no reranker, extractive answer.",
+        "top_k": 3,
+        "dense_k": 10,
+        "bm25_k": 10,
+        "rerank": False,
+        "rerank_budget": 0,
+        "force_rerank": False,
+        "doc_fanout": 10,
+        "generator": "extractive",
+        "max_tokens": 0,
+        "context_tokens": 0,
+        "target_ms": 1000,
+    },
+    "balanced": {
+        "description": "Adaptive reranking and LLM generation (default).",
+        "top_k": 5,
+        "dense_k": 15,
+        "bm25_k": 15,
+        "rerank": True,
+        "rerank_budget": 10,
+        "force_rerank": False,
+        "doc_fanout": 20,
+        "generator": "llm",
+        "max_tokens": 512,
+        "context_tokens": 1536,
+        "target_ms": 10000,
+    },
+    "accurate": {
+        "description": "Widest candidate pool, full reranking, LLM generation.",
+        "top_k": 6,
+        "dense_k": 25,
+        "bm25_k": 25,
+        "rerank": True,
+        "rerank_budget": 30,
+        "force_rerank": True,
+        "doc_fanout": 40,
+        "generator": "llm",
+        "max_tokens": 512,
+        "context_tokens": 3072,
+        "target_ms": 30000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+
+def get_profile(name: str) -> Dict:
+    """
+    Look up a profile by name.
+
+    Raises:
+        ValueError: if the name is not a known profile
+    """
+    key = (name or DEFAULT_PROFILE).lower().strip()
+    if key not in PROFILES:
+        raise ValueError(
+            f"Unknown profile '{name}'. Choose one of: {', '.join(PROFILES)}"
+        )
+    return PROFILES[key]
@@ -0,0 +1,310 @@
+"""
+Generation scheduler: a bounded FIFO queue in front of the LLM.
+
+Why?
+- The single llama.cpp context in PDFQueryEngine is NOT safe for concurrent
+  calls; once the API serves requests concurrently, generations must be
+  serialised — and we want to see how long they wait
+- Identical in-flight questions (same prompt inputs) are coalesced into one
+  generation whose result is shared by every waiter
+- When the queue is full, callers are rejected immediately (QueueFullError
+  -> HTTP 503) instead of piling up behind a multi-second backlog
+- Every job carries a deadline; jobs that expire while queued are dropped
+  without touching the model
+
+Usage:
+    scheduler = GenerationScheduler(max_depth=8)
+    answer = scheduler.submit(lambda: llm(prompt), key=prompt, deadline_s=60)
+    for piece in scheduler.stream(lambda: llm(prompt, stream=True)):
+        ...
+    for index, result, error in scheduler.submit_batch([(fn, key), ...]):
+        ...
+"""
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+import queue
+import threading
+import time
+
+from monitoring.metrics import CACHE_HITS, CACHE_MISSES, QUEUE_DEPTH, QUEUE_REJECTED
+
+
+MAX_QUEUE_DEPTH = 8          # queued + running generations before rejecting
+DEFAULT_DEADLINE_S = 120.0   # per-request deadline when the caller sets none
+BATCH_RETRY_S = 0.5          # back-off while a batch waits for queue capacity
+
+_DONE = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised immediately when the generation queue is at capacity."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a generation did not finish before its deadline."""
+
+
+class _Job:
+    __slots__ = ("fn", "key", "deadline", "enqueued", "result", "error",
+                 "done", "cancelled", "waiters", "listeners")
+
+    def __init__(self, fn: Callable[[], Any], key: Optional[Hashable], deadline: float):
+        self.fn = fn
+        self.key = key
+        self.deadline = deadline
+        self.enqueued = time.perf_counter()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self.cancelled = False
+        self.waiters = 1
+        self.listeners: List["queue.Queue[_Job]"] = []   # notified on completion
+
+
+class GenerationScheduler:
+    def __init__(
+        self,
+        max_depth: int = MAX_QUEUE_DEPTH,
+        default_deadline_s: float = DEFAULT_DEADLINE_S,
+        workers: int = 1
+    ):
+        self.max_depth = max_depth
+        self.default_deadline_s = default_deadline_s
+        self._queue: "queue.Queue[_Job]" = queue.Queue()
+        self._inflight: Dict[Hashable, _Job] = {}
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "expired": 0,
+            "coalesced": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+        for i in range(max(1, workers)):
+            threading.Thread(
+                target=self._run, name=f"llm-scheduler-{i}", daemon=True
+            ).start()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        fn: Callable[[], Any],
+        key: Optional[Hashable] = None,
+        deadline_s: Optional[float] = None
+    ) -> Any:
+        """
+        Run fn on the scheduler and block for its result.
+
+        Args:
+            fn:         Zero-argument callable doing the generation
+            key:        Coalescing key — identical keys in flight share one run
+            deadline_s: Seconds from now the caller is willing to wait
+
+        Raises:
+            QueueFullError:        queue depth limit reached
+            DeadlineExceededError: no result before the deadline
+        """
+        deadline = time.perf_counter() + (deadline_s or self.default_deadline_s)
+        job = self._enqueue(fn, key, deadline)
+        if not job.done.wait(timeout=max(0.0, deadline - time.perf_counter())):
+            raise DeadlineExceededError("Generation deadline exceeded while queued or running.")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stream(
+        self,
+        gen_fn: Callable[[], Iterable[Any]],
+        deadline_s: Optional[float] = None
+    ) -> Iterator[Any]:
+        """
+        Run a generator on the scheduler, yielding its items as produced.
+
+        Streams are never coalesced. The deadline bounds time-to-first-item.
+        If the consumer stops iterating, the job is cancelled at the next
+        item so the model is freed.
+        """
+        out: "queue.Queue[Any]" = queue.Queue()
+        stop = threading.Event()
+
+        def pump():
+            try:
+                for item in gen_fn():
+                    if stop.is_set():
+                        break
+                    out.put(item)
+            finally:
+                out.put(_DONE)
+
+        deadline = time.perf_counter() + (deadline_s or self.default_deadline_s)
+        job = self._enqueue(pump, None, deadline)
+        try:
+            started = False
+            while True:
+                # The deadline bounds the wait for the FIRST item (queueing +
+                # prompt eval); once tokens flow the stream runs to completion.
+                timeout = None if started else max(0.0, deadline - time.perf_counter())
+                try:
+                    item = out.get(timeout=timeout)
+                except queue.Empty:
+                    raise DeadlineExceededError("Generation deadline exceeded before first token.")
+                if item is _DONE:
+                    break
+                started = True
+                yield item
+            job.done.wait()
+            if job.error is not None:
+                raise job.error
+        finally:
+            stop.set()
+            job.cancelled = True
+
+    def submit_batch(
+        self,
+        calls: List[Tuple[Callable[[], Any], Optional[Hashable]]],
+        deadline_s: Optional[float] = None,
+        window: Optional[int] = None
+    ) -> Iterator[Tuple[int, Any, Optional[BaseException]]]:
+        """
+        Run many (fn, key) calls, yielding (index, result, error) in
+        completion order.
+
+        At most `window` of the batch's jobs (default: half the queue depth)
+        are queued at once, so a batch of hundreds never crowds out live
+        queries, and a full queue makes the batch wait instead of failing.
+        Each call's deadline starts when it is enqueued.
+        """
+        window = max(1, window or self.max_depth // 2)
+        done: "queue.Queue[_Job]" = queue.Queue()
+        pending: Dict[int, Tuple[_Job, List[int], float]] = {}   # id(job) -> (job, indices, deadline)
+        next_idx = 0
+
+        while next_idx < len(calls) or pending:
+            while next_idx < len(calls) and len(pending) < window:
+                fn, key = calls[next_idx]
+                deadline = time.perf_counter() + (deadline_s or self.default_deadline_s)
+                try:
+                    job = self._enqueue(fn, key, deadline, listener=done)
+                except QueueFullError:
+                    if pending:
+                        break   # wait for one of ours to finish
+                    time.sleep(BATCH_RETRY_S)
+                    continue
+                if id(job) in pending:   # duplicate key within the batch
+                    pending[id(job)][1].append(next_idx)
+                else:
+                    pending[id(job)] = (job, [next_idx], deadline)
+                next_idx += 1
+
+            if not pending:
+                continue
+            earliest = min(deadline for _, _, deadline in pending.values())
+            try:
+                job = done.get(timeout=max(0.0, earliest - time.perf_counter()))
+            except queue.Empty:
+                # report every job whose deadline passed; the worker drops it
+                # unless another (coalesced) caller still waits for it
+                now = time.perf_counter()
+                for jid, (job, indices, deadline) in list(pending.items()):
+                    if deadline <= now:
+                        del pending[jid]
+                        for i in indices:
+                            yield i, None, DeadlineExceededError(
+                                "Generation deadline exceeded while queued or running.")
+                continue
+            entry = pending.pop(id(job), None)
+            if entry is None:
+                continue   # already reported as expired
+            for i in entry[1]:
+                yield i, job.result, job.error
+
+    def at_capacity(self) -> bool:
+        with self._lock:
+            return self._depth >= self.max_depth
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["queue_depth"] = self._depth
+            s["max_depth"] = self.max_depth
+        started = s["completed"] + s["failed"]
+        s["avg_wait_ms"] = round(s["wait_seconds_total"] / started * 1000, 1) if started else 0.0
+        s["max_wait_ms"] = round(s.pop("wait_seconds_max") * 1000, 1)
+        s["avg_run_ms"] = round(s.pop("run_seconds_total") / started * 1000, 1) if started else 0.0
+        s.pop("wait_seconds_total")
+        return s
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, fn, key, deadline: float,
+                 listener: Optional["queue.Queue[_Job]"] = None) -> _Job:
+        with self._lock:
+            self._stats["submitted"] += 1
+            if key is not None and key in self._inflight:
+                job = self._inflight[key]
+                job.waiters += 1
+                job.deadline = max(job.deadline, deadline)
+                if listener is not None:
+                    job.listeners.append(listener)
+                self._stats["coalesced"] += 1
+                CACHE_HITS.inc(cache="generation")
+                return job
+            if self._depth >= self.max_depth:
+                self._stats["rejected"] += 1
+                QUEUE_REJECTED.inc()
+                raise QueueFullError(
+                    f"Generation queue full ({self._depth}/{self.max_depth}). Retry shortly."
+                )
+            job = _Job(fn, key, deadline)
+            if listener is not None:
+                job.listeners.append(listener)
+            self._depth += 1
+            QUEUE_DEPTH.set(self._depth)
+            if key is not None:
+                self._inflight[key] = job
+                CACHE_MISSES.inc(cache="generation")
+        self._queue.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            start = time.perf_counter()
+            waited = start - job.enqueued
+            try:
+                if job.cancelled or start > job.deadline:
+                    job.error = DeadlineExceededError("Generation expired in queue.")
+                    with self._lock:
+                        self._stats["expired"] += 1
+                else:
+                    try:
+                        job.result = job.fn()
+                        ok = True
+                    except BaseException as exc:
+                        job.error = exc
+                        ok = False
+                    ran = time.perf_counter() - start
+                    with self._lock:
+                        self._stats["completed" if ok else "failed"] += 1
+                        self._stats["wait_seconds_total"] += waited
+                        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+                        self._stats["run_seconds_total"] += ran
+            finally:
+                with self._lock:
+                    self._depth -= 1
+                    QUEUE_DEPTH.set(self._depth)
+                    if job.key is not None and self._inflight.get(job.key) is job:
+                        del self._inflight[job.key]
+                    listeners = list(job.listeners)
+                job.done.set()
+                for listener in listeners:
+                    listener.put(job)
@@ -0,0 +1,194 @@
+"""
+Precomputed hierarchical document summaries.
+
+"Summarize the document" / "what is this about" are the most common
+questions, and answering them live means retrieval + a full LLM generation
+that only sees five chunks. Instead, after ingestion a background thread:
+
+  1. summarises each group of PAGE_GROUP_SIZE pages  (section summaries)
+  2. summarises the section summaries                (document summary)
+
+and stores both in storage/summaries.json keyed by source file together
+with a content hash of the extracted pages. Summary-intent queries are then
+answered from the store instantly, and re-ingesting an unchanged document
+does not regenerate anything.
+
+Each record also keeps the fingerprint of the indexed text it was built for
+(ChunkStore.digest). A summary is only served while the serving index holds
+that same text, so re-uploading a changed PDF under the same name never
+answers with the old document's summary, even before the rebuild finishes.
+
+Generations go through the engine's GenerationScheduler, so background
+summarisation queues behind (and never interleaves with) live queries.
+"""
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from generation.scheduler import QueueFullError
+
+
+SUMMARY_PATH = os.path.join("storage", "summaries.json")
+PAGE_GROUP_SIZE = 4          # pages per section summary
+SECTION_MAX_TOKENS = 160
+DOCUMENT_MAX_TOKENS = 256
+SECTION_PROMPT = "Summarize the main topic and key points of this section."
+DOCUMENT_PROMPT = "Summarize the main topic and key points of the whole document."
+
+
+def content_hash(pages: List[Dict]) -> str:
+    """Stable hash of extracted page text (what the summaries depend on)."""
+    h = hashlib.sha256()
+    for p in pages:
+        h.update(str(p.get("page", "")).encode())
+        h.update(p.get("text", "").encode("utf-8"))
+    return h.hexdigest()
+
+
+class SummaryStore:
+    """JSON-backed {source: {"hash", "indexed", "sections", "document", "created"}}."""
+
+    def __init__(self, path: str = SUMMARY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception as e:
+                print(f"Summary store load failed: {e}")
+
+    def get(self, source: str) -> Optional[Dict]:
+        with self._lock:
+            return self._data.get(source)
+
+    def put(self, source: str, record: Dict):
+        with self._lock:
+            self._data[source] = record
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def is_current(self, source: str, digest: str) -> bool:
+        rec = self.get(source)
+        return bool(rec) and rec.get("hash") == digest
+
+
+class SummaryBuilder:
+    """
+    Background summarisation stage.
+
+    Args:
+        summarize: callable(instruction, parts, max_tokens) -> summary str,
+                   where parts are {"text", "page"} dicts; provided by
+                   PDFQueryEngine.summarize_parts
+        store:     where finished summaries are persisted
+        fingerprint: callable(source) -> digest of that source's text in the
+                   serving index (ChunkStore.digest); recorded with each
+                   summary and checked by current()
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict], int], str],
+                 store: Optional[SummaryStore] = None,
+                 fingerprint: Optional[Callable[[str], str]] = None):
+        self.summarize = summarize
+        self.store = store or SummaryStore()
+        self.fingerprint = fingerprint
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.pending: set = set()
+
+    def schedule(self, pages: List[Dict]) -> bool:
+        """
+        Queue a document for summarisation unless its summaries are current.
+
+        Returns:
+            True if work was queued, False if the stored summaries match.
+        """
+        if not pages:
+            return False
+        source = pages[0].get("source", "unknown.pdf")
+        digest = content_hash(pages)
+        indexed = self.fingerprint(source) if self.fingerprint else None
+        if self.store.is_current(source, digest):
+            rec = self.store.get(source)
+            if rec.get("indexed") != indexed:   # same text, new index generation
+                self.store.put(source, dict(rec, indexed=indexed))
+            print(f"[Summary] '{source}' unchanged — keeping stored summaries.")
+            return False
+        self.pending.add(source)
+        self._jobs.put((source, digest, indexed, pages))
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="summary-builder", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            source, digest, indexed, pages = self._jobs.get()
+            try:
+                self._build(source, digest, indexed, pages)
+            except Exception as exc:
+                print(f"[Summary] Failed for '{source}': {exc}")
+            finally:
+                self.pending.discard(source)
+
+    def _call(self, instruction: str, parts: List[Dict], max_tokens: int) -> str:
+        """Summarise with back-off while live traffic fills the queue."""
+        while True:
+            try:
+                return self.summarize(instruction, parts, max_tokens)
+            except QueueFullError:
+                time.sleep(2.0)
+
+    def current(self, source: str, indexed: str) -> Optional[Dict]:
+        """The stored summary of source if it was built for the indexed text."""
+        rec = self.store.get(source)
+        if rec and rec.get("indexed") == indexed:
+            return rec
+        return None
+
+    def _build(self, source: str, digest: str, indexed: Optional[str], pages: List[Dict]):
+        start = time.perf_counter()
+        sections = []
+        for i in range(0, len(pages), PAGE_GROUP_SIZE):
+            group = [p for p in pages[i:i + PAGE_GROUP_SIZE] if p.get("text", "").strip()]
+            if not group:
+                continue
+            sections.append({
+                "pages": [group[0]["page"], group[-1]["page"]],
+                "summary": self._call(SECTION_PROMPT, group, SECTION_MAX_TOKENS),
+            })
+
+        if not sections:
+            return
+        if len(sections) == 1:
+            document = sections[0]["summary"]
+        else:
+            parts = [{"text": s["summary"], "page": f"{s['pages'][0]}-{s['pages'][1]}"}
+                     for s in sections]
+            document = self._call(DOCUMENT_PROMPT, parts, DOCUMENT_MAX_TOKENS)
+
+        self.store.put(source, {
+            "hash": digest,
+            "indexed": indexed,
+            "sections": sections,
+            "document": document,
+            "created": time.time(),
+        })
+        print(f"[Summary] '{source}': {len(sections)} section summaries + document "
+              f"summary in {time.perf_counter() - start:.1f}s.")
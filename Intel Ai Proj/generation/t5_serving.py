@@ -0,0 +1,91 @@
+"""
+Low-latency CPU serving mode for the flan-T5 fallback.
+
+The stock fallback ran fp32 flan-t5-base with num_beams=4 / max_length=200,
+costing several seconds per answer. Tuned mode:
+
+  - dynamic int8 quantization of every nn.Linear (weights int8, activations
+    quantized on the fly) — roughly 2x faster matmuls, ~4x smaller weights
+  - decoding chosen by intent: greedy for short factual answers, 2 beams
+    for summaries / explanations
+  - the fixed instruction preamble is tokenized once and its ids reused;
+    only context + question are tokenized per request
+  - explicit torch intra-/inter-op thread counts from the CPU budget
+    (runtime/thread_budget.py) instead of library defaults
+
+Note: T5's encoder is bidirectional, so every input token attends to the
+context and question — encoder *outputs* for the preamble change with the
+rest of the prompt and cannot be reused. Caching stops at token ids.
+
+Set T5_FAST=0 to restore the original settings (see benchmarks/t5_bench.py).
+"""
+from typing import Dict, Optional
+import os
+
+
+T5_FAST = os.environ.get("T5_FAST", "1") == "1"
+
+T5_PREAMBLE = (
+    "You are a highly accurate document QA system.\n"
+    "Answer ONLY using the provided context.\n"
+    "Return complete and meaningful answers, not fragments.\n"
+    "If the answer is a sentence, return the full sentence.\n"
+    "If it is a value (name, date, place), return it clearly.\n"
+    "If not found, return: Not found in the document.\n\n"
+)
+
+
+def configure_torch_threads(n_threads: Optional[int] = None):
+    """Size torch's intra-op pool; one inter-op thread avoids oversubscription."""
+    import torch
+    from runtime.thread_budget import BUDGET
+    torch.set_num_threads(max(1, n_threads or BUDGET.threads("torch")))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass   # can only be set before the first parallel op; keep the default
+
+
+def quantize_t5(model):
+    """Dynamic int8 quantization of linear layers (CPU inference only)."""
+    import torch
+    model.eval()
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def decoding_params(question: str, max_tokens: int = 200) -> Dict:
+    """Greedy for factual questions, a small beam for summaries / explanations."""
+    from generation.extractor import classify_query, is_summary_query
+
+    if is_summary_query(question):
+        return dict(num_beams=2, max_length=min(200, max_tokens), min_length=20,
+                    early_stopping=True, repetition_penalty=1.2)
+    if classify_query(question) == "factual":
+        return dict(num_beams=1, max_length=min(64, max_tokens), min_length=1,
+                    repetition_penalty=1.2)
+    return dict(num_beams=1, max_length=min(200, max_tokens), min_length=5,
+                repetition_penalty=1.2)
+
+
+class T5PromptEncoder:
+    """Tokenizes preamble once, then only context + question per request."""
+
+    def __init__(self, tokenizer, max_input: int = 1024):
+        self.tokenizer = tokenizer
+        self.max_input = max_input
+        self.preamble_ids = tokenizer(T5_PREAMBLE, add_special_tokens=False).input_ids
+
+    def encode(self, question: str, context: str):
+        """Return a (1, n) input_ids tensor ending in EOS."""
+        import torch
+        body = f"Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"
+        body_ids = self.tokenizer(body, add_special_tokens=False).input_ids
+        room = self.max_input - len(self.preamble_ids) - 1
+        # The context packer keeps us in budget; if not, cut from the
+        # context side so the question at the end survives.
+        if len(body_ids) > room:
+            body_ids = body_ids[-room:]
+        ids = self.preamble_ids + body_ids + [self.tokenizer.eos_token_id]
+        return torch.tensor([ids])
@@ -0,0 +1,314 @@
+"""
+Multi-process Phi-3 worker pool.
+
+Why?
+- Single-stream llama.cpp decode stops scaling long before a many-core box
+  runs out of cores, so one Llama with n_threads=cpu_count wastes most of it
+- N worker processes, each with cpu_count / N threads, decode N answers in
+  parallel for much higher aggregate throughput (every job is re-sized to
+  its share of the CPU budget, runtime/thread_budget.py)
+- Every worker opens the GGUF with use_mmap=True, so the ~2.4 GB of weights
+  live once in the OS page cache and are shared by all workers
+
+The API process never touches the model: it dispatches prompts to an idle
+worker over multiprocessing queues. A monitor thread pings each worker and
+restarts any that died or stopped answering; jobs on a dead worker fail
+with WorkerCrashedError instead of hanging. When a stream's consumer stops
+early (e.g. an SSE client disconnects), the worker is told to cancel and
+stays busy until it reports the job's end, so the next job never queues
+silently behind an abandoned decode.
+
+Enable with the LLM_WORKERS environment variable (see llm_engine.py).
+"""
+from typing import Dict, Iterator, List, Optional
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from runtime.thread_budget import BUDGET
+
+
+HEALTH_CHECK_INTERVAL_S = 5.0
+PING_TIMEOUT_S = 10.0
+START_TIMEOUT_S = 120.0
+
+_FINAL = ("ok", "end", "error")   # worker messages that end a job
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when the worker running a job died before finishing it."""
+
+
+def _worker_main(worker_id: int, model_path: str, n_threads: int, n_ctx: int,
+                 n_batch: int, prefix: str, jobs, results, cancel):
+    """Worker process entry point: load Phi-3 once, then serve jobs forever."""
+    from llama_cpp import Llama
+    from generation.prompt_cache import build_prefix_cache
+    from runtime.thread_budget import set_llama_threads
+
+    llm = Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,
+        n_batch=n_batch,
+        n_threads=n_threads,
+        n_gpu_layers=0,
+        use_mmap=True,          # weights shared through the page cache
+        verbose=False
+    )
+    prefix_cache = build_prefix_cache(llm, prefix) if prefix else None
+    results.put(("ready", worker_id, None))
+
+    while True:
+        kind, job_id, prompt, params = jobs.get()
+        if kind == "stop":
+            break
+        if kind == "ping":
+            results.put(("pong", job_id, worker_id))
+            continue
+        cancel.clear()
+        try:
+            # the API process sizes each job from its CPU budget
+            set_llama_threads(llm, params.pop("n_threads", n_threads))
+            if prefix_cache is not None:
+                prefix_cache.prepare()
+            if kind == "stream":
+                for part in llm(prompt, stream=True, **params):
+                    if cancel.is_set():
+                        break   # the consumer went away
+                    results.put(("piece", job_id, part["choices"][0]["text"]))
+                results.put(("end", job_id, None))
+            else:
+                out = llm(prompt, **params)
+                results.put(("ok", job_id, out["choices"][0]["text"]))
+        except Exception as exc:
+            results.put(("error", job_id, f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process = None
+        self.jobs = None
+        self.cancel = None              # mp.Event: abandon the running stream
+        self.current_job: Optional[int] = None
+        self.restarts = 0
+        self.last_pong = 0.0
+        self.ready = threading.Event()
+
+
+class LLMWorkerPool:
+    def __init__(
+        self,
+        model_path: str,
+        n_workers: int,
+        threads_per_worker: Optional[int] = None,
+        n_ctx: int = 4096,
+        n_batch: int = 512,
+        prefix: str = ""
+    ):
+        self.model_path = model_path
+        self.n_workers = max(1, n_workers)
+        self.threads_per_worker = threads_per_worker or max(
+            1, BUDGET.threads("llm") // self.n_workers
+        )
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.prefix = prefix
+
+        self._ctx = mp.get_context("spawn")   # never fork a process holding torch threads
+        self._results = self._ctx.Queue()
+        self._workers: List[_Worker] = [_Worker(i) for i in range(self.n_workers)]
+        self._idle: "queue.Queue[int]" = queue.Queue()
+        self._pending: Dict[int, "queue.Queue"] = {}
+        self._draining: Dict[int, int] = {}   # cancelled job id -> worker id
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Spawn all workers and wait until each has loaded the model."""
+        print(f"[LLM] Starting {self.n_workers} Phi-3 workers "
+              f"x {self.threads_per_worker} threads (mmap-shared weights) ...")
+        threading.Thread(target=self._read_results, name="llm-pool-results", daemon=True).start()
+        for w in self._workers:
+            self._spawn(w)
+        for w in self._workers:
+            if not w.ready.wait(START_TIMEOUT_S):
+                raise RuntimeError(f"LLM worker {w.worker_id} did not start in time.")
+        threading.Thread(target=self._monitor, name="llm-pool-monitor", daemon=True).start()
+        print("[LLM] Worker pool ready.")
+
+    def close(self):
+        self._closed = True
+        for w in self._workers:
+            if w.process is not None and w.process.is_alive():
+                w.jobs.put(("stop", None, None, None))
+                w.process.join(timeout=5)
+                if w.process.is_alive():
+                    w.process.terminate()
+
+    def _spawn(self, w: _Worker):
+        w.ready.clear()
+        w.jobs = self._ctx.Queue()
+        w.cancel = self._ctx.Event()
+        w.process = self._ctx.Process(
+            target=_worker_main,
+            args=(w.worker_id, self.model_path, self.threads_per_worker,
+                  self.n_ctx, self.n_batch, self.prefix, w.jobs, self._results, w.cancel),
+            name=f"llm-worker-{w.worker_id}",
+            daemon=True
+        )
+        w.process.start()
+        w.last_pong = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def generate(self, prompt: str, params: Dict) -> str:
+        """Run one completion on an idle worker and return its text."""
+        for kind, payload in self._dispatch("generate", prompt, params):
+            if kind == "ok":
+                return payload
+        raise WorkerCrashedError("Worker returned no result.")
+
+    def stream(self, prompt: str, params: Dict) -> Iterator[str]:
+        """Run a streaming completion on an idle worker, yielding text pieces."""
+        for kind, payload in self._dispatch("stream", prompt, params):
+            if kind == "piece":
+                yield payload
+            elif kind == "end":
+                return
+
+    def _dispatch(self, kind: str, prompt: str, params: Dict):
+        worker_id = self._idle.get()        # blocks until a worker is free
+        w = self._workers[worker_id]
+        job_id = next(self._ids)
+        inbox: "queue.Queue" = queue.Queue()
+        finished = False
+        with self._lock:
+            self._pending[job_id] = inbox
+            w.current_job = job_id
+        try:
+            w.jobs.put((kind, job_id, prompt, params))
+            while True:
+                msg_kind, payload = inbox.get()
+                finished = msg_kind in _FINAL
+                if msg_kind == "error":
+                    raise RuntimeError(f"LLM worker {worker_id}: {payload}")
+                if msg_kind == "crashed":
+                    raise WorkerCrashedError(f"LLM worker {worker_id} died mid-generation.")
+                yield msg_kind, payload
+                if msg_kind in ("ok", "end"):
+                    return
+        finally:
+            with self._lock:
+                self._pending.pop(job_id, None)
+                # the final message may already be delivered but unread
+                while not finished:
+                    try:
+                        finished = inbox.get_nowait()[0] in _FINAL
+                    except queue.Empty:
+                        break
+                if w.current_job == job_id:
+                    if finished or not w.process.is_alive():
+                        self._release(w)
+                    else:
+                        # the consumer stopped early while the worker still
+                        # decodes: stop it, keep it busy until it reports the end
+                        w.cancel.set()
+                        self._draining[job_id] = worker_id
+
+    def _release(self, w: _Worker):
+        """Mark w idle after its job ended (caller holds self._lock)."""
+        w.current_job = None
+        w.last_pong = time.monotonic()   # it just answered us
+        # a crashed worker is re-queued as idle by the monitor
+        if w.process.is_alive():
+            self._idle.put(w.worker_id)
+
+    def _read_results(self):
+        while not self._closed:
+            try:
+                kind, job_id, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "ready":
+                w = self._workers[job_id]
+                w.ready.set()
+                self._idle.put(w.worker_id)
+                continue
+            if kind == "pong":
+                self._workers[payload].last_pong = time.monotonic()
+                continue
+            # delivered under the lock: _dispatch's cleanup either sees the
+            # message in the inbox or finds the job draining, never neither
+            with self._lock:
+                inbox = self._pending.get(job_id)
+                if inbox is not None:
+                    inbox.put((kind, payload))
+                elif kind in _FINAL and job_id in self._draining:
+                    w = self._workers[self._draining.pop(job_id)]
+                    if w.current_job == job_id:
+                        self._release(w)
+
+    # ------------------------------------------------------------------
+    # Health checks
+    # ------------------------------------------------------------------
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(HEALTH_CHECK_INTERVAL_S)
+            for w in self._workers:
+                if not w.ready.is_set():
+                    continue
+                hung = (w.current_job is None
+                        and time.monotonic() - w.last_pong > PING_TIMEOUT_S + HEALTH_CHECK_INTERVAL_S)
+                if w.process.is_alive() and not hung:
+                    if w.current_job is None:
+                        w.jobs.put(("ping", None, None, None))
+                    continue
+                self._restart(w)
+
+    def _restart(self, w: _Worker):
+        print(f"[LLM] Worker {w.worker_id} unhealthy — restarting.")
+        with self._lock:
+            job_id = w.current_job
+            w.current_job = None
+            self._draining.pop(job_id, None)
+            inbox = self._pending.get(job_id) if job_id is not None else None
+        if inbox is not None:
+            inbox.put(("crashed", None))
+        if w.process.is_alive():
+            w.process.terminate()
+        w.process.join(timeout=5)
+        # drop the stale idle entry (if any) so the worker is listed only once
+        remaining = []
+        while True:
+            try:
+                wid = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if wid != w.worker_id:
+                remaining.append(wid)
+        for wid in remaining:
+            self._idle.put(wid)
+        w.restarts += 1
+        self._spawn(w)   # "ready" puts it back on the idle queue
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.n_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "busy": sum(1 for w in self._workers if w.current_job is not None),
+            "alive": sum(1 for w in self._workers if w.process and w.process.is_alive()),
+            "restarts": sum(w.restarts for w in self._workers),
+        }
@@ -5,6 +5,8 @@ No external NLP libraries needed — pure regex.
 from typing import List, Dict
 import re
 
+from monitoring.metrics import timed_stage
+
 
 def split_into_sentences(text: str) -> List[str]:
     """Split a block of text into sentences using regex."""
@@ -14,6 +16,7 @@ def split_into_sentences(text: str) -> List[str]:
     return [s.strip() for s in sentences if s.strip()]
 
 
+@timed_stage("chunk")
 def semantic_chunk(
     pages: List[Dict],
     max_words: int = 250,
@@ -0,0 +1,67 @@
+"""
+Command-line ingestion: build the knowledge base from PDFs without the UI.
+
+Run from the project root:
+    python -m ingestion.cli storage/report.pdf
+    python -m ingestion.cli storage/report.pdf --no-ocr
+    python -m ingestion.cli corpus/ more/a.pdf    # every PDF, one knowledge base
+
+Heavy dependencies (pdfplumber, chromadb, sentence-transformers / torch) are
+imported inside main(), so `--help` and argument errors return instantly.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+
+def _pdf_paths(paths: List[str]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(".pdf")
+            ))
+        else:
+            found.append(path)
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build vector, BM25 and entity indexes from PDFs.")
+    parser.add_argument("pdf", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip OCR for sparse pages")
+    args = parser.parse_args(argv)
+
+    from ingestion.pdf_reader import extract_pages
+    from ingestion.chunker import semantic_chunk
+    from ingestion.entity_extractor import extract_entities
+    from retrieval.index_generations import IndexGenerations
+
+    start = time.perf_counter()
+    n_pages, chunks = 0, []
+    for path in _pdf_paths(args.pdf):
+        pages = extract_pages(path, use_ocr=not args.no_ocr)
+        if not pages or all(len(p["text"].strip()) == 0 for p in pages):
+            print(f"No text extracted from {path}. Scanned PDF?")
+            continue
+        n_pages += len(pages)
+        chunks.extend(semantic_chunk(pages))
+    if not chunks:
+        print("Chunking produced no results.")
+        return 1
+
+    print("Building vector, BM25 and entity indexes...")
+    indexes = IndexGenerations()
+    gen = indexes.build(chunks, extract_entities(chunks))
+    indexes.publish(gen)
+
+    print(f"Done: {n_pages} pages, {len(chunks)} chunks, generation {gen.gen_id} "
+          f"in {time.perf_counter() - start:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
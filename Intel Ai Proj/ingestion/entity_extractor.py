@@ -0,0 +1,68 @@
+"""
+Typed entity extraction at ingest time.
+
+Finds dates, times, monetary amounts, IDs / roll numbers and emails in every
+chunk and records where they occur, so factual questions ("when is the
+exam?", "what is my roll number?") can be answered from an index lookup
+instead of retrieval + reranking + LLM.
+
+Patterns are compiled once at import and shared with
+generation.extractor.extract_exact_answer.
+"""
+from typing import List, Dict
+import re
+
+
+ENTITY_PATTERNS = {
+    "date": re.compile(
+        r'\b(?:\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}'
+        r'|\d{1,2}(?:st|nd|rd|th)? (?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*,? \d{4}'
+        r'|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2}(?:st|nd|rd|th)?,? \d{4})\b',
+        re.IGNORECASE
+    ),
+    "time": re.compile(
+        r'\b(?:[01]?\d|2[0-3]):[0-5]\d\s?(?:AM|PM|am|pm)?(?!\d)'
+        r'|\b(?:1[0-2]|0?[1-9])\s?(?:AM|PM|am|pm)\b'
+    ),
+    "amount": re.compile(
+        r'(?:[$₹€£]|\b(?:Rs|INR|USD|EUR)\.?)\s?\d+(?:,\d{2,3})*(?:\.\d{1,2})?',
+        re.IGNORECASE
+    ),
+    # IDs / roll numbers: 5-15 upper-case alphanumerics containing a digit
+    "id": re.compile(r'\b(?=[A-Z]*\d)[A-Z0-9]{5,15}\b'),
+    "email": re.compile(r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b'),
+}
+
+CONTEXT_BEFORE = 200   # chars kept before an entity (labels usually precede values)
+CONTEXT_AFTER = 100
+
+
+def extract_entities(chunks: List[Dict]) -> List[Dict]:
+    """
+    Extract typed entities from chunk dicts.
+
+    Args:
+        chunks: List of {"text", "page", "chunk_index", "source"}
+
+    Returns:
+        List of {"type", "value", "page", "chunk_index", "source",
+                 "context", "offset"} where offset is the entity's start
+        position inside context
+    """
+    entities = []
+    for c in chunks:
+        text = c["text"]
+        for etype, pattern in ENTITY_PATTERNS.items():
+            for m in pattern.finditer(text):
+                lo = max(0, m.start() - CONTEXT_BEFORE)
+                entities.append({
+                    "type": etype,
+                    "value": m.group(0).strip(),
+                    "page": c.get("page", "?"),
+                    "chunk_index": c.get("chunk_index", -1),
+                    "source": c.get("source", "?"),
+                    "context": text[lo:m.end() + CONTEXT_AFTER],
+                    "offset": m.start() - lo,
+                })
+    print(f"Entity extraction: {len(entities)} entities from {len(chunks)} chunks.")
+    return entities
@@ -2,13 +2,15 @@
 Image captioning module using Salesforce BLIP model.
 Improved: higher resolution crops, page-aware captions, lazy loading.
 """
-from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
-import torch
 
 
 class ImageCaptioner:
     def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base"):
+        # Deferred so text-only ingestion never pays the torch/transformers import
+        import torch
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.ready = False
         print(f"Initializing Image Captioner on {self.device}...")
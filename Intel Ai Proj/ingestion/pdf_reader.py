@@ -6,13 +6,19 @@ Returns a list of page dicts instead of a single string —
 enabling page-level metadata for source attribution.
 """
 import pdfplumber
-import pytesseract
 from tinydb import TinyDB, Query
-from ingestion.image_captioner import ImageCaptioner
 from ingestion.table_extractor import table_to_text
+from monitoring.metrics import stage_timer
+from monitoring import tracing
+from runtime.thread_budget import BUDGET
+from runtime.tuning import TUNING
 import os
+import subprocess
+import tempfile
 
 
+OCR_DPI = TUNING["ocr_dpi"]   # page render resolution for Tesseract
+
 # Storage for raw table data
 _table_db = None
 
@@ -25,6 +31,29 @@ def get_table_db() -> TinyDB:
     return _table_db
 
 
+def ocr_image(image, n_threads: int) -> str:
+    """
+    Tesseract text of a PIL image using at most n_threads OpenMP threads.
+
+    Runs the tesseract binary directly: pytesseract always hands the child
+    our os.environ, and setting OMP_THREAD_LIMIT there would race between
+    concurrent uploads.
+    """
+    import pytesseract   # for the configured tesseract_cmd
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "page.png")
+        image.save(path)
+        proc = subprocess.run(
+            [pytesseract.pytesseract.tesseract_cmd, path, "stdout"],
+            env={**os.environ, "OMP_THREAD_LIMIT": str(n_threads)},
+            capture_output=True
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", errors="replace").strip())
+    return proc.stdout.decode("utf-8", errors="replace")
+
+
+@tracing.traced("extract_pages")
 def extract_pages(pdf_path: str, use_ocr: bool = True) -> list:
     """
     Extract all pages from a PDF, returning rich structured data per page.
@@ -44,28 +73,35 @@ def extract_pages(pdf_path: str, use_ocr: bool = True) -> list:
     FileQ = Query()
     db.remove(FileQ.file == source)
 
-    # Lazy-load captioner (avoid startup cost if PDF has no images)
-    captioner = ImageCaptioner()
+    # Lazy-load captioner on the first page with images (text-only PDFs never
+    # import transformers / torch or load BLIP)
+    captioner = None
 
-    with pdfplumber.open(pdf_path) as pdf:
+    with stage_timer("pdf_open"):
+        pdf = pdfplumber.open(pdf_path)
+    with pdf:
         print(f"Processing {len(pdf.pages)} pages from '{source}'...")
 
         for i, page in enumerate(pdf.pages):
             page_num = i + 1
-            text = page.extract_text() or ""
+            with stage_timer("text_extract"):
+                text = page.extract_text() or ""
 
             # --- OCR Fallback ---
             if use_ocr and len(text.strip()) < 50:
                 try:
                     print(f"  Page {page_num}: sparse text, trying OCR...")
-                    im = page.to_image(resolution=300)
-                    text = pytesseract.image_to_string(im.original)
+                    with stage_timer("ocr"):
+                        im = page.to_image(resolution=OCR_DPI)
+                        text = ocr_image(im.original, BUDGET.threads("ocr"))
                 except Exception as e:
                     print(f"  OCR failed page {page_num}: {e}")
 
             # --- Table Extraction ---
-            # Tables are stored in TinyDB AND injected as readable text into the page
-            tables = page.extract_tables()
+            # Raw cells go to TinyDB for the table viewer; the readable text is
+            # injected into the page and stored once, in the chunk store
+            with stage_timer("table_extract"):
+                tables = page.extract_tables()
             for t_idx, table in enumerate(tables):
                 if not table:
                     continue
@@ -74,21 +110,24 @@ def extract_pages(pdf_path: str, use_ocr: bool = True) -> list:
                     "file": source,
                     "page": page_num,
                     "table_index": t_idx,
-                    "data": table,
-                    "text_repr": text_repr
+                    "data": table
                 })
                 # Inject table text so it gets chunked and embedded
                 text += f"\n{text_repr}\n"
 
             # --- Image Captioning (150 DPI for better quality) ---
-            if captioner.ready and page.images:
+            if page.images and captioner is None:
+                from ingestion.image_captioner import ImageCaptioner
+                captioner = ImageCaptioner()
+            if captioner is not None and captioner.ready and page.images:
                 for img in page.images:
                     try:
                         bbox = (img["x0"], img["top"], img["x1"], img["bottom"])
                         cropped = page.crop(bbox)
                         # 150 DPI is 2x the original 72 DPI for better BLIP accuracy
                         im_obj = cropped.to_image(resolution=150).original
-                        caption = captioner.generate_caption(im_obj)
+                        with stage_timer("caption"):
+                            caption = captioner.generate_caption(im_obj)
                         if caption and "Error" not in caption:
                             text += f"\n[Image on page {page_num}: {caption}]\n"
                     except Exception as e:
@@ -118,5 +157,6 @@ def extract_pages(pdf_path: str, use_ocr: bool = True) -> list:
             })
 
     total_tables = db.search(FileQ.file == source)
+    tracing.current_span().set(pages=len(pages_data), tables=len(total_tables))
     print(f"Done: {len(pages_data)} pages, {len(total_tables)} tables extracted.")
     return pages_data
@@ -0,0 +1,273 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Why not prometheus_client?
+- One more dependency for three metric types we use in a handful of places
+- Everything here is a dict lookup + lock per observation (~2 µs), cheap
+  enough to leave on in production
+
+Metrics live in a module-level REGISTRY and are served by GET /metrics.
+Values are per process: Phi-3 pool workers (generation/worker_pool.py) do
+not report their own, but the API process still times every generation
+it dispatches to them.
+
+Usage:
+    with stage_timer("ocr"):
+        text = pytesseract.image_to_string(img)
+
+    @timed_stage("chunk")
+    def semantic_chunk(...): ...
+
+    CACHE_HITS.inc(3, cache="rerank")
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import functools
+import threading
+import time
+
+from monitoring import tracing
+
+
+# Seconds; covers a cached BM25 lookup (~1 ms) up to a long CPU generation
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for this metric (without HELP / TYPE)."""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; may be read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn: Optional[Callable[[], float]]):
+        """Read the (unlabelled) value from fn at every scrape."""
+        self._function = fn
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in items]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (le buckets, _sum, _count)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS,
+                 registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)   # len(buckets) -> +Inf only
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        out = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                out.append(f"{self.name}_bucket"
+                           f"{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            out.append(f"{self.name}_sum{labels} {total!r}")
+            out.append(f"{self.name}_count{labels} {count}")
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+# stage: pdf_open, text_extract, ocr, table_extract, caption, chunk, embed,
+#        chroma_insert, query_embed, chroma_query, vector_search (memory-mapped
+#        bundle generations), doc_search, bm25_search, shard_search,
+#        chunk_fetch, rerank, prompt_eval, generate
+STAGE_SECONDS = Histogram(
+    "pdfqa_stage_seconds", "Time spent per pipeline stage.", ("stage",)
+)
+CACHE_HITS = Counter(
+    "pdfqa_cache_hits_total", "Lookups served from a cache.", ("cache",)
+)
+CACHE_MISSES = Counter(
+    "pdfqa_cache_misses_total", "Lookups that had to be computed.", ("cache",)
+)
+LLM_BYPASS = Counter(
+    "pdfqa_llm_bypass_total",
+    "Answers produced without an LLM generation, by reason.", ("reason",)
+)
+QUERIES = Counter(
+    "pdfqa_queries_total", "Questions answered, by latency profile.", ("profile",)
+)
+QUEUE_DEPTH = Gauge(
+    "pdfqa_generation_queue_depth", "Generations queued or running."
+)
+QUEUE_REJECTED = Counter(
+    "pdfqa_generation_rejected_total", "Generations rejected because the queue was full."
+)
+EMBED_THROUGHPUT = Gauge(
+    "pdfqa_embed_chunks_per_second",
+    "Chunks embedded per busy second in the last ingest, by worker.", ("worker",)
+)
+
+
+class _StageTimer(_Timer):
+    """Observes into STAGE_SECONDS and, inside a trace, records a span."""
+    __slots__ = ("span",)
+
+    def __init__(self, stage: str):
+        super().__init__(STAGE_SECONDS, {"stage": stage})
+        self.span = tracing.span(stage)
+
+    def __enter__(self):
+        self.span.__enter__()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        return self.span.__exit__(*exc)
+
+
+def stage_timer(stage: str) -> _StageTimer:
+    """`with stage_timer("ocr"):` — observe a block into STAGE_SECONDS."""
+    return _StageTimer(stage)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _StageTimer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,234 @@
+"""
+Per-request tracing and on-demand sampling profiles.
+
+A trace is a tree of timed spans kept in a contextvar, so nothing has to
+be passed through function signatures:
+
+    with DebugSession("query", "trace") as dbg:
+        engine.answer_question(q)          # spans recorded inside
+    dbg.report()   # {"trace": {"name", "duration_ms", "attrs", "children"}}
+
+Instrumented code calls span() / @traced / current_span().set(...); when no
+trace is active these are a single ContextVar lookup, so they stay in the
+hot path permanently. Metric stage timers (monitoring.metrics.stage_timer)
+also open spans, so every timed stage shows up in the tree.
+
+Work handed to another thread (the generation scheduler) keeps its parent
+span when wrapped with bind().
+
+With mode "profile" a SamplingProfiler additionally samples the stacks of
+every thread that took part in the request and writes them as folded stacks
+(storage/profiles/<trace_id>.folded), loadable by flamegraph.pl or
+speedscope.
+"""
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, List, Optional, Set
+import functools
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+DEBUG_MODES = ("trace", "profile")
+PROFILE_DIR = os.path.join("storage", "profiles")
+SAMPLE_INTERVAL_S = 0.005   # 200 Hz
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.threads: Set[int] = set()   # thread idents that ran spans
+        self.root: Optional[Span] = None
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "trace")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], trace: Trace):
+        self.name = name
+        self.attrs = attrs
+        self.trace = trace
+        self.children: List[Span] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, **attrs):
+        """Attach sizes / counts (candidates, tokens, pages ...) to the span."""
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict:
+        origin = self.start if origin is None else origin
+        end = self.end if self.end is not None else time.perf_counter()
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round((end - self.start) * 1000, 2),
+        }
+        if self.attrs:
+            node["attrs"] = self.attrs
+        if self.children:
+            node["children"] = [c.to_dict(origin) for c in list(self.children)]
+        return node
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def current_span():
+    """The innermost active span, or a no-op span outside a trace."""
+    return _current.get() or NULL_SPAN
+
+
+class span:
+    """`with span("rerank", pairs=30) as s:` — child of the current span."""
+    __slots__ = ("name", "attrs", "_span", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            return NULL_SPAN
+        self._span = Span(self.name, self.attrs, parent.trace)
+        parent.children.append(self._span)
+        parent.trace.threads.add(threading.get_ident())
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, *exc):
+        if self._span is not None:
+            self._span.end = time.perf_counter()
+            _current.reset(self._token)
+            self._span = None
+        return False
+
+
+def traced(name: str):
+    """Decorator: run the function inside span(name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn: Callable) -> Callable:
+    """Run fn (later, on any thread) under the caller's current span."""
+    if _current.get() is None:
+        return fn
+    ctx = copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of a trace's threads every `interval` seconds and
+    writes folded stacks ("outer;inner;leaf count" per line).
+    """
+
+    def __init__(self, trace: Trace, interval: float = SAMPLE_INTERVAL_S,
+                 out_dir: str = PROFILE_DIR):
+        self.trace = trace
+        self.interval = interval
+        self.path = os.path.join(out_dir, f"{trace.trace_id}.folded")
+        self.samples = 0
+        self._counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self._counts.items()):
+                f.write(f"{stack} {n}\n")
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in list(self.trace.threads):
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self._counts[key] = self._counts.get(key, 0) + 1
+                self.samples += 1
+
+
+class DebugSession:
+    """
+    Scope for one debugged request.
+
+    Args:
+        name: Root span name ("query", "upload", ...)
+        mode: None (inert), "trace" (span tree) or "profile" (span tree +
+              folded-stack profile of the request's threads)
+    """
+
+    def __init__(self, name: str, mode: Optional[str] = None):
+        if mode is not None and mode not in DEBUG_MODES:
+            raise ValueError(f"Unknown debug mode '{mode}'. Choose from: {', '.join(DEBUG_MODES)}")
+        self.name = name
+        self.mode = mode
+        self.trace: Optional[Trace] = None
+        self.profiler: Optional[SamplingProfiler] = None
+        self._token = None
+
+    def __enter__(self):
+        if self.mode is None:
+            return self
+        self.trace = Trace()
+        self.trace.root = Span(self.name, {}, self.trace)
+        self.trace.threads.add(threading.get_ident())
+        self._token = _current.set(self.trace.root)
+        if self.mode == "profile":
+            self.profiler = SamplingProfiler(self.trace).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trace is None:
+            return False
+        self.trace.root.end = time.perf_counter()
+        _current.reset(self._token)
+        if self.profiler is not None:
+            self.profiler.__exit__(*exc)
+        return False
+
+    def report(self) -> Optional[Dict]:
+        """{"trace_id", "trace": span tree[, "profile": path, "samples"]} or None."""
+        if self.trace is None:
+            return None
+        out = {"trace_id": self.trace.trace_id, "trace": self.trace.root.to_dict()}
+        if self.profiler is not None:
+            out["profile"] = self.profiler.path
+            out["samples"] = self.profiler.samples
+        return out
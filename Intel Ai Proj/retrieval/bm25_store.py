@@ -6,20 +6,35 @@ Why BM25 alongside dense vectors?
 - Dense vectors excel at semantic/paraphrase matches
 - Together: ~30-50% better retrieval coverage
 
+The index keeps chunk IDs only; text lives in the chunk store
+(retrieval/chunk_store.py). Pickles from before the chunk store held the
+full corpus and are still readable: load() exposes it as legacy_corpus so
+the caller can migrate it.
+
 Requires: pip install rank-bm25
 """
-from rank_bm25 import BM25Okapi
-from typing import List, Dict
+from typing import List, Dict, Optional
 import pickle
 import os
 import re
 
+from monitoring.metrics import stage_timer
+from retrieval.chunk_store import chunk_id
+
+
+def tokenize(text: str) -> List[str]:
+    """Simple whitespace + punctuation tokenizer."""
+    return re.findall(r'\b\w+\b', text.lower())
+
 
 class BM25Store:
     def __init__(self, index_path: str = "bm25_index.pkl"):
         self.index_path = index_path
-        self.corpus: List[Dict] = []
-        self.bm25: BM25Okapi = None
+        self.ids: List[str] = []   # row i of the BM25 matrix -> chunk ID
+        self.row_sources: Optional[List[str]] = None   # row i -> source file
+        self.bm25 = None   # rank_bm25.BM25Okapi, imported on first build
+        self.legacy_corpus: Optional[List[Dict]] = None
+        self._rows_by_source: Optional[Dict[str, List[int]]] = None
 
     def build(self, chunks: List[Dict]):
         """
@@ -28,21 +43,36 @@ class BM25Store:
         Args:
             chunks: List of {"text": str, "page": int, "source": str, ...}
         """
-        self.corpus = chunks
+        from rank_bm25 import BM25Okapi
+
+        self.ids = [chunk_id(c) for c in chunks]
+        self.row_sources = [str(c["source"]) for c in chunks]
         tokenized = [self._tokenize(c["text"]) for c in chunks]
         self.bm25 = BM25Okapi(tokenized)
+        self.legacy_corpus = None
+        self._rows_by_source = None
+        self.save()
+        print(f"BM25 index built: {len(chunks)} documents.")
 
+    def save(self):
         with open(self.index_path, "wb") as f:
-            pickle.dump((self.corpus, self.bm25), f)
-        print(f"BM25 index built: {len(chunks)} documents.")
+            pickle.dump((self.ids, self.bm25, self.row_sources), f)
 
     def load(self) -> bool:
         """Load index from disk. Returns True if successful."""
         if os.path.exists(self.index_path):
             try:
                 with open(self.index_path, "rb") as f:
-                    self.corpus, self.bm25 = pickle.load(f)
-                print(f"BM25 index loaded: {len(self.corpus)} documents.")
+                    data = pickle.load(f)
+                ids, self.bm25 = data[0], data[1]
+                self.row_sources = data[2] if len(data) > 2 else None
+                if ids and isinstance(ids[0], dict):   # pre-chunk-store pickle
+                    self.legacy_corpus = ids
+                    self.row_sources = [str(c.get("source", "?")) for c in ids]
+                    ids = [chunk_id(c) for c in ids]
+                self.ids = ids
+                self._rows_by_source = None
+                print(f"BM25 index loaded: {len(self.ids)} documents.")
                 return True
             except Exception as e:
                 print(f"BM25 index load failed: {e}")
@@ -57,14 +87,69 @@ class BM25Store:
             n_results: Number of results to return
 
         Returns:
-            List of chunk dicts (same format as input to build())
+            List of {"chunk_id", "bm25_score"}
         """
-        if not self.bm25 or not self.corpus:
+        if not self.bm25 or not self.ids:
             return []
 
-        tokens = self._tokenize(query)
-        scores = self.bm25.get_scores(tokens)
+        with stage_timer("bm25_search"):
+            tokens = self._tokenize(query)
+            return self._top(self.bm25.get_scores(tokens), n_results)
 
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 6,
+        sources: Optional[List[Optional[List[str]]]] = None
+    ) -> List[List[Dict]]:
+        """
+        BM25 search for a batch of queries.
+
+        Per-term score vectors are computed once per distinct term across the
+        whole batch and summed per query, so terms shared between questions
+        ("what", "date", the document's key nouns) are scored only once.
+
+        Args:
+            sources: Per query, the source files to search (None = all).
+                     Restricted queries score only those files' rows, with
+                     the global IDF (hierarchical retrieval).
+
+        Returns:
+            One result list per query, in input order (same format as search)
+        """
+        if not self.bm25 or not self.ids:
+            return [[] for _ in queries]
+        if sources is None or self.row_sources is None:
+            sources = [None] * len(queries)
+
+        with stage_timer("bm25_search"):
+            tokenized = [self._tokenize(q) for q in queries]
+            unrestricted = {t for tokens, allowed in zip(tokenized, sources)
+                            if allowed is None for t in tokens}
+            term_scores = {term: self.bm25.get_scores([term]) for term in unrestricted}
+            results = []
+            for tokens, allowed in zip(tokenized, sources):
+                if allowed is not None:
+                    rows = self._rows_for(allowed)
+                    scores = self.bm25.get_batch_scores(tokens, rows) if rows and tokens else None
+                    results.append(self._top(scores, n_results, rows) if scores is not None else [])
+                    continue
+                scores = None
+                for t in tokens:
+                    scores = term_scores[t] if scores is None else scores + term_scores[t]
+                results.append(self._top(scores, n_results) if scores is not None else [])
+            return results
+
+    def _rows_for(self, sources: List[str]) -> List[int]:
+        if self._rows_by_source is None:
+            by_source: Dict[str, List[int]] = {}
+            for i, src in enumerate(self.row_sources):
+                by_source.setdefault(src, []).append(i)
+            self._rows_by_source = by_source
+        return [i for src in sources for i in self._rows_by_source.get(src, ())]
+
+    def _top(self, scores, n_results: int, rows: Optional[List[int]] = None) -> List[Dict]:
+        """Top-n chunk IDs with positive scores (scores[j] belongs to row rows[j])."""
         # Get top indices with positive scores only
         top_idx = sorted(
             range(len(scores)),
@@ -72,22 +157,19 @@ class BM25Store:
             reverse=True
         )[:n_results]
 
-        results = []
-        for i in top_idx:
-            if scores[i] > 0:
-                chunk = dict(self.corpus[i])  # copy to avoid mutation
-                chunk["bm25_score"] = float(scores[i])
-                results.append(chunk)
-
-        return results
+        return [{"chunk_id": self.ids[rows[i] if rows is not None else i],
+                 "bm25_score": float(scores[i])}
+                for i in top_idx if scores[i] > 0]
 
     def clear(self):
         """Remove index from disk."""
         if os.path.exists(self.index_path):
             os.remove(self.index_path)
-        self.corpus = []
+        self.ids = []
+        self.row_sources = None
         self.bm25 = None
+        self.legacy_corpus = None
+        self._rows_by_source = None
 
     def _tokenize(self, text: str) -> List[str]:
-        """Simple whitespace + punctuation tokenizer."""
-        return re.findall(r'\b\w+\b', text.lower())
+        return tokenize(text)
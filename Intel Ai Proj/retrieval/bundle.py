@@ -0,0 +1,238 @@
+"""
+Portable knowledge-base bundles: export a consistent snapshot of the
+serving index generation, import it on another node without re-embedding.
+
+Run from the project root:
+    python -m retrieval.bundle export bundles/kb-2024-06
+    python -m retrieval.bundle import bundles/kb-2024-06
+    python -m retrieval.bundle inspect bundles/kb-2024-06
+
+Bundle layout (one directory, immutable once written):
+    manifest.json       format/version, models, dim, chunk count, sha256 per file
+    vectors.npy         float32 (n, dim) MiniLM embeddings
+    vector_ids.txt      chunk ID of each vector row
+    chunks.db           chunk store: text + page/source/chunk_index by ID
+    bm25_index.pkl      BM25 postings (chunk IDs only)
+    entity_index.json   extracted dates / amounts / IDs (if built)
+    documents.pkl       document centroids + BM25 for hierarchical retrieval (if built)
+    tables_db.json      TinyDB table store (if present)
+
+Import copies the files into a new index generation and publishes it, so
+the vectors are served memory-mapped (retrieval/mmap_vector_store.py):
+no Chroma insert, no embedding pass. Start the API afterwards, or import
+into a running engine's generations with import_bundle(..., indexes=...).
+"""
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+from retrieval.index_generations import IndexGeneration, IndexGenerations
+from retrieval.mmap_vector_store import MmapVectorStore, VECTORS_FILE, IDS_FILE
+from retrieval.shards import RETRIEVAL_SHARDS
+
+
+BUNDLE_FORMAT = "pdfqa-kb-bundle"
+BUNDLE_VERSION = 2   # 2: text moved to chunks.db, indexes hold IDs only
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.db"
+BM25_FILE = "bm25_index.pkl"
+ENTITY_FILE = "entity_index.json"
+DOCUMENTS_FILE = "documents.pkl"
+TABLES_FILE = "tables_db.json"
+TABLES_DB = os.path.join("storage", TABLES_FILE)
+
+
+class BundleError(Exception):
+    """The bundle is missing, corrupt or incompatible with this build."""
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy_atomic(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = dst + ".tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def read_manifest(bundle_dir: str) -> Dict:
+    path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise BundleError(f"No {MANIFEST_FILE} in {bundle_dir}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"{bundle_dir} is not a knowledge-base bundle")
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise BundleError(f"Bundle version {manifest.get('version')} is not supported "
+                          f"(expected {BUNDLE_VERSION})")
+    return manifest
+
+
+def export_bundle(out_dir: str, indexes: Optional[IndexGenerations] = None,
+                  force: bool = False) -> Dict:
+    """
+    Write the serving generation to out_dir.
+
+    The bundle is assembled in a sibling temp directory and renamed into
+    place, so a crashed export never leaves a half-written bundle.
+
+    Returns:
+        The manifest
+    """
+    from retrieval.vector_store import EMBEDDING_MODEL
+    from retrieval.hybrid_retriever import RERANKER_MODEL
+
+    if os.path.exists(out_dir):
+        if not force:
+            raise BundleError(f"{out_dir} already exists (use --force to replace it)")
+        shutil.rmtree(out_dir)
+    indexes = indexes if indexes is not None else IndexGenerations()
+    tmp_dir = out_dir.rstrip("/\\") + ".partial"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with indexes.acquire() as gen:
+        if not os.path.exists(gen.bm25_store.index_path):
+            raise BundleError(f"BM25 index missing ({gen.bm25_store.index_path})")
+        if gen.bm25_store.bm25 is None:
+            indexes.load_bm25()   # also migrates a pre-chunk-store pickle
+        vectors, ids = indexes.vector_store_for(gen).dump()
+        if not ids:
+            raise BundleError("The serving index is empty; ingest a PDF first")
+        MmapVectorStore.write(tmp_dir, vectors, ids)
+        gen.chunk_store.backup(os.path.join(tmp_dir, CHUNKS_FILE))
+        sources = gen.chunk_store.sources()
+        shutil.copyfile(gen.bm25_store.index_path, os.path.join(tmp_dir, BM25_FILE))
+        if os.path.exists(gen.entity_index.index_path):
+            shutil.copyfile(gen.entity_index.index_path, os.path.join(tmp_dir, ENTITY_FILE))
+        if os.path.exists(gen.document_index.index_path):
+            shutil.copyfile(gen.document_index.index_path, os.path.join(tmp_dir, DOCUMENTS_FILE))
+        source_generation = gen.gen_id
+    if os.path.exists(TABLES_DB):
+        shutil.copyfile(TABLES_DB, os.path.join(tmp_dir, TABLES_FILE))
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source_generation": source_generation,
+        "embedding_model": EMBEDDING_MODEL,
+        "reranker_model": RERANKER_MODEL,
+        "dim": int(vectors.shape[1]),
+        "chunks": len(ids),
+        "sources": sources,
+        "files": {
+            name: {"sha256": _sha256(os.path.join(tmp_dir, name)),
+                   "bytes": os.path.getsize(os.path.join(tmp_dir, name))}
+            for name in sorted(os.listdir(tmp_dir))
+        },
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+def verify_bundle(bundle_dir: str, manifest: Dict):
+    """Raise BundleError if a listed file is missing or its hash differs."""
+    for name, meta in manifest["files"].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            raise BundleError(f"Bundle file missing: {name}")
+        if _sha256(path) != meta["sha256"]:
+            raise BundleError(f"Bundle file corrupt (sha256 mismatch): {name}")
+
+
+def import_bundle(bundle_dir: str, indexes: Optional[IndexGenerations] = None,
+                  verify: bool = True, force: bool = False) -> IndexGeneration:
+    """
+    Install a bundle as a new index generation and publish it.
+
+    Args:
+        verify: Check every file's sha256 against the manifest
+        force:  Import even if the bundle was embedded with a different model
+                (dense search would then compare incompatible vectors)
+    """
+    from retrieval.vector_store import EMBEDDING_MODEL
+
+    manifest = read_manifest(bundle_dir)
+    if manifest["embedding_model"] != EMBEDDING_MODEL and not force:
+        raise BundleError(f"Bundle embedded with {manifest['embedding_model']}, "
+                          f"this build uses {EMBEDDING_MODEL}")
+    for name in (VECTORS_FILE, IDS_FILE, CHUNKS_FILE, BM25_FILE):
+        if name not in manifest["files"]:
+            raise BundleError(f"Bundle lacks {name}")
+    if verify:
+        verify_bundle(bundle_dir, manifest)
+
+    indexes = indexes if indexes is not None else IndexGenerations()
+    gen = indexes.new_generation(chroma=False)
+    for name in (VECTORS_FILE, IDS_FILE):
+        shutil.copyfile(os.path.join(bundle_dir, name), os.path.join(gen.directory, name))
+    shutil.copyfile(os.path.join(bundle_dir, CHUNKS_FILE), gen.chunk_store.path)
+    shutil.copyfile(os.path.join(bundle_dir, BM25_FILE), gen.bm25_store.index_path)
+    if ENTITY_FILE in manifest["files"]:
+        shutil.copyfile(os.path.join(bundle_dir, ENTITY_FILE), gen.entity_index.index_path)
+    if DOCUMENTS_FILE in manifest["files"]:
+        shutil.copyfile(os.path.join(bundle_dir, DOCUMENTS_FILE), gen.document_index.index_path)
+    if TABLES_FILE in manifest["files"]:
+        _copy_atomic(os.path.join(bundle_dir, TABLES_FILE), TABLES_DB)
+
+    if RETRIEVAL_SHARDS > 1:
+        gen.build_shards(RETRIEVAL_SHARDS)   # derived from the bundle, not shipped in it
+    if indexes.serving:
+        if not gen.sharded:
+            gen.bm25_store.load()
+        gen.entity_index.load()
+        gen.document_index.load()
+    indexes.publish(gen)
+    return gen
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export / import knowledge-base bundles.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Write the serving indexes to a bundle directory")
+    p_export.add_argument("bundle")
+    p_export.add_argument("--force", action="store_true", help="Replace an existing bundle")
+    p_import = sub.add_parser("import", help="Install a bundle as the serving indexes")
+    p_import.add_argument("bundle")
+    p_import.add_argument("--no-verify", action="store_true", help="Skip sha256 checks")
+    p_import.add_argument("--force", action="store_true", help="Ignore an embedding-model mismatch")
+    p_inspect = sub.add_parser("inspect", help="Print a bundle's manifest")
+    p_inspect.add_argument("bundle")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        if args.command == "export":
+            manifest = export_bundle(args.bundle, force=args.force)
+            size = sum(f["bytes"] for f in manifest["files"].values())
+            print(f"Exported {manifest['chunks']} chunks ({size / 1e6:.1f} MB) "
+                  f"to {args.bundle} in {time.perf_counter() - start:.1f}s.")
+        elif args.command == "import":
+            gen = import_bundle(args.bundle, verify=not args.no_verify, force=args.force)
+            print(f"Imported {args.bundle} as generation {gen.gen_id} "
+                  f"in {time.perf_counter() - start:.1f}s.")
+        else:
+            print(json.dumps(read_manifest(args.bundle), indent=2))
+    except BundleError as exc:
+        print(f"Error: {exc}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
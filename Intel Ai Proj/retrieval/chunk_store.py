@@ -0,0 +1,149 @@
+"""
+ID-addressed chunk store: the single copy of every chunk's text.
+
+Why?
+- Chunk text used to be stored three times (Chroma documents, the pickled
+  BM25 corpus, TinyDB table text) and carried through retrieval as full
+  dicts deduplicated by text
+- Now the vector and BM25 indexes keep only chunk IDs (chunk_id below)
+  and text is fetched from here on demand, for the handful of candidates
+  that reach the reranker or the answer
+
+SQLite (stdlib) gives an indexed, memory-light lookup: the OS page cache
+keeps hot chunks resident, cold ones stay on disk. One store per index
+generation (storage/indexes/g<N>/chunks.db).
+"""
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id          TEXT PRIMARY KEY,
+    source      TEXT NOT NULL,
+    page        INTEGER,
+    chunk_index INTEGER NOT NULL,
+    text        TEXT NOT NULL
+)
+"""
+_MAX_PARAMS = 500   # stay well under SQLite's bound-parameter limit
+
+
+def chunk_id(chunk: Dict) -> str:
+    """Short URL-safe ID of a chunk: hash of its source file + chunk index."""
+    raw = f"{chunk.get('source', '?')}#{chunk.get('chunk_index', -1)}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=6).hexdigest()
+
+
+class ChunkStore:
+    def __init__(self, path: str = "chunks.db"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._digests: Dict[str, str] = {}   # source -> digest(), until the next add()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily and shared across threads; every use holds _lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def add(self, chunks: List[Dict]) -> List[str]:
+        """
+        Insert chunks (replacing any with the same ID).
+
+        Returns:
+            Their IDs, in input order
+        """
+        ids = [chunk_id(c) for c in chunks]
+        rows = [
+            (cid, str(c["source"]), c["page"], int(c["chunk_index"]), c["text"])
+            for cid, c in zip(ids, chunks)
+        ]
+        with self._lock:
+            db = self._db()
+            db.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+            db.commit()
+            self._digests.clear()
+        print(f"Chunk store: {len(rows)} chunks written.")
+        return ids
+
+    def get(self, cid: str) -> Optional[Dict]:
+        return self.get_many([cid])[0]
+
+    def get_many(self, ids: List[str]) -> List[Optional[Dict]]:
+        """Chunk dicts for ids, in order (None for unknown IDs)."""
+        found: Dict[str, Dict] = {}
+        unique = list(dict.fromkeys(ids))
+        with self._lock:
+            db = self._db()
+            for start in range(0, len(unique), _MAX_PARAMS):
+                part = unique[start:start + _MAX_PARAMS]
+                rows = db.execute(
+                    "SELECT id, source, page, chunk_index, text FROM chunks "
+                    f"WHERE id IN ({','.join('?' * len(part))})", part
+                )
+                for cid, source, page, index, text in rows:
+                    found[cid] = {"chunk_id": cid, "text": text, "page": page,
+                                  "source": source, "chunk_index": index}
+        return [found.get(cid) for cid in ids]
+
+    def sources(self) -> List[str]:
+        """Distinct source files, in ingestion order."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT source FROM chunks GROUP BY source ORDER BY MIN(rowid)"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def digest(self, source: str) -> str:
+        """Hash of one source's chunk text as stored here (changes on re-ingest)."""
+        with self._lock:
+            if source not in self._digests:
+                h = hashlib.sha256()
+                for (text,) in self._db().execute(
+                    "SELECT text FROM chunks WHERE source = ? ORDER BY chunk_index", (source,)
+                ):
+                    h.update(text.encode("utf-8"))
+                self._digests[source] = h.hexdigest()
+            return self._digests[source]
+
+    def iter_chunks(self) -> Iterable[Dict]:
+        """Every chunk, in ingestion order (snapshot; for exports / rebuilds)."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, source, page, chunk_index, text FROM chunks ORDER BY rowid"
+            ).fetchall()
+        for cid, source, page, index, text in rows:
+            yield {"chunk_id": cid, "text": text, "page": page,
+                   "source": source, "chunk_index": index}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def backup(self, dest: str):
+        """Consistent copy of the database to dest (safe while serving)."""
+        with self._lock:
+            target = sqlite3.connect(dest)
+            try:
+                self._db().backup(target)
+            finally:
+                target.close()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def clear(self):
+        """Remove the store from disk."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,115 @@
+"""
+Document-level index for coarse-to-fine (hierarchical) retrieval.
+
+Why?
+- With thousands of PDFs indexed, flat chunk search scores every chunk for
+  every query and its top-15 fill up with near-misses from unrelated files
+- Stage 1 here ranks whole documents; stage 2 (HybridRetriever) then runs
+  chunk-level dense + BM25 search only inside the top doc_fanout documents
+
+Per source file:
+  centroid   mean of its chunk embeddings, re-normalised (MiniLM vectors
+             are unit length, so a dot product is the cosine)
+  BM25 doc   all of its chunk tokens as one BM25 document
+
+Both rankings are fused with reciprocal-rank fusion, like chunk retrieval.
+With doc_fanout or fewer documents indexed, search_batch returns None for
+every query and retrieval stays flat.
+
+Built at ingest time next to the BM25 index (documents.pkl); generations
+built before this index exist always search flat.
+"""
+from typing import Dict, List, Optional
+import os
+import pickle
+
+from monitoring.metrics import stage_timer
+from retrieval.bm25_store import tokenize
+
+
+RRF_K = 60           # same damping constant as chunk-level fusion
+CANDIDATES = 2       # each ranking contributes fanout * CANDIDATES documents
+
+
+class DocumentIndex:
+    def __init__(self, index_path: str = "documents.pkl"):
+        self.index_path = index_path
+        self.sources: List[str] = []
+        self.centroids = None   # float32 (n_docs, dim)
+        self.bm25 = None        # rank_bm25.BM25Okapi over whole documents
+
+    def build(self, chunks: List[Dict], embeddings):
+        """
+        Args:
+            chunks:     Chunk dicts, as indexed
+            embeddings: Their embeddings, row i = chunks[i]
+        """
+        import numpy as np
+        from rank_bm25 import BM25Okapi
+
+        rows_by_source: Dict[str, List[int]] = {}
+        for i, c in enumerate(chunks):
+            rows_by_source.setdefault(str(c["source"]), []).append(i)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        self.sources = list(rows_by_source)
+        centroids = np.stack([embeddings[rows].mean(axis=0) for rows in rows_by_source.values()])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self.centroids = centroids.astype(np.float32)
+        self.bm25 = BM25Okapi([
+            [t for i in rows for t in tokenize(chunks[i]["text"])]
+            for rows in rows_by_source.values()
+        ])
+        with open(self.index_path, "wb") as f:
+            pickle.dump((self.sources, self.centroids, self.bm25), f)
+        print(f"Document index built: {len(self.sources)} documents.")
+
+    def load(self) -> bool:
+        """Load index from disk. Returns True if successful."""
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "rb") as f:
+                    self.sources, self.centroids, self.bm25 = pickle.load(f)
+                print(f"Document index loaded: {len(self.sources)} documents.")
+                return True
+            except Exception as e:
+                print(f"Document index load failed: {e}")
+        return False
+
+    def clear(self):
+        """Remove index from disk."""
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self.sources, self.centroids, self.bm25 = [], None, None
+
+    def count(self) -> int:
+        return len(self.sources)
+
+    def search_batch(self, queries: List[str], query_embeddings,
+                     fanout: int) -> List[Optional[List[str]]]:
+        """
+        Stage 1: the fanout most relevant source files per query.
+
+        Returns:
+            Per query, a list of source names, or None when no restriction
+            applies (index missing, or fanout covers every document)
+        """
+        if self.bm25 is None or not fanout or len(self.sources) <= fanout:
+            return [None] * len(queries)
+
+        import numpy as np
+        depth = fanout * CANDIDATES
+        with stage_timer("doc_search"):
+            sims = np.asarray(query_embeddings, dtype=np.float32) @ self.centroids.T
+            selected = []
+            for query, row in zip(queries, sims):
+                fused: Dict[int, float] = {}
+                dense = np.argsort(-row)[:depth]
+                keyword = np.asarray(self.bm25.get_scores(tokenize(query)))
+                keyword_top = [d for d in np.argsort(-keyword)[:depth] if keyword[d] > 0]
+                for ranking in (dense, keyword_top):
+                    for rank, d in enumerate(ranking, start=1):
+                        fused[int(d)] = fused.get(int(d), 0.0) + 1.0 / (RRF_K + rank)
+                best = sorted(fused, key=fused.get, reverse=True)[:fanout]
+                selected.append([self.sources[d] for d in best])
+        return selected
@@ -0,0 +1,121 @@
+"""
+Parallel chunk embedding for large ingests.
+
+Why?
+- One encode() call over every chunk runs MiniLM on a single torch
+  intra-op pool, which stops scaling well before a many-core box is busy
+- N spawned worker processes, splitting the CPU budget's embed threads
+  (runtime/thread_budget.py), encode N batches at once for much higher
+  aggregate throughput
+
+Batches are length-sorted: chunks are ordered by text length and cut into
+EMBED_BATCH_SIZE groups (default: the host tuning profile,
+runtime/tuning.py), so each forward pass pads to a near-uniform length
+instead of to the longest chunk in a random mix. The longest batches are
+dispatched first, so the tail of the ingest is short batches that even out
+across workers.
+
+Workers load MiniLM by name once per ingest; below POOL_MIN_CHUNKS the
+start-up costs more than it saves and encoding stays in-process (same
+batching). Throughput per worker (chunks/s while busy) is printed and
+exported as the pdfqa_embed_chunks_per_second gauge.
+
+Enable with EMBED_WORKERS=N (default 1: in-process).
+"""
+from typing import Dict, List, Tuple
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from monitoring.metrics import EMBED_THROUGHPUT
+from runtime.thread_budget import BUDGET
+from runtime.tuning import TUNING
+
+
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "1"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", TUNING["embed_batch_size"]))
+POOL_MIN_CHUNKS = 1000
+
+_model = None   # per worker process
+
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """Row indices grouped into batches of similar length, longest first."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _init_worker(model_name: str, n_threads: int):
+    global _model
+    import torch
+    torch.set_num_threads(n_threads)
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name)
+
+
+def _encode_batch(job: Tuple[List[int], List[str]]):
+    rows, texts = job
+    start = time.perf_counter()
+    vectors = _model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+    return rows, vectors, os.getpid(), time.perf_counter() - start
+
+
+def encode_texts(
+    texts: List[str],
+    model,
+    model_name: str,
+    workers: int = EMBED_WORKERS,
+    batch_size: int = EMBED_BATCH_SIZE
+) -> np.ndarray:
+    """
+    Embed texts with length-sorted batches, in a process pool if it pays off.
+
+    Args:
+        model:      The loaded SentenceTransformer (in-process path)
+        model_name: Its name, loaded by each pool worker
+
+    Returns:
+        float32 (len(texts), dim), row i = texts[i]
+    """
+    batches = length_sorted_batches(texts, batch_size)
+    jobs = [(rows, [texts[i] for i in rows]) for rows in batches]
+    busy: Dict[str, List[float]] = {}   # worker -> [chunks, seconds]
+    out = None
+    start = time.perf_counter()
+
+    def collect(rows, vectors, worker, seconds):
+        nonlocal out
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[rows] = vectors
+        done = busy.setdefault(worker, [0, 0.0])
+        done[0] += len(rows)
+        done[1] += seconds
+
+    if workers > 1 and len(texts) >= POOL_MIN_CHUNKS:
+        n_threads = max(1, BUDGET.threads("embed") // workers)
+        print(f"Embedding with {workers} workers x {n_threads} threads, "
+              f"{len(batches)} batches of <= {batch_size}...")
+        ctx = mp.get_context("spawn")   # never fork a process holding torch threads
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(model_name, n_threads)) as pool:
+            pids: Dict[int, str] = {}
+            for rows, vectors, pid, seconds in pool.imap_unordered(_encode_batch, jobs):
+                collect(rows, vectors, pids.setdefault(pid, str(len(pids))), seconds)
+    else:
+        for rows, batch in jobs:
+            t0 = time.perf_counter()
+            vectors = model.encode(batch, batch_size=len(batch), convert_to_numpy=True)
+            collect(rows, np.asarray(vectors), "main", time.perf_counter() - t0)
+
+    elapsed = time.perf_counter() - start
+    per_worker = []
+    for worker, (chunks, seconds) in sorted(busy.items()):
+        rate = chunks / seconds if seconds else 0.0
+        EMBED_THROUGHPUT.set(round(rate, 1), worker=worker)
+        per_worker.append(f"worker {worker}: {rate:.0f}")
+    print(f"Embedded {len(texts)} chunks in {elapsed:.1f}s "
+          f"({len(texts) / elapsed if elapsed else 0.0:.0f} chunks/s; "
+          f"{', '.join(per_worker)} chunks/s)")
+    return out
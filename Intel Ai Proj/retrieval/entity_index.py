@@ -0,0 +1,102 @@
+"""
+Entity index: instant answers for factual queries.
+
+Built at ingest time from ingestion.entity_extractor output and stored as
+JSON next to the BM25 index. A lookup picks every entity of the requested
+type and ranks it by how close the query keywords occur to it in the
+source text — "exam date" prefers the date right after "Exam Date:" over
+the print date in the footer.
+
+No embedding, reranking or LLM call is involved, so lookups take
+milliseconds.
+"""
+from typing import List, Dict, Optional
+import json
+import os
+import re
+
+
+_STOP_WORDS = {
+    "what", "is", "the", "a", "an", "of", "in", "to", "for", "with", "on",
+    "at", "by", "from", "how", "many", "much", "my", "me", "i", "are",
+    "was", "which", "when", "where", "who", "does", "do", "give", "tell",
+}
+
+
+def query_keywords(query: str) -> List[str]:
+    return [w for w in re.findall(r'\w+', query.lower())
+            if w not in _STOP_WORDS and len(w) > 1]
+
+
+class EntityIndex:
+    def __init__(self, index_path: str = "entity_index.json"):
+        self.index_path = index_path
+        self.entities: List[Dict] = []
+        self._by_type: Dict[str, List[Dict]] = {}
+
+    def build(self, entities: List[Dict]):
+        """Replace the index with new entities and persist it."""
+        self._set(entities)
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(entities, f)
+        print(f"Entity index built: {len(entities)} entities.")
+
+    def load(self) -> bool:
+        """Load index from disk. Returns True if successful."""
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    self._set(json.load(f))
+                print(f"Entity index loaded: {len(self.entities)} entities.")
+                return True
+            except Exception as e:
+                print(f"Entity index load failed: {e}")
+        return False
+
+    def clear(self):
+        """Remove index from disk."""
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self._set([])
+
+    def _set(self, entities: List[Dict]):
+        self.entities = entities
+        self._by_type = {}
+        for e in entities:
+            self._by_type.setdefault(e["type"], []).append(e)
+
+    def lookup(self, entity_type: str, query: str) -> Optional[Dict]:
+        """
+        Best entity of a type for a query, ranked by keyword proximity.
+
+        Score = sum over query keywords present in the entity's context of
+        1 / (1 + char_distance / 50). Entities with no keyword nearby are
+        never returned, so unrelated values don't become answers.
+
+        Returns:
+            The entity dict plus "proximity_score", or None
+        """
+        keywords = query_keywords(query)
+        if not keywords:
+            return None
+
+        best, best_score = None, 0.0
+        for e in self._by_type.get(entity_type, []):
+            ctx = e["context"].lower()
+            score = 0.0
+            for kw in keywords:
+                positions = [m.start() for m in re.finditer(r'\b' + re.escape(kw) + r'\b', ctx)]
+                if positions:
+                    dist = min(abs(p - e["offset"]) for p in positions)
+                    score += 1.0 / (1.0 + dist / 50.0)
+            # ties go to the earlier chunk (titles / headers come first)
+            if score > best_score or (score == best_score and best is not None
+                                      and score > 0 and e["chunk_index"] < best["chunk_index"]):
+                best, best_score = e, score
+
+        if best is None:
+            return None
+        return dict(best, proximity_score=round(best_score, 4))
+
+    def count(self) -> int:
+        return len(self.entities)
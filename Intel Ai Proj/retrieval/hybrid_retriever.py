@@ -2,86 +2,409 @@
 Hybrid Retriever: BM25 + Dense Vector Search + Cross-Encoder Reranking.
 
 Pipeline:
-  1. Dense vector search (semantic similarity)     -> top-6 candidates
-  2. BM25 keyword search (exact term matching)     -> top-6 candidates
-  3. Merge + deduplicate by text                   -> up to 12 unique candidates
-  4. Cross-encoder reranks all candidates          -> most relevant bubbles up
+  0. Optional coarse stage (doc_fanout): rank whole documents by centroid
+     + document-level BM25, search chunks only in the best doc_fanout
+  1. Dense vector search (semantic similarity)     -> top-15 candidates
+  2. BM25 keyword search (exact term matching)     -> top-15 candidates
+  3. Reciprocal-rank fusion, deduplicated by ID    -> fused candidate list
+     (text fetched from the chunk store for the reranked head only)
+  4. Adaptive reranking:
+       - fused top result wins by a clear margin   -> skip the cross-encoder
+       - otherwise cross-encoder reranks top-N     -> most relevant bubbles up
   5. Return top_k results with full metadata
 
 Why this is better than top-3 dense-only search:
   - BM25 catches names, codes, numbers that dense search misses
   - Cross-encoder considers the FULL query+document pair (not just cosine)
   - Net result: ~40-60% better answer accuracy on document QA tasks
+
+Why adaptive reranking?
+  - When dense and BM25 agree on a clear winner the cross-encoder rarely
+    changes the answer, so its ~30 forward passes are pure latency
+  - Fusion keeps both dense and BM25 evidence instead of discarding it
+
+The vector, BM25 and entity indexes belong to the serving index generation
+(retrieval/index_generations.py); each retrieval pins one generation, so a
+re-ingestion published mid-query never mixes old and new results. Sharded
+generations run steps 1-2 in their shard workers (retrieval/shards.py);
+steps 0 and 3-5 stay here, so the cross-encoder still runs once.
 """
-from retrieval.vector_store import VectorStore
-from retrieval.bm25_store import BM25Store
-from sentence_transformers import CrossEncoder
-from typing import List, Dict
+from retrieval.index_generations import IndexGenerations
+from retrieval.reranker import RerankCache, RerankBatcher, normalize_query, chunk_key
+from monitoring.metrics import STAGE_SECONDS, CACHE_HITS, CACHE_MISSES, stage_timer
+from monitoring import tracing
+from runtime.thread_budget import BUDGET
+from runtime.tuning import TUNING
+from typing import List, Dict, Optional, Tuple
+import threading
+import time
 
 
 RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"   # ~80 MB, CPU-friendly
+RERANK_MAX_LENGTH = TUNING["rerank_max_length"]           # tokens per (query, chunk) pair
+
+RRF_K = 60                  # standard reciprocal-rank-fusion damping constant
+RERANK_SKIP_MARGIN = 0.25   # relative fused-score lead that skips reranking
+RERANK_BUDGET = 10          # max fused candidates sent to the cross-encoder
 
 
 class HybridRetriever:
-    def __init__(self):
-        self.vector_store = VectorStore()
-        self.bm25_store = BM25Store()
+    def __init__(
+        self,
+        rerank_budget: int = RERANK_BUDGET,
+        skip_margin: Optional[float] = RERANK_SKIP_MARGIN,
+        load: bool = True,
+        indexes: Optional[IndexGenerations] = None
+    ):
+        """
+        Args:
+            load:    Load every component now (sequentially). Pass False to let
+                     the caller run load_vector_store / load_reranker /
+                     indexes.load_bm25 / indexes.load_entities itself, e.g. in parallel.
+            indexes: Index generation manager (default: storage/indexes)
+        """
+        self.indexes = indexes if indexes is not None else IndexGenerations()
+        self.reranker = None
+        self.rerank_cache = RerankCache()
+        self.rerank_batcher: Optional[RerankBatcher] = None
+        self.rerank_budget = rerank_budget
+        self.skip_margin = skip_margin   # None disables the early exit
+
+        if load:
+            self.load_vector_store()
+            self.load_reranker()
+            # Load BM25 + entity indexes if they exist on disk
+            self.indexes.load_bm25()
+            self.indexes.load_entities()
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "queries": 0,
+            "rerank_skipped": 0,
+            "pairs_scored": 0,
+            "pairs_avoided": 0,
+            "pairs_cached": 0,
+            "rerank_seconds": 0.0,
+        }
+
+    # The serving generation's indexes (for short reads; retrieval pins via acquire)
+    @property
+    def vector_store(self):
+        return self.indexes.current().vector_store
+
+    @property
+    def bm25_store(self):
+        return self.indexes.current().bm25_store
+
+    @property
+    def entity_index(self):
+        return self.indexes.current().entity_index
+
+    @property
+    def chunk_store(self):
+        return self.indexes.current().chunk_store
 
+    def load_vector_store(self):
+        """Open ChromaDB and load the MiniLM embedding model."""
+        self.indexes.load_vector_store()
+
+    def load_reranker(self):
+        """Load the cross-encoder and its cross-request batcher."""
+        from sentence_transformers import CrossEncoder   # deferred: pulls in torch
         print("Loading cross-encoder reranker...")
-        self.reranker = CrossEncoder(RERANKER_MODEL, max_length=512)
+        self.reranker = CrossEncoder(RERANKER_MODEL, max_length=RERANK_MAX_LENGTH)
+        self.rerank_batcher = RerankBatcher(self.reranker)
         print("Reranker ready.")
 
-        # Load BM25 index if it exists on disk
-        self.bm25_store.load()
-
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict]:
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        dense_k: int = 15,
+        bm25_k: int = 15,
+        rerank: bool = True,
+        rerank_budget: Optional[int] = None,
+        force_rerank: bool = False,
+        doc_fanout: Optional[int] = None
+    ) -> List[Dict]:
         """
-        Hybrid retrieval with cross-encoder reranking.
+        Hybrid retrieval with fusion and adaptive cross-encoder reranking.
 
         Args:
-            query:  The user's question
-            top_k:  Number of final results to return
+            query:         The user's question
+            top_k:         Number of final results to return
+            dense_k:       Candidates pulled from the vector store
+            bm25_k:        Candidates pulled from the BM25 index
+            rerank:        Run the cross-encoder at all
+            rerank_budget: Max fused candidates to rerank (default: self.rerank_budget)
+            force_rerank:  Disable the clear-winner early exit
+            doc_fanout:    Hierarchical mode: search chunks only within this
+                           many best-matching documents (None = flat)
 
         Returns:
-            List of {"text", "page", "source", "score", "rerank_score"}
-            sorted by rerank_score descending
+            List of {"chunk_id", "text", "page", "source", "chunk_index",
+            "score", "bm25_score", "fusion_score", "rerank_score"} sorted by
+            rerank_score when the
+            reranker ran, otherwise by fusion_score
+        """
+        return self.retrieve_batch(
+            [query], top_k=top_k, dense_k=dense_k, bm25_k=bm25_k, rerank=rerank,
+            rerank_budget=rerank_budget, force_rerank=force_rerank, doc_fanout=doc_fanout
+        )[0]
+
+    @tracing.traced("retrieve")
+    @BUDGET.task("query")
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        dense_k: int = 15,
+        bm25_k: int = 15,
+        rerank: bool = True,
+        rerank_budget: Optional[int] = None,
+        force_rerank: bool = False,
+        doc_fanout: Optional[int] = None
+    ) -> List[List[Dict]]:
         """
-        # Step 1: Dense retrieval
-        dense_results = self.vector_store.search(query, n_results=15)
+        retrieve() for many queries at once.
+
+        All query embeddings come from one encode() call and one Chroma
+        query, BM25 scores each distinct term once for the whole batch, and
+        every rerank pair of every query goes to the cross-encoder together
+        (length-sorted into padded batches by the RerankBatcher).
+
+        Returns:
+            One result list per query, in input order
+        """
+        budget = max(top_k, rerank_budget if rerank_budget is not None else self.rerank_budget)
+        with self.indexes.acquire() as gen:
+            embeddings = gen.vector_store.encode(queries)
+
+            # Step 0: Coarse stage — candidate documents per query (None = all)
+            doc_filter = gen.document_index.search_batch(queries, embeddings, doc_fanout)
+
+            if gen.shard_pool is not None:
+                # Steps 1+2 on every shard worker in parallel, merged to the global top-k
+                dense_results, bm25_results = gen.shard_pool.search_batch(
+                    queries, embeddings, dense_k, bm25_k, sources=doc_filter
+                )
+            else:
+                # Step 1: Dense retrieval
+                dense_results = gen.vector_store.search_batch(
+                    queries, n_results=dense_k, embeddings=embeddings, sources=doc_filter
+                )
+
+                # Step 2: BM25 retrieval
+                bm25_results = gen.bm25_store.search_batch(
+                    queries, n_results=bm25_k, sources=doc_filter
+                )
 
-        # Step 2: BM25 retrieval
-        bm25_results = self.bm25_store.search(query, n_results=15)
+            # Step 3: Reciprocal-rank fusion on IDs
+            fused = [self.fuse(d, b) for d, b in zip(dense_results, bm25_results)]
 
-        # Step 3: Merge + deduplicate by text content
-        seen_texts: set = set()
-        candidates: List[Dict] = []
-        for result in dense_results + bm25_results:
-            text = result["text"]
-            if text not in seen_texts:
-                candidates.append(result)
-                seen_texts.add(text)
+            # Step 4a: Early exit when the fused winner is unambiguous —
+            # decided on fusion scores alone, so only kept candidates need text
+            rerank_mask = [
+                bool(c) and rerank and (force_rerank or not self._is_clear_winner(c))
+                for c in fused
+            ]
+            heads = self._hydrate(gen.chunk_store, [
+                c[:budget] if reranked else c[:top_k] for c, reranked in zip(fused, rerank_mask)
+            ])
+        span = tracing.current_span()
+        span.set(queries=len(queries), generation=gen.gen_id,
+                 shards=gen.shard_pool.n_shards if gen.shard_pool is not None else 0,
+                 hierarchical=sum(f is not None for f in doc_filter),
+                 dense_candidates=sum(len(r) for r in dense_results),
+                 bm25_candidates=sum(len(r) for r in bm25_results),
+                 hydrated=sum(len(h) for h in heads))
 
-        if not candidates:
-            return []
+        results: List[List[Dict]] = [[] for _ in queries]
+        to_rerank = []   # (query position, candidates sent to the cross-encoder, cut by budget)
+        for i, (candidates, head, reranked) in enumerate(zip(fused, heads, rerank_mask)):
+            if not reranked:
+                if candidates and rerank:
+                    self._record(skipped=True, avoided=min(len(candidates), budget))
+                results[i] = head
+                continue
+            to_rerank.append((i, head, len(candidates) - len(head)))
 
-        # Step 4: Cross-encoder reranking
+        span.set(rerank_skipped=len(queries) - len(to_rerank))
+        if not to_rerank:
+            return results
+
+        # Step 4b: Cross-encoder reranking of the top-N fused candidates
         # The cross-encoder sees query+document together (full attention)
-        pairs = [(query, c["text"]) for c in candidates]
-        rerank_scores = self.reranker.predict(pairs)
+        counts, elapsed = self._score([(queries[i], head) for i, head, _ in to_rerank])
+        total_scored = sum(scored for scored, _ in counts)
+        span.set(pairs_scored=total_scored,
+                 pairs_cached=sum(cached for _, cached in counts))
+        for (i, head, avoided), (scored, cached) in zip(to_rerank, counts):
+            self._record(
+                skipped=False,
+                scored=scored,
+                cached=cached,
+                avoided=avoided,
+                # one shared pass: attribute model time by pairs scored
+                seconds=elapsed * scored / total_scored if total_scored else 0.0
+            )
+
+            # Step 5: Sort by reranker score and keep top_k
+            head.sort(key=lambda x: x["rerank_score"], reverse=True)
+            results[i] = head[:top_k]
+        return results
 
-        for i, candidate in enumerate(candidates):
-            candidate["rerank_score"] = round(float(rerank_scores[i]), 4)
+    @staticmethod
+    def fuse(dense_results: List[Dict], bm25_results: List[Dict]) -> List[Dict]:
+        """
+        Merge ranked lists with reciprocal-rank fusion.
 
-        # Step 5: Sort by reranker score and return top_k
-        candidates.sort(key=lambda x: x["rerank_score"], reverse=True)
-        return candidates[:top_k]
+        Each candidate keeps its dense "score" and "bm25_score" (when the
+        respective retriever found it) and gains a "fusion_score" of
+        sum(1 / (RRF_K + rank)) over the lists it appears in.
 
-    def rebuild_bm25(self, chunks: List[Dict]):
+        Returns:
+            Candidates deduplicated by chunk_id, sorted by fusion_score descending
         """
-        Rebuild BM25 index after new PDF is ingested.
-        Called from app.py after build_vectorstore.
+        merged: Dict[str, Dict] = {}
+        for results in (dense_results, bm25_results):
+            for rank, result in enumerate(results, start=1):
+                cid = result["chunk_id"]
+                if cid not in merged:
+                    merged[cid] = dict(result)
+                    merged[cid]["fusion_score"] = 0.0
+                else:
+                    # keep the scores contributed by the other retriever
+                    for key, value in result.items():
+                        merged[cid].setdefault(key, value)
+                merged[cid]["fusion_score"] += 1.0 / (RRF_K + rank)
 
-        Args:
-            chunks: Same list of chunk dicts used for ChromaDB
+        candidates = list(merged.values())
+        for c in candidates:
+            c["fusion_score"] = round(c["fusion_score"], 6)
+        candidates.sort(key=lambda x: x["fusion_score"], reverse=True)
+        return candidates
+
+    @staticmethod
+    def _hydrate(chunk_store, groups: List[List[Dict]]) -> List[List[Dict]]:
+        """
+        Fill in text + metadata for every candidate in groups with one
+        chunk-store lookup; candidates missing from the store are dropped.
+        """
+        ids = [c["chunk_id"] for group in groups for c in group]
+        if not ids:
+            return [[] for _ in groups]
+        with stage_timer("chunk_fetch"):
+            rows = iter(chunk_store.get_many(ids))
+        hydrated = []
+        for group in groups:
+            out = []
+            for candidate in group:
+                row = next(rows)
+                if row is not None:
+                    candidate.update(row)
+                    out.append(candidate)
+            hydrated.append(out)
+        return hydrated
+
+    def _score(self, items: List[Tuple[str, List[Dict]]]):
+        """
+        Attach rerank_score to each candidate, reusing cached scores.
+
+        Cache misses from every (query, candidates) item go through the
+        shared batcher in one predict() call, so concurrent queries and
+        batch members share forward passes.
+
+        Returns:
+            ([(pairs scored by the model, pairs served from cache)] per item,
+             model seconds)
         """
-        self.bm25_store.build(chunks)
+        missing: Dict[Tuple, List[Dict]] = {}   # cache key -> candidates needing it
+        pairs = []
+        counts = []
+        for query, head in items:
+            norm_q = normalize_query(query)
+            n_missing = 0
+            for candidate in head:
+                key = (norm_q, chunk_key(candidate), RERANKER_MODEL)
+                score = self.rerank_cache.get(key)
+                if score is not None:
+                    candidate["rerank_score"] = score
+                    continue
+                n_missing += 1
+                if key not in missing:   # repeated questions in a batch score once
+                    missing[key] = []
+                    pairs.append((query, candidate["text"]))
+                missing[key].append(candidate)
+            counts.append((n_missing, len(head) - n_missing))
+
+        elapsed = 0.0
+        if pairs:
+            with tracing.span("rerank", pairs=len(pairs)):
+                start = time.perf_counter()
+                scores = self.rerank_batcher.predict(pairs)
+                elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, stage="rerank")
+            for (key, candidates), score in zip(missing.items(), scores):
+                score = round(float(score), 4)
+                for candidate in candidates:
+                    candidate["rerank_score"] = score
+                self.rerank_cache.put(key, score)
+
+        n_cached = sum(cached for _, cached in counts)
+        if n_cached:
+            CACHE_HITS.inc(n_cached, cache="rerank")
+        if pairs:
+            CACHE_MISSES.inc(len(pairs), cache="rerank")
+        return counts, elapsed
+
+    def _is_clear_winner(self, candidates: List[Dict]) -> bool:
+        """True if the fused top result leads the runner-up by skip_margin."""
+        if self.skip_margin is None:
+            return False
+        if len(candidates) == 1:
+            return True
+        top = candidates[0]["fusion_score"]
+        runner_up = candidates[1]["fusion_score"]
+        return top > 0 and (top - runner_up) / top >= self.skip_margin
+
+    def _record(self, skipped: bool, scored: int = 0, cached: int = 0,
+                avoided: int = 0, seconds: float = 0.0):
+        with self._stats_lock:
+            self.stats["queries"] += 1
+            self.stats["rerank_skipped"] += int(skipped)
+            self.stats["pairs_scored"] += scored
+            self.stats["pairs_avoided"] += avoided
+            self.stats["pairs_cached"] += cached
+            self.stats["rerank_seconds"] += seconds
+
+    def rerank_stats(self) -> Dict:
+        """
+        Summarise adaptive reranking.
+
+        Latency saved is estimated from the measured per-pair cross-encoder
+        cost multiplied by the pairs that were skipped, cut by the budget or
+        served from the score cache.
+        """
+        with self._stats_lock:
+            s = dict(self.stats)
+        per_pair = s["rerank_seconds"] / s["pairs_scored"] if s["pairs_scored"] else 0.0
+        return {
+            "queries": s["queries"],
+            "rerank_skipped": s["rerank_skipped"],
+            "skip_rate": round(s["rerank_skipped"] / s["queries"], 4) if s["queries"] else 0.0,
+            "pairs_scored": s["pairs_scored"],
+            "pairs_avoided": s["pairs_avoided"],
+            "pairs_cached": s["pairs_cached"],
+            "cache_size": len(self.rerank_cache),
+            "batched_passes": self.rerank_batcher.passes,
+            "batched_requests": self.rerank_batcher.coalesced_requests,
+            "avg_pair_ms": round(per_pair * 1000, 3),
+            "est_saved_ms": round(
+                per_pair * (s["pairs_avoided"] + s["pairs_cached"]) * 1000, 1
+            ),
+        }
+
+    def get_chunk(self, chunk_id: str) -> Optional[Dict]:
+        """Full text + metadata of an indexed chunk (see chunk_store.chunk_id)."""
+        return self.chunk_store.get(chunk_id)
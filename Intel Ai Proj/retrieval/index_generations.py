@@ -0,0 +1,618 @@
+"""
+Versioned index generations with atomic publish.
+
+Why?
+- Re-ingesting used to clear the live Chroma collection and rebuild it in
+  place, so queries arriving mid-upload saw an empty or partial index, and
+  the retriever's stores were swapped by unsynchronised attribute writes
+- Now every ingestion builds a complete new generation (its own chunk
+  store, Chroma collection, BM25 pickle and entity index) next to the
+  serving one, then
+  publishes it with a single pointer swap
+
+Readers take the current generation with acquire(); the refcount keeps a
+retired generation alive until its last in-flight query finishes, after
+which its collection and files are deleted.
+
+Layout:
+    storage/indexes/CURRENT             {"generation": N, ...}  (os.replace)
+    storage/indexes/g<N>/chunks.db      chunk text + metadata, by chunk ID
+    storage/indexes/g<N>/bm25_index.pkl
+    storage/indexes/g<N>/entity_index.json
+    storage/indexes/g<N>/documents.pkl  per-document centroids + BM25
+    storage/indexes/g<N>/shards/        per-shard vectors + BM25 (RETRIEVAL_SHARDS > 1)
+    Chroma collection  pdf_knowledge_g<N>
+
+Generations imported from a bundle (retrieval/bundle.py) keep their vectors
+in g<N>/vectors.npy and are served memory-mapped instead of from Chroma.
+Sharded generations (retrieval/shards.py) get one search worker process per
+shard while they serve; the workers stop when the generation is collected.
+
+Without a CURRENT file the pre-generation layout (collection pdf_knowledge,
+./bm25_index.pkl, ./entity_index.json) is served as generation 0; its text
+is moved from the old BM25 pickle into ./chunks.db on first load.
+
+The index root is shared by every process that opens it (API, Streamlit,
+python -m ingestion.cli, bundle import):
+- Each manager keeps a lease (storage/indexes/leases/<pid>-<n>.json) listing
+  the generations it serves, builds or still has readers on; the matching
+  .lock file stays locked while the process lives, so leases of crashed
+  processes are recognised and dropped
+- A generation is deleted only when it is not CURRENT and no live lease
+  lists it; leases are written and checked under storage/indexes/.lock
+- acquire() notices a CURRENT rewritten by another process (one stat) and
+  switches to that generation once it is loaded, in the background
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+import atexit
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+from retrieval.bm25_store import BM25Store
+from retrieval.chunk_store import ChunkStore
+from retrieval.document_index import DocumentIndex
+from retrieval.entity_index import EntityIndex
+from retrieval.shards import RETRIEVAL_SHARDS, ShardPool, shard_count, write_shards
+
+
+INDEX_ROOT = os.path.join("storage", "indexes")
+POINTER_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+LEASE_DIR = "leases"
+COLLECTION_PREFIX = "pdf_knowledge"
+_GEN_DIR = re.compile(r"^g(\d+)$")
+_lease_numbers = itertools.count()
+
+
+def _lock(f, blocking: bool = True) -> bool:
+    """Exclusive advisory lock on an open file; False if busy and not blocking."""
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except OSError:
+            return False
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.05)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class IndexGeneration:
+    """One complete, immutable-once-published set of indexes."""
+
+    def __init__(self, gen_id: int, collection: str, chunks_path: str, bm25_path: str,
+                 entity_path: str, documents_path: str, directory: Optional[str] = None):
+        self.gen_id = gen_id
+        self.collection = collection
+        self.directory = directory          # None for the legacy generation 0
+        self.chunk_store = ChunkStore(chunks_path)
+        self.vector_store = None            # VectorStore / MmapVectorStore, attached on load
+        self.shard_pool = None              # ShardPool while a sharded generation serves
+        self.bm25_store = BM25Store(bm25_path)
+        self.entity_index = EntityIndex(entity_path)
+        self.document_index = DocumentIndex(documents_path)
+        self.refs = 0
+        self.retired = False
+
+    @classmethod
+    def legacy(cls) -> "IndexGeneration":
+        return cls(0, COLLECTION_PREFIX, "chunks.db", "bm25_index.pkl", "entity_index.json",
+                   "documents.pkl")
+
+    @classmethod
+    def numbered(cls, gen_id: int, root: str) -> "IndexGeneration":
+        directory = os.path.join(root, f"g{gen_id}")
+        return cls(
+            gen_id,
+            f"{COLLECTION_PREFIX}_g{gen_id}",
+            os.path.join(directory, "chunks.db"),
+            os.path.join(directory, "bm25_index.pkl"),
+            os.path.join(directory, "entity_index.json"),
+            os.path.join(directory, "documents.pkl"),
+            directory
+        )
+
+    # Builders — only used before the generation is published
+    def build_chunks(self, chunks: List[Dict]):
+        self.chunk_store.add(chunks)
+
+    def build_vectors(self, chunks: List[Dict]):
+        """Chunk vectors + the document index built from the same embeddings."""
+        embeddings = self.vector_store.add_documents(chunks)
+        if embeddings is not None:
+            self.document_index.build(chunks, embeddings)
+
+    def build_bm25(self, chunks: List[Dict]):
+        self.bm25_store.build(chunks)
+
+    def build_entities(self, entities: List[Dict]):
+        self.entity_index.build(entities)
+
+    def build_shards(self, n_shards: int):
+        """Split the built vectors + BM25 rows into n_shards by document."""
+        if self.directory is None:
+            return
+        if self.vector_store is not None:
+            vectors, ids = self.vector_store.dump()
+        else:   # imported bundle, not opened yet
+            from retrieval.mmap_vector_store import MmapVectorStore
+            vectors, ids = MmapVectorStore.read(self.directory)
+        if self.bm25_store.bm25 is None:
+            self.bm25_store.load()
+        write_shards(self.directory, n_shards, vectors, ids, self.bm25_store)
+        # the rows now live in the shard workers; the pickle stays for bundles
+        self.bm25_store = BM25Store(self.bm25_store.index_path)
+
+    @property
+    def sharded(self) -> bool:
+        """Searched by shard workers (its full BM25 index is never loaded here)."""
+        return shard_count(self.directory) > 1
+
+    def describe(self) -> Dict:
+        return {
+            "generation": self.gen_id,
+            "collection": self.collection,
+            "chunks_path": self.chunk_store.path,
+            "bm25_path": self.bm25_store.index_path,
+            "entity_path": self.entity_index.index_path,
+            "documents_path": self.document_index.index_path,
+        }
+
+
+class IndexGenerations:
+    def __init__(self, root: str = INDEX_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+        self._backend_lock = threading.Lock()
+        self._client = None                  # shared Chroma client, opened on first use
+        self._embedding_model = None         # shared MiniLM, loaded on first use
+        self._retired: List[IndexGeneration] = []
+        self._building: Set[int] = set()     # reserved here, not yet published
+        self._following = False
+        self._lease_file = None
+        self._stats = {"published": 0, "collected": 0, "followed": 0}
+        with self._root_locked():
+            self._open_lease()
+            self._current = self._read_pointer()
+            self._pointer_version = self._pointer_stat()
+            self._next_id = max([self._current.gen_id] + self._disk_ids()) + 1
+            self._write_lease()
+            self._collect_stale_files()
+        atexit.register(self.close)
+
+    def close(self):
+        """Drop this manager's lease (at exit; its generations become collectable)."""
+        if self._lease_file is None:
+            return
+        for suffix in (".json", ".lock"):
+            try:
+                os.remove(self._lease_path + suffix)
+            except OSError:
+                pass
+        self._lease_file.close()   # releases the lock
+        self._lease_file = None
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+
+    def current(self) -> IndexGeneration:
+        """The serving generation (no refcount; for short in-memory reads)."""
+        return self._current
+
+    @contextmanager
+    def acquire(self) -> Iterator[IndexGeneration]:
+        """Pin the serving generation for the duration of a read."""
+        self._check_pointer()
+        with self._lock:
+            gen = self._current
+            gen.refs += 1
+        try:
+            yield gen
+        finally:
+            with self._lock:
+                gen.refs -= 1
+                collect = gen.retired and gen.refs == 0 and gen in self._retired
+                if collect:
+                    self._retired.remove(gen)
+            if collect:
+                self._collect(gen)
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    @property
+    def serving(self) -> bool:
+        """True once the vector backend is loaded (this manager feeds an engine)."""
+        return self._embedding_model is not None
+
+    def load_vector_store(self):
+        """Open Chroma + MiniLM for the serving generation (the slow part)."""
+        gen = self._current
+        gen.vector_store = self._vector_store(gen)
+        self._open_shards(gen)
+        with self._root_locked():
+            self._collect_stale_collections()
+
+    def load_bm25(self) -> bool:
+        gen = self._current
+        if gen.sharded:
+            print("[Index] BM25 rows are served by the shard workers.")
+            return True
+        loaded = gen.bm25_store.load()
+        corpus = gen.bm25_store.legacy_corpus
+        if corpus is not None:
+            # Pre-chunk-store pickle: move the text out, keep IDs only
+            if gen.chunk_store.count() < len(corpus):
+                gen.chunk_store.add(corpus)
+            gen.bm25_store.legacy_corpus = None
+            gen.bm25_store.save()
+            print(f"[Index] Migrated {len(corpus)} chunks into {gen.chunk_store.path}.")
+        return loaded
+
+    def load_entities(self) -> bool:
+        return self._current.entity_index.load()
+
+    def load_documents(self) -> bool:
+        return self._current.document_index.load()
+
+    # ------------------------------------------------------------------
+    # Writers
+    # ------------------------------------------------------------------
+
+    def new_generation(self, chroma: bool = True) -> IndexGeneration:
+        """
+        Reserve an empty generation to build into (not yet visible).
+
+        Args:
+            chroma: Create its Chroma collection. False when the caller
+                    writes the files itself (bundle import).
+        """
+        with self._root_locked():
+            with self._lock:
+                # other processes allocate from the same root
+                gen_id = max([self._next_id, self._pointer_id() + 1]
+                             + [n + 1 for n in self._disk_ids()])
+                self._next_id = gen_id + 1
+                self._building.add(gen_id)
+            gen = IndexGeneration.numbered(gen_id, self.root)
+            os.makedirs(gen.directory, exist_ok=True)
+            self._write_lease()
+        if chroma:
+            gen.vector_store = self._vector_store(gen)
+            if gen.vector_store.count():
+                gen.vector_store.clear()     # leftover of a crashed build
+        return gen
+
+    def build(self, chunks: List[Dict], entities: List[Dict]) -> IndexGeneration:
+        """Build every index of a new generation; publish() makes it live."""
+        gen = self.new_generation()
+        gen.build_chunks(chunks)
+        gen.build_vectors(chunks)
+        gen.build_bm25(chunks)
+        gen.build_entities(entities)
+        if RETRIEVAL_SHARDS > 1:
+            gen.build_shards(RETRIEVAL_SHARDS)
+        return gen
+
+    def publish(self, gen: IndexGeneration):
+        """Atomically make gen the serving generation and retire the old one."""
+        if self.serving:
+            self.vector_store_for(gen)   # imported: open before it is visible
+            self._open_shards(gen)
+        with self._root_locked():
+            self._write_pointer(gen)
+            self._pointer_version = self._pointer_stat()
+            old, collect = self._swap(gen)
+            self._stats["published"] += 1
+            self._write_lease()
+        print(f"[Index] Generation {gen.gen_id} published"
+              f"{f' (replaces {old.gen_id})' if old is not gen else ''}.")
+        if collect:
+            self._collect(old)
+
+    def _swap(self, gen: IndexGeneration):
+        """Serve gen locally; returns (old, collect old now)."""
+        with self._lock:
+            old = self._current
+            self._current = gen
+            self._building.discard(gen.gen_id)
+            collect = False
+            if old is not gen:
+                old.retired = True
+                if old.refs == 0:
+                    collect = True
+                else:
+                    self._retired.append(old)   # collected by the last reader
+        return old, collect
+
+    # ------------------------------------------------------------------
+    # Following other processes
+    # ------------------------------------------------------------------
+
+    def _check_pointer(self):
+        """Switch to a generation another process published (one stat if none)."""
+        version = self._pointer_stat()
+        with self._lock:
+            if version == self._pointer_version or self._following:
+                return
+            self._following = True
+        if self.serving:   # loading takes a while: keep serving the old one meanwhile
+            threading.Thread(target=self._follow, name="index-follow", daemon=True).start()
+        else:
+            self._follow()
+
+    def _follow(self):
+        gen, version = None, self._pointer_stat()
+        try:
+            with self._root_locked():
+                version = self._pointer_stat()
+                gen = self._read_pointer()
+                if gen.gen_id == self._current.gen_id:
+                    self._pointer_version = version
+                    return
+                with self._lock:
+                    self._building.add(gen.gen_id)   # leased before we load it
+                self._write_lease()
+            if self.serving:
+                self._load(gen)
+            with self._root_locked():
+                self._pointer_version = version
+                old, collect = self._swap(gen)
+                self._stats["followed"] += 1
+                self._write_lease()
+            print(f"[Index] Generation {gen.gen_id} published by another process "
+                  f"now serves (replaces {old.gen_id}).")
+            if collect:
+                self._collect(old)
+        except Exception as e:
+            print(f"[Index] Could not switch to the published generation ({e}).")
+            with self._root_locked():
+                self._pointer_version = version   # retried on the next publish
+                if gen is not None and gen is not self._current:
+                    with self._lock:
+                        self._building.discard(gen.gen_id)
+                    self._write_lease()
+        finally:
+            self._following = False
+
+    def _load(self, gen: IndexGeneration):
+        """Open everything a serving engine loads at startup for gen."""
+        self.vector_store_for(gen)
+        self._open_shards(gen)
+        if not gen.sharded:
+            gen.bm25_store.load()
+        gen.entity_index.load()
+        gen.document_index.load()
+
+    def vector_store_for(self, gen: IndexGeneration):
+        """gen's vector store, opening it (Chroma or memory-mapped) if needed."""
+        if gen.vector_store is None:
+            gen.vector_store = self._vector_store(gen)
+        return gen.vector_store
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pool = self._current.shard_pool
+            return {
+                "generation": self._current.gen_id,
+                "in_flight": self._current.refs,
+                "retired_pending": [g.gen_id for g in self._retired],
+                "published": self._stats["published"],
+                "followed": self._stats["followed"],
+                "collected": self._stats["collected"],
+                "shards": pool.stats() if pool is not None else None,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _vector_store(self, gen: IndexGeneration):
+        from retrieval.mmap_vector_store import MmapVectorStore
+        if gen.directory is not None and MmapVectorStore.exists(gen.directory):
+            return MmapVectorStore(gen.directory, self._embedder(), gen.chunk_store)
+        from retrieval.vector_store import VectorStore
+        return VectorStore(
+            collection_name=gen.collection,
+            client=self._chroma(),
+            embedding_model=self._embedder()
+        )
+
+    def _open_shards(self, gen: IndexGeneration):
+        """Start gen's shard workers if it was built sharded."""
+        if gen.shard_pool is None and shard_count(gen.directory) > 1:
+            pool = ShardPool(gen.directory, gen.chunk_store.path)
+            pool.start()
+            gen.shard_pool = pool
+
+    def _embedder(self):
+        with self._backend_lock:
+            if self._embedding_model is None:
+                from sentence_transformers import SentenceTransformer   # deferred: pulls in torch
+                from retrieval.vector_store import EMBEDDING_MODEL
+                self._embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+            return self._embedding_model
+
+    def _chroma(self):
+        with self._backend_lock:
+            if self._client is None:
+                import chromadb   # deferred: heavy import
+                from retrieval.vector_store import CHROMA_PATH
+                self._client = chromadb.PersistentClient(path=CHROMA_PATH)
+            return self._client
+
+    # Cross-process state (callers hold the root lock)
+
+    @contextmanager
+    def _root_locked(self) -> Iterator[None]:
+        """Serialise pointer, lease and deletion changes across processes."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILE), "a+") as f:
+            _lock(f)
+            try:
+                yield
+            finally:
+                _unlock(f)
+
+    def _open_lease(self):
+        lease_dir = os.path.join(self.root, LEASE_DIR)
+        os.makedirs(lease_dir, exist_ok=True)
+        self._lease_path = os.path.join(lease_dir, f"{os.getpid()}-{next(_lease_numbers)}")
+        self._lease_file = open(self._lease_path + ".lock", "a+")
+        _lock(self._lease_file)   # held until close() / exit
+
+    def _held(self) -> Set[int]:
+        with self._lock:
+            return ({self._current.gen_id} | {g.gen_id for g in self._retired}
+                    | self._building)
+
+    def _write_lease(self):
+        if self._lease_file is None:
+            return
+        tmp = self._lease_path + ".json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "generations": sorted(self._held())}, f)
+        os.replace(tmp, self._lease_path + ".json")
+
+    def _others_held(self) -> Set[int]:
+        """Generations listed by live leases of other managers; drops dead leases."""
+        lease_dir = os.path.join(self.root, LEASE_DIR)
+        held = set()
+        for name in os.listdir(lease_dir):
+            base = os.path.join(lease_dir, name[:-len(".lock")])
+            if not name.endswith(".lock") or base == self._lease_path:
+                continue
+            with open(base + ".lock", "a+") as f:
+                alive = not _lock(f, blocking=False)
+                if not alive:
+                    _unlock(f)
+            if not alive:   # its process exited without close()
+                for suffix in (".json", ".lock"):
+                    try:
+                        os.remove(base + suffix)
+                    except OSError:
+                        pass
+                continue
+            try:
+                with open(base + ".json", encoding="utf-8") as f:
+                    held.update(json.load(f)["generations"])
+            except (OSError, ValueError, KeyError):
+                pass
+        return held
+
+    def _in_use(self) -> Set[int]:
+        """Generations no process may delete: CURRENT's and every live lease's."""
+        return {self._pointer_id()} | self._held() | self._others_held()
+
+    def _pointer_stat(self):
+        try:
+            st = os.stat(os.path.join(self.root, POINTER_FILE))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _pointer_id(self) -> int:
+        return self._read_pointer(quiet=True).gen_id
+
+    def _read_pointer(self, quiet: bool = False) -> IndexGeneration:
+        path = os.path.join(self.root, POINTER_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    gen_id = int(json.load(f)["generation"])
+                if gen_id > 0:
+                    return IndexGeneration.numbered(gen_id, self.root)
+            except Exception as e:
+                if not quiet:
+                    print(f"[Index] Pointer unreadable ({e}); serving legacy indexes.")
+        return IndexGeneration.legacy()
+
+    def _write_pointer(self, gen: IndexGeneration):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, POINTER_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(gen.describe(), published=time.time()), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _disk_ids(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        return [int(m.group(1)) for m in map(_GEN_DIR.match, os.listdir(self.root)) if m]
+
+    def _collect(self, gen: IndexGeneration):
+        """Release a retired generation; delete it unless another process uses it."""
+        if gen.shard_pool is not None:
+            gen.shard_pool.close()
+            gen.shard_pool = None
+        gen.chunk_store.close()
+        with self._root_locked():
+            self._write_lease()
+            if gen.gen_id in self._in_use():
+                print(f"[Index] Generation {gen.gen_id} released (still used elsewhere).")
+                return
+            if self._client is not None:
+                try:
+                    self._client.delete_collection(gen.collection)
+                except Exception:
+                    pass   # never created / already gone
+            if gen.directory is not None:
+                shutil.rmtree(gen.directory, ignore_errors=True)
+            else:
+                gen.chunk_store.clear()
+                gen.bm25_store.clear()
+                gen.entity_index.clear()
+                gen.document_index.clear()
+        with self._lock:
+            self._stats["collected"] += 1
+        print(f"[Index] Generation {gen.gen_id} collected.")
+
+    def _collect_stale_files(self):
+        """Remove generation directories no process uses (crash leftovers)."""
+        in_use = self._in_use()
+        for gen_id in self._disk_ids():
+            if gen_id not in in_use:
+                shutil.rmtree(os.path.join(self.root, f"g{gen_id}"), ignore_errors=True)
+
+    def _collect_stale_collections(self):
+        keep = {f"{COLLECTION_PREFIX}_g{n}" for n in self._in_use()}
+        try:
+            names = [getattr(c, "name", c) for c in self._chroma().list_collections()]
+        except Exception:
+            return
+        for name in names:
+            if name.startswith(f"{COLLECTION_PREFIX}_g") and name not in keep:
+                try:
+                    self._client.delete_collection(name)
+                except Exception:
+                    pass
@@ -0,0 +1,118 @@
+"""
+Read-only vector store served straight from an imported bundle.
+
+Why?
+- Inserting a prebuilt bundle into Chroma re-runs HNSW construction, which
+  takes minutes for large corpora; a fresh node should answer in seconds
+- vectors.npy is memory-mapped, so start-up costs one norm pass and the
+  pages are shared with every other process mapping the same file
+
+Search is exact (brute-force squared-L2 over the float32 matrix), so scores
+match the Chroma collection the bundle was exported from. Fine up to a few
+hundred thousand chunks on CPU; new ingestions build Chroma generations.
+
+Files (in the generation directory):
+    vectors.npy      float32 (n, dim), row i = line i of vector_ids.txt
+    vector_ids.txt   one chunk ID per line (text is in the chunk store)
+"""
+from typing import Dict, List, Optional, Tuple
+import os
+
+import numpy as np
+
+from monitoring.metrics import stage_timer
+
+
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "vector_ids.txt"
+
+
+class MmapVectorStore:
+    def __init__(self, directory: str, embedding_model, chunk_store=None):
+        """
+        Args:
+            chunk_store: The generation's ChunkStore; needed only for
+                         source-restricted (hierarchical) searches
+        """
+        self.directory = directory
+        self.chunk_store = chunk_store
+        self.collection_name = f"mmap:{directory}"
+        self.embedding_model = embedding_model
+        self.vectors, self.ids = self.read(directory)
+        self._sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self._row_sources: Optional[np.ndarray] = None
+        print(f"Memory-mapped vector index: {len(self.ids)} chunks.")
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, VECTORS_FILE))
+
+    @staticmethod
+    def write(directory: str, vectors: np.ndarray, ids: List[str]):
+        """Write vectors.npy + vector_ids.txt (the bundle / generation layout)."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, VECTORS_FILE), np.asarray(vectors, dtype=np.float32))
+        with open(os.path.join(directory, IDS_FILE), "w", encoding="utf-8") as f:
+            f.write("\n".join(ids) + "\n")
+
+    @staticmethod
+    def read(directory: str) -> Tuple[np.ndarray, List[str]]:
+        """Memory-map vectors.npy and read its row IDs."""
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, IDS_FILE), encoding="utf-8") as f:
+            ids = f.read().split()
+        if len(ids) != len(vectors):
+            raise ValueError(f"{directory}: {len(vectors)} vectors but {len(ids)} IDs")
+        return vectors, ids
+
+    def search(self, query: str, n_results: int = 6) -> List[Dict]:
+        return self.search_batch([query], n_results=n_results)[0]
+
+    def encode(self, queries: List[str]) -> np.ndarray:
+        with stage_timer("query_embed"):
+            return np.asarray(self.embedding_model.encode(queries), dtype=np.float32)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 6,
+        embeddings: Optional[np.ndarray] = None,
+        sources: Optional[List[Optional[List[str]]]] = None
+    ) -> List[List[Dict]]:
+        """Same contract as VectorStore.search_batch."""
+        if not queries or not self.ids:
+            return [[] for _ in queries]
+        query_embs = self.encode(queries) if embeddings is None else np.asarray(embeddings, dtype=np.float32)
+        with stage_timer("vector_search"):
+            # squared L2, as Chroma reports it: |x|^2 - 2 x.q + |q|^2
+            dists = (self._sq_norms[None, :] - 2.0 * (query_embs @ self.vectors.T)
+                     + np.einsum("ij,ij->i", query_embs, query_embs)[:, None])
+            if sources is not None and self.chunk_store is not None:
+                row_sources = self._sources()
+                for q, allowed in enumerate(sources):
+                    if allowed is not None:
+                        dists[q, ~np.isin(row_sources, allowed)] = np.inf
+            n = min(n_results, len(self.ids))
+            top = np.argpartition(dists, n - 1, axis=1)[:, :n]
+
+        batch = []
+        for row, idx in zip(dists, top):
+            idx = idx[np.argsort(row[idx])]
+            batch.append([
+                {"chunk_id": self.ids[i], "score": round(1 - float(row[i]), 4)}
+                for i in idx if np.isfinite(row[i])
+            ])
+        return batch
+
+    def _sources(self) -> np.ndarray:
+        """Source file of every row, fetched from the chunk store once."""
+        if self._row_sources is None:
+            rows = self.chunk_store.get_many(self.ids)
+            self._row_sources = np.asarray([r["source"] if r else "" for r in rows])
+        return self._row_sources
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def dump(self) -> Tuple[np.ndarray, List[str]]:
+        return np.asarray(self.vectors), list(self.ids)
@@ -0,0 +1,179 @@
+"""
+Cross-encoder serving helpers: score cache + cross-request micro-batching.
+
+Why?
+- Popular questions against the same document re-score identical
+  (query, chunk) pairs; a bounded LRU cache answers those for free
+- Under load every request used to run its own small forward pass; the
+  batcher coalesces pairs from concurrent retrieve() calls that arrive
+  within a short window into one forward pass
+- Pairs are sorted by length before batching so each batch pads to
+  similar-length inputs (length bucketing) instead of the longest overall
+"""
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
+import hashlib
+import queue
+import re
+import threading
+import time
+
+from runtime.thread_budget import BUDGET
+from runtime.tuning import TUNING
+
+
+RERANK_CACHE_SIZE = 4096       # cached (query, chunk, model) scores
+RERANK_BATCH_WINDOW_MS = 5     # how long the batcher waits for more pairs
+RERANK_MAX_PAIRS = 256         # upper bound on pairs per coalesced pass
+RERANK_BATCH_SIZE = TUNING["rerank_batch_size"]   # pairs per padded forward batch
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r'\s+', ' ', query.lower()).strip().rstrip("?!. ")
+
+
+def chunk_key(chunk: Dict) -> str:
+    """
+    Stable chunk identifier for cache keys.
+
+    Combines source + chunk_index with a short content hash so a re-ingested
+    document that reuses chunk indexes never serves stale scores.
+    """
+    digest = hashlib.blake2b(chunk["text"].encode("utf-8"), digest_size=8).hexdigest()
+    return f"{chunk.get('source', '?')}#{chunk.get('chunk_index', -1)}:{digest}"
+
+
+class RerankCache:
+    """Thread-safe bounded LRU of rerank scores."""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[float]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple[str, str, str], score: float):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Request:
+    __slots__ = ("pairs", "scores", "error", "done")
+
+    def __init__(self, pairs: List[Tuple[str, str]]):
+        self.pairs = pairs
+        self.scores: List[float] = []
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class RerankBatcher:
+    """
+    Coalesces predict() calls from concurrent threads into shared passes.
+
+    A single daemon worker takes the first pending request, keeps collecting
+    for window_ms (or until max_pairs), then runs one length-sorted
+    CrossEncoder.predict over every collected pair and hands each caller
+    back its own slice of scores.
+    """
+
+    def __init__(
+        self,
+        model,
+        window_ms: float = RERANK_BATCH_WINDOW_MS,
+        max_pairs: int = RERANK_MAX_PAIRS,
+        batch_size: int = RERANK_BATCH_SIZE
+    ):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_pairs = max_pairs
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.passes = 0
+        self.coalesced_requests = 0
+
+    def predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Score pairs, blocking until the shared forward pass completes."""
+        if not pairs:
+            return []
+        self._ensure_worker()
+        req = _Request(pairs)
+        self._queue.put(req)
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.scores
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="rerank-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            n_pairs = len(batch[0].pairs)
+            deadline = time.perf_counter() + self.window
+            while n_pairs < self.max_pairs:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    req = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(req)
+                n_pairs += len(req.pairs)
+            self._score(batch)
+
+    def _score(self, batch: List[_Request]):
+        flat = [(r_idx, p_idx) for r_idx, r in enumerate(batch)
+                for p_idx in range(len(r.pairs))]
+        # Length bucketing: neighbours in a padded batch have similar length
+        flat.sort(key=lambda rp: len(batch[rp[0]].pairs[rp[1]][1]))
+        pairs = [batch[r].pairs[p] for r, p in flat]
+        try:
+            BUDGET.apply_torch()   # this thread outlives the tasks it serves
+            scores = self.model.predict(pairs, batch_size=self.batch_size)
+        except BaseException as exc:
+            for r in batch:
+                r.error = exc
+                r.done.set()
+            return
+
+        for r in batch:
+            r.scores = [0.0] * len(r.pairs)
+        for (r_idx, p_idx), score in zip(flat, scores):
+            batch[r_idx].scores[p_idx] = float(score)
+        self.passes += 1
+        self.coalesced_requests += len(batch)
+        for r in batch:
+            r.done.set()
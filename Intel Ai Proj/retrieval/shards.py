@@ -0,0 +1,331 @@
+"""
+Sharded chunk search with scatter-gather across local worker processes.
+
+Why?
+- One process scanning one vector matrix and one BM25 index caps both the
+  corpus size and query parallelism: every query walks every chunk on a
+  single core's worth of numpy / rank_bm25 work
+- With RETRIEVAL_SHARDS=N each index generation is also split into N
+  shards by document hash; each shard is served by a worker process that
+  owns its vectors (memory-mapped, exact search) and its BM25 rows
+
+The coordinator (HybridRetriever) still encodes the query and runs the
+document stage once, then scatters (embeddings, k, allowed sources) to
+every worker over multiprocessing queues, gathers each shard's dense and
+BM25 top-k and merges them into the global top-k. Fusion, text fetch and
+cross-encoder reranking then run once, exactly as in the unsharded path.
+
+Global BM25 statistics: a shard's BM25 rows are cut out of the index built
+over the whole generation and keep its IDF table and average document
+length, so a chunk scores the same in its shard as it would globally and
+merging by score is exact. Dense scores are plain L2 distances, already
+comparable across shards.
+
+Layout (next to the generation's other files):
+    g<N>/shards/shards.json          {"shards": N}
+    g<N>/shards/s<k>/vectors.npy     shard k's embeddings
+    g<N>/shards/s<k>/vector_ids.txt
+    g<N>/shards/s<k>/bm25_index.pkl  shard k's rows, global IDF / avgdl
+
+A document always lands in one shard (hash of its source file), so
+hierarchical retrieval can skip whole shards' worth of rows. Shards are
+built at ingest / bundle import; generations built unsharded keep
+searching in-process.
+"""
+from typing import Dict, List, Optional, Tuple
+import copy
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import threading
+import time
+
+from monitoring.metrics import stage_timer
+from runtime.thread_budget import BUDGET
+
+
+# >1 splits new generations into this many shards, each searched by its own
+# worker process; 1 keeps in-process search.
+RETRIEVAL_SHARDS = int(os.environ.get("RETRIEVAL_SHARDS", "1"))
+
+SHARDS_DIR = "shards"
+SHARDS_FILE = "shards.json"
+BM25_FILE = "bm25_index.pkl"
+START_TIMEOUT_S = 60.0
+SEARCH_TIMEOUT_S = 30.0
+LIVENESS_POLL_S = 0.5      # how often a waiting search checks its workers are alive
+
+
+class ShardUnavailableError(RuntimeError):
+    """Raised when a shard worker died or did not answer in time."""
+
+
+def shard_of(source: str, n_shards: int) -> int:
+    """Shard of a source file (stable across processes and restarts)."""
+    digest = hashlib.blake2b(str(source).encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % n_shards
+
+
+def shard_count(gen_dir: Optional[str]) -> int:
+    """Number of shards built for a generation directory (0 = unsharded)."""
+    if gen_dir is None:
+        return 0
+    path = os.path.join(gen_dir, SHARDS_DIR, SHARDS_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        return int(json.load(f)["shards"])
+
+
+def write_shards(gen_dir: str, n_shards: int, vectors, ids: List[str], bm25_store):
+    """
+    Split a generation's vectors and BM25 rows into n_shards by document.
+
+    Args:
+        vectors:    float32 (n, dim) embeddings, row i = ids[i]
+        bm25_store: The generation's loaded BM25Store (global statistics)
+    """
+    import numpy as np
+    from retrieval.bm25_store import BM25Store
+    from retrieval.mmap_vector_store import MmapVectorStore
+
+    root = os.path.join(gen_dir, SHARDS_DIR)
+    shutil.rmtree(root, ignore_errors=True)
+    source_of = dict(zip(bm25_store.ids, bm25_store.row_sources))
+    vector_rows: List[List[int]] = [[] for _ in range(n_shards)]
+    for i, cid in enumerate(ids):
+        vector_rows[shard_of(source_of.get(cid, "?"), n_shards)].append(i)
+    bm25_rows: List[List[int]] = [[] for _ in range(n_shards)]
+    for i, src in enumerate(bm25_store.row_sources):
+        bm25_rows[shard_of(src, n_shards)].append(i)
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    for k in range(n_shards):
+        directory = os.path.join(root, f"s{k}")
+        rows = vector_rows[k]
+        MmapVectorStore.write(directory, vectors[rows].reshape(len(rows), vectors.shape[1]),
+                              [ids[i] for i in rows])
+        shard = BM25Store(os.path.join(directory, BM25_FILE))
+        shard.ids = [bm25_store.ids[i] for i in bm25_rows[k]]
+        shard.row_sources = [bm25_store.row_sources[i] for i in bm25_rows[k]]
+        shard.bm25 = _bm25_rows(bm25_store.bm25, bm25_rows[k])
+        shard.save()
+    with open(os.path.join(root, SHARDS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"shards": n_shards}, f)
+    sizes = ", ".join(str(len(r)) for r in vector_rows)
+    print(f"Index split into {n_shards} shards ({sizes} chunks).")
+
+
+def _bm25_rows(bm25, rows: List[int]):
+    """A BM25Okapi over a subset of rows that keeps the global IDF and avgdl."""
+    shard = copy.copy(bm25)
+    shard.doc_freqs = [bm25.doc_freqs[i] for i in rows]
+    shard.doc_len = [bm25.doc_len[i] for i in rows]
+    shard.corpus_size = len(rows)
+    return shard
+
+
+def _shard_main(shard_id: int, directory: str, chunks_path: str, n_threads: int,
+                jobs, results):
+    """Worker process entry point: open one shard, then serve searches forever."""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(n_threads)   # before numpy loads its BLAS
+    from retrieval.bm25_store import BM25Store
+    from retrieval.chunk_store import ChunkStore
+    from retrieval.mmap_vector_store import MmapVectorStore
+
+    # chunk store (read-only here) only for source-restricted searches
+    vectors = MmapVectorStore(directory, None, ChunkStore(chunks_path))
+    keyword = BM25Store(os.path.join(directory, BM25_FILE))
+    keyword.load()
+    results.put(("ready", shard_id, None))
+
+    while True:
+        kind, job_id, payload = jobs.get()
+        if kind == "stop":
+            break
+        try:
+            queries, embeddings, dense_k, bm25_k, sources = payload
+            start = time.perf_counter()
+            dense = vectors.search_batch(queries, n_results=dense_k,
+                                         embeddings=embeddings, sources=sources)
+            bm25 = keyword.search_batch(queries, n_results=bm25_k, sources=sources)
+            results.put(("ok", job_id, (shard_id, dense, bm25, time.perf_counter() - start)))
+        except Exception as exc:
+            results.put(("error", job_id, (shard_id, f"{type(exc).__name__}: {exc}")))
+
+
+class _Shard:
+    def __init__(self, shard_id: int, directory: str):
+        self.shard_id = shard_id
+        self.directory = directory
+        self.process = None
+        self.jobs = None
+        self.restarts = 0
+        self.ready = threading.Event()
+
+
+class ShardPool:
+    """One worker process per shard of one index generation."""
+
+    def __init__(self, gen_dir: str, chunks_path: str, n_threads: Optional[int] = None):
+        self.n_shards = shard_count(gen_dir)
+        self.chunks_path = chunks_path
+        self.n_threads = n_threads or max(1, BUDGET.threads("shards") // max(1, self.n_shards))
+        self._ctx = mp.get_context("spawn")   # never fork a process holding torch threads
+        self._results = self._ctx.Queue()
+        self._shards = [
+            _Shard(k, os.path.join(gen_dir, SHARDS_DIR, f"s{k}")) for k in range(self.n_shards)
+        ]
+        self._pending: Dict[int, "queue.Queue"] = {}
+        self._lock = threading.Lock()
+        self._spawn_lock = threading.Lock()   # one restart per dead worker
+        self._ids = itertools.count()
+        self._closed = False
+        self._searches = 0
+        self._shard_seconds = [0.0] * self.n_shards
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Spawn every shard worker and wait until each has opened its shard."""
+        print(f"[Shards] Starting {self.n_shards} shard workers x {self.n_threads} threads ...")
+        threading.Thread(target=self._read_results, name="shard-results", daemon=True).start()
+        for s in self._shards:
+            self._spawn(s)
+        for s in self._shards:
+            if not s.ready.wait(START_TIMEOUT_S):
+                self.close()
+                raise RuntimeError(f"Shard worker {s.shard_id} did not start in time.")
+        print("[Shards] Shard workers ready.")
+
+    def close(self):
+        self._closed = True
+        for s in self._shards:
+            if s.process is not None and s.process.is_alive():
+                s.jobs.put(("stop", None, None))
+                s.process.join(timeout=5)
+                if s.process.is_alive():
+                    s.process.terminate()
+
+    def _spawn(self, s: _Shard):
+        s.ready.clear()
+        s.jobs = self._ctx.Queue()
+        s.process = self._ctx.Process(
+            target=_shard_main,
+            args=(s.shard_id, s.directory, self.chunks_path, self.n_threads,
+                  s.jobs, self._results),
+            name=f"shard-worker-{s.shard_id}",
+            daemon=True
+        )
+        s.process.start()
+
+    def _ensure_alive(self):
+        """Restart dead workers before dispatching (their shard is on disk)."""
+        for s in self._shards:
+            with self._spawn_lock:
+                # re-checked under the lock: a concurrent query may have restarted it
+                if not s.process.is_alive():
+                    print(f"[Shards] Worker {s.shard_id} died — restarting.")
+                    s.restarts += 1
+                    self._spawn(s)
+            if not s.ready.wait(START_TIMEOUT_S):
+                raise ShardUnavailableError(f"Shard worker {s.shard_id} did not restart.")
+
+    # ------------------------------------------------------------------
+    # Scatter-gather
+    # ------------------------------------------------------------------
+
+    def search_batch(
+        self,
+        queries: List[str],
+        embeddings,
+        dense_k: int,
+        bm25_k: int,
+        sources: Optional[List[Optional[List[str]]]] = None
+    ) -> Tuple[List[List[Dict]], List[List[Dict]]]:
+        """
+        Dense + BM25 search on every shard in parallel.
+
+        Returns:
+            (dense results, BM25 results): per query, the global top dense_k
+            / bm25_k, same format as VectorStore / BM25Store.search_batch
+        """
+        self._ensure_alive()
+        job_id = next(self._ids)
+        inbox: "queue.Queue" = queue.Queue()
+        with self._lock:
+            self._pending[job_id] = inbox
+        dense: List[List[Dict]] = [[] for _ in queries]
+        bm25: List[List[Dict]] = [[] for _ in queries]
+        try:
+            with stage_timer("shard_search"):
+                payload = (queries, embeddings, dense_k, bm25_k, sources)
+                for s in self._shards:
+                    s.jobs.put(("search", job_id, payload))
+                deadline = time.monotonic() + SEARCH_TIMEOUT_S
+                waiting = set(range(self.n_shards))
+                while waiting:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ShardUnavailableError(
+                            f"Shard search timed out after {SEARCH_TIMEOUT_S:.0f}s.")
+                    try:
+                        kind, result = inbox.get(timeout=min(LIVENESS_POLL_S, remaining))
+                    except queue.Empty:
+                        # a worker that died mid-search never answers: fail now,
+                        # the next search restarts it
+                        dead = sorted(k for k in waiting if not self._shards[k].process.is_alive())
+                        if dead:
+                            raise ShardUnavailableError(
+                                f"Shard worker {dead[0]} died mid-search.")
+                        continue
+                    if kind == "error":
+                        raise ShardUnavailableError(f"Shard worker {result[0]}: {result[1]}")
+                    shard_id, shard_dense, shard_bm25, seconds = result
+                    waiting.discard(shard_id)
+                    self._shard_seconds[shard_id] += seconds
+                    for q in range(len(queries)):
+                        dense[q].extend(shard_dense[q])
+                        bm25[q].extend(shard_bm25[q])
+        finally:
+            with self._lock:
+                self._pending.pop(job_id, None)
+        self._searches += 1
+
+        # Gather: scores are globally comparable, so the merged top-k is exact
+        dense = [sorted(d, key=lambda r: (-r["score"], r["chunk_id"]))[:dense_k] for d in dense]
+        bm25 = [sorted(b, key=lambda r: (-r["bm25_score"], r["chunk_id"]))[:bm25_k] for b in bm25]
+        return dense, bm25
+
+    def _read_results(self):
+        while not self._closed:
+            try:
+                kind, job_id, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "ready":
+                self._shards[job_id].ready.set()
+                continue
+            with self._lock:
+                inbox = self._pending.get(job_id)
+            if inbox is not None:   # else: a reply to a search that already failed
+                inbox.put((kind, payload))
+
+    def stats(self) -> Dict:
+        return {
+            "shards": self.n_shards,
+            "threads_per_shard": self.n_threads,
+            "alive": sum(1 for s in self._shards if s.process and s.process.is_alive()),
+            "restarts": sum(s.restarts for s in self._shards),
+            "searches": self._searches,
+            "shard_busy_s": [round(t, 3) for t in self._shard_seconds],
+        }
@@ -5,22 +5,49 @@ Key improvement over original:
 - Stores page number and source filename per chunk
 - Returns metadata alongside text in search results
 - Enables source attribution in the UI
+
+Only embeddings, chunk IDs and page/source metadata are stored; the text
+lives in the chunk store (retrieval/chunk_store.py).
 """
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from monitoring.metrics import stage_timer
+from retrieval.chunk_store import chunk_id
+from retrieval.embedding_pool import encode_texts
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHROMA_PATH = "./chroma_db"
+CHROMA_MAX_BATCH = 5000   # fallback when the client cannot report its limit
 
 
 class VectorStore:
     def __init__(
         self,
         collection_name: str = "pdf_knowledge",
-        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
-        db_path: str = "./chroma_db"
+        model_name: str = EMBEDDING_MODEL,
+        db_path: str = CHROMA_PATH,
+        client=None,
+        embedding_model=None
     ):
-        self.client = chromadb.PersistentClient(path=db_path)
+        """
+        Args:
+            client, embedding_model: Reuse an already-open Chroma client /
+                MiniLM model (index generations share one of each)
+        """
+        if client is None:
+            import chromadb   # deferred: heavy import
+            client = chromadb.PersistentClient(path=db_path)
+        if embedding_model is None:
+            from sentence_transformers import SentenceTransformer   # deferred: pulls in torch
+            embedding_model = SentenceTransformer(model_name)
+
+        self.client = client
         self.collection_name = collection_name
-        self.embedding_model = SentenceTransformer(model_name)
+        self.model_name = model_name
+        self.embedding_model = embedding_model
         self._get_or_create_collection()
 
     def _get_or_create_collection(self):
@@ -29,21 +56,25 @@ class VectorStore:
         except Exception:
             self.collection = self.client.create_collection(self.collection_name)
 
-    def add_documents(self, chunks: List[Dict]):
+    def add_documents(self, chunks: List[Dict]) -> Optional[np.ndarray]:
         """
         Add chunks with metadata to the vector store.
 
         Args:
             chunks: List of {"text": str, "page": int, "chunk_index": int, "source": str}
+
+        Returns:
+            The chunk embeddings (reused for the document index)
         """
         if not chunks:
-            return
+            return None
 
         texts = [c["text"] for c in chunks]
         print(f"Encoding {len(texts)} chunks...")
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=True)
+        with stage_timer("embed"):
+            embeddings = encode_texts(texts, self.embedding_model, self.model_name)
 
-        ids = [f"chunk_{c['chunk_index']}" for c in chunks]
+        ids = [chunk_id(c) for c in chunks]
         metadatas = [
             {
                 "page": int(c["page"]),
@@ -53,46 +84,113 @@ class VectorStore:
             for c in chunks
         ]
 
-        self.collection.add(
-            embeddings=embeddings.tolist(),
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # One add() per max_batch rows: a single huge add() is rejected by Chroma
+        step = self._max_batch_size()
+        with stage_timer("chroma_insert"):
+            for start in range(0, len(ids), step):
+                end = start + step
+                self.collection.add(
+                    embeddings=embeddings[start:end].tolist(),
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end]
+                )
         print(f"ChromaDB: {len(chunks)} chunks indexed.")
+        return embeddings
+
+    def _max_batch_size(self) -> int:
+        """Largest add() the Chroma client accepts."""
+        try:
+            limit = getattr(self.client, "max_batch_size", None) or self.client.get_max_batch_size()
+            return max(1, int(limit))
+        except Exception:
+            return CHROMA_MAX_BATCH
 
     def search(self, query: str, n_results: int = 6) -> List[Dict]:
         """
         Search for relevant chunks.
 
         Returns:
-            List of {"text": str, "page": int, "source": str, "score": float}
+            List of {"chunk_id": str, "score": float}
         """
-        query_emb = self.embedding_model.encode([query])
-        results = self.collection.query(
-            query_embeddings=query_emb.tolist(),
-            n_results=min(n_results, self.collection.count()),
-            include=["documents", "distances", "metadatas"]
-        )
+        return self.search_batch([query], n_results=n_results)[0]
 
-        output = []
-        for doc, dist, meta in zip(
-            results["documents"][0],
-            results["distances"][0],
-            results["metadatas"][0]
-        ):
-            output.append({
-                "text": doc,
-                "page": meta.get("page", "?"),
-                "source": meta.get("source", "?"),
-                "score": round(1 - dist, 4)  # convert L2 distance to similarity
-            })
-        return output
+    def encode(self, queries: List[str]) -> np.ndarray:
+        """Query embeddings, computed in one call."""
+        with stage_timer("query_embed"):
+            return self.embedding_model.encode(queries)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 6,
+        embeddings: Optional[np.ndarray] = None,
+        sources: Optional[List[Optional[List[str]]]] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for many queries at once: one encode() call for every query
+        embedding and one Chroma query for the whole batch.
+
+        Args:
+            embeddings: Precomputed encode(queries)
+            sources:    Per query, the source files to search (None = all);
+                        restricted queries become one filtered Chroma query each
+
+        Returns:
+            One result list per query, in input order (same format as search)
+        """
+        if not queries:
+            return []
+        if embeddings is None:
+            embeddings = self.encode(queries)
+        include = ["distances", "metadatas"]
+        n = min(n_results, self.collection.count())
+        with stage_timer("chroma_query"):
+            if sources is None or all(s is None for s in sources):
+                results = self.collection.query(
+                    query_embeddings=embeddings.tolist(), n_results=n, include=include
+                )
+                distances, metadatas = results["distances"], results["metadatas"]
+            else:
+                distances, metadatas = [], []
+                for emb, allowed in zip(embeddings, sources):
+                    where = {} if allowed is None else {"where": {"source": {"$in": allowed}}}
+                    result = self.collection.query(
+                        query_embeddings=[emb.tolist()], n_results=n, include=include, **where
+                    )
+                    distances.append(result["distances"][0])
+                    metadatas.append(result["metadatas"][0])
+
+        batch = []
+        for dists, metas in zip(distances, metadatas):
+            batch.append([
+                {
+                    # from metadata, so pre-chunk-store collections map too
+                    "chunk_id": chunk_id(meta),
+                    "score": round(1 - dist, 4)  # convert L2 distance to similarity
+                }
+                for dist, meta in zip(dists, metas)
+            ])
+        return batch
 
     def count(self) -> int:
         """Return total number of indexed chunks."""
         return self.collection.count()
 
+    def dump(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Every stored embedding with its chunk ID, ordered by source + chunk_index.
+
+        Returns:
+            (float32 array of shape (n, dim), chunk IDs in the same order)
+        """
+        data = self.collection.get(include=["embeddings", "metadatas"])
+        rows = sorted(
+            zip(data["embeddings"], data["metadatas"]),
+            key=lambda row: (str(row[1].get("source", "")), row[1].get("chunk_index", -1))
+        )
+        vectors = np.asarray([emb for emb, _ in rows], dtype=np.float32)
+        return vectors, [chunk_id(meta) for _, meta in rows]
+
     def clear(self):
         """Delete and recreate the collection."""
         self.client.delete_collection(self.collection_name)
@@ -0,0 +1,258 @@
+"""
+Hardware autotuning: micro-benchmarks on this host -> storage/tuning.json.
+
+Each stage times one component on chunks of a representative PDF and keeps
+the setting that is fastest here (runtime/tuning.py loads the file at
+startup; restart the API afterwards):
+
+  embed   MiniLM chunks/s per batch size                 -> embed_batch_size
+  rerank  smallest max_length covering 95% of real (query, chunk) pairs
+                                                          -> rerank_max_length
+          ms per rerank_budget-pair call per batch size   -> rerank_batch_size
+  llm     prompt-eval tokens/s per llama.cpp n_batch      -> llm_n_batch
+  ocr     lowest render DPI whose Tesseract text agrees
+          >= OCR_AGREEMENT with the 300 DPI text           -> ocr_dpi
+
+Stages whose model or tool is missing are skipped and keep their current
+value. llm_n_ctx is not tuned: the window follows from the profiles, not
+the host (set it by hand in the file if needed). Threads come from the CPU
+budget (runtime/thread_budget.py), so the numbers match what the engine
+will get with the same CPU_BUDGET.
+
+Run from the project root:
+    python -m runtime.autotune storage/report.pdf
+    python -m runtime.autotune storage/scan.pdf --only ocr --dry-run
+"""
+import argparse
+import difflib
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+
+from runtime.thread_budget import BUDGET
+from runtime.tuning import DEFAULTS, TUNING_FILE, load_tuning
+
+
+STAGES = ("embed", "rerank", "llm", "ocr")
+
+EMBED_BATCHES = (16, 32, 64, 128, 256)
+RERANK_BATCHES = (8, 16, 32, 64)
+RERANK_LENGTHS = (128, 256, 384, 512)
+LLM_BATCHES = (128, 256, 512, 1024)
+LLM_PROMPT_TOKENS = 1536     # a packed-context-sized prompt
+OCR_DPIS = (150, 200, 250, 300)
+OCR_AGREEMENT = 0.95
+OCR_PAGES = 3
+
+
+def _best_of(fn, repeats: int = 3) -> float:
+    """Fastest of repeats timed calls (seconds)."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _sample_texts(pdf_path: str, limit: int):
+    from ingestion.pdf_reader import extract_pages
+    from ingestion.chunker import semantic_chunk
+
+    chunks = semantic_chunk(extract_pages(pdf_path, use_ocr=False))
+    texts = [c["text"] for c in chunks if c["text"].strip()]
+    if not texts:
+        raise SystemExit(f"No text chunks in {pdf_path}; pick a PDF with a text layer.")
+    while len(texts) < limit:   # small PDFs: repeat to a steady-state workload
+        texts += texts[:limit - len(texts)]
+    return texts[:limit]
+
+
+def _queries(texts, n: int):
+    """Short keyword queries from chunk openings (like typical questions)."""
+    return [" ".join(t.split()[:8]) for t in texts[:n]]
+
+
+# ----------------------------------------------------------------------
+# Stages: each returns (settings, measurements)
+# ----------------------------------------------------------------------
+
+def tune_embed(texts):
+    from sentence_transformers import SentenceTransformer
+    from retrieval.embedding_pool import length_sorted_batches
+    from retrieval.vector_store import EMBEDDING_MODEL
+
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    model.encode(texts[:32])   # warm-up
+    rates = {}
+    for batch_size in EMBED_BATCHES:
+        def run():
+            for rows in length_sorted_batches(texts, batch_size):
+                model.encode([texts[i] for i in rows], batch_size=len(rows))
+        rates[batch_size] = round(len(texts) / _best_of(run, repeats=2), 1)
+        print(f"  embed   batch {batch_size:>4}: {rates[batch_size]:>8.1f} chunks/s")
+    best = max(rates, key=rates.get)
+    return {"embed_batch_size": best}, {"chunks_per_s": rates}
+
+
+def tune_rerank(texts):
+    from sentence_transformers import CrossEncoder
+    from generation.profiles import PROFILES
+    from retrieval.hybrid_retriever import RERANKER_MODEL
+
+    n_pairs = max(p["rerank_budget"] for p in PROFILES.values())
+    queries = _queries(texts, n_pairs)
+
+    # max_length: cover the 95th percentile pair, never truncate more than that
+    model = CrossEncoder(RERANKER_MODEL, max_length=max(RERANK_LENGTHS))
+    lengths = sorted(
+        len(model.tokenizer(q, t)["input_ids"]) for q in queries for t in texts[:n_pairs]
+    )
+    p95 = lengths[int(0.95 * (len(lengths) - 1))]
+    max_length = next((n for n in RERANK_LENGTHS if n >= p95), max(RERANK_LENGTHS))
+    print(f"  rerank  p95 pair length {p95} tokens -> max_length {max_length}")
+
+    model = CrossEncoder(RERANKER_MODEL, max_length=max_length)
+    pairs = [(queries[0], t) for t in texts[:n_pairs]]   # one query's rerank call
+    model.predict(pairs[:4])   # warm-up
+    latency = {}
+    for batch_size in RERANK_BATCHES:
+        seconds = _best_of(lambda: model.predict(pairs, batch_size=batch_size))
+        latency[batch_size] = round(seconds * 1000, 1)
+        print(f"  rerank  batch {batch_size:>4}: {latency[batch_size]:>8.1f} ms / {n_pairs} pairs")
+    best = min(latency, key=latency.get)
+    settings = {"rerank_max_length": max_length, "rerank_batch_size": best}
+    return settings, {"p95_pair_tokens": p95, "ms_per_call": latency}
+
+
+def tune_llm(texts):
+    from generation.llm_engine import MODEL_PATH, PHI3_MAX_CTX
+
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f"{MODEL_PATH} not found")
+
+    from llama_cpp import Llama
+    rates = {}
+    for n_batch in LLM_BATCHES:
+        llm = Llama(model_path=MODEL_PATH, n_ctx=PHI3_MAX_CTX, n_batch=n_batch,
+                    n_threads=BUDGET.threads("llm"), n_gpu_layers=0, verbose=False)
+        tokens = llm.tokenize(" ".join(texts).encode("utf-8"))[:LLM_PROMPT_TOKENS]
+
+        def run():
+            llm.reset()
+            llm.eval(tokens)
+        run()   # warm-up: pages the weights in
+        rates[n_batch] = round(len(tokens) / _best_of(run, repeats=2), 1)
+        print(f"  llm     n_batch {n_batch:>4}: {rates[n_batch]:>8.1f} prompt tokens/s")
+        del llm
+    return {"llm_n_batch": max(rates, key=rates.get)}, {"prompt_tokens_per_s": rates}
+
+
+def tune_ocr(pdf_path):
+    import pdfplumber
+    import pytesseract
+    from ingestion.pdf_reader import ocr_image
+
+    pytesseract.get_tesseract_version()   # fails fast without the binary
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = pdf.pages[:OCR_PAGES]
+        texts, seconds = {}, {}
+        for dpi in OCR_DPIS:
+            start = time.perf_counter()
+            texts[dpi] = [ocr_image(p.to_image(resolution=dpi).original, BUDGET.threads("ocr"))
+                          for p in pages]
+            seconds[dpi] = round((time.perf_counter() - start) / len(pages), 2)
+
+    reference = texts[max(OCR_DPIS)]
+    agreement = {
+        dpi: round(statistics.mean(
+            difflib.SequenceMatcher(None, ref, txt).ratio()
+            for ref, txt in zip(reference, texts[dpi])
+        ), 3)
+        for dpi in OCR_DPIS
+    }
+    for dpi in OCR_DPIS:
+        print(f"  ocr     {dpi:>4} dpi: {seconds[dpi]:>6.2f} s/page, "
+              f"agreement {agreement[dpi]:.3f}")
+    best = min(dpi for dpi in OCR_DPIS if agreement[dpi] >= OCR_AGREEMENT)
+    return {"ocr_dpi": best}, {"seconds_per_page": seconds, "agreement": agreement}
+
+
+# ----------------------------------------------------------------------
+# Profile file
+# ----------------------------------------------------------------------
+
+def write_profile(path: str, settings, measurements):
+    """Merge settings into path's profile and replace the file atomically."""
+    data = {"settings": {}, "measurements": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data.update(json.load(f))
+    data["settings"].update(settings)
+    data["measurements"].update(measurements)
+    data["created"] = datetime.now().isoformat(timespec="seconds")
+    data["host"] = {
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "budget_cores": BUDGET.total,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("pdf", help="PDF representative of the documents you serve")
+    parser.add_argument("--only", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--samples", type=int, default=256, help="chunks per workload")
+    parser.add_argument("--out", default=TUNING_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="print, do not write")
+    args = parser.parse_args()
+
+    # only the model stages need text chunks; ocr works on scanned PDFs too
+    texts = []
+    if set(args.only) & {"embed", "rerank", "llm"}:
+        texts = _sample_texts(args.pdf, args.samples)
+    print(f"Autotuning on {os.cpu_count()} cores (budget {BUDGET.total}), "
+          f"{len(texts)} chunks from {args.pdf}\n")
+
+    current = load_tuning(args.out)
+    settings, measurements = {}, {}
+    stages = {
+        "embed": lambda: tune_embed(texts),
+        "rerank": lambda: tune_rerank(texts),
+        "llm": lambda: tune_llm(texts),
+        "ocr": lambda: tune_ocr(args.pdf),
+    }
+    for stage in args.only:
+        side = "query" if stage in ("rerank", "llm") else "ingest"
+        try:
+            with BUDGET.task(side):
+                tuned, measured = stages[stage]()
+        except Exception as e:   # missing model / library / binary
+            print(f"  {stage:<7} skipped: {e}")
+            continue
+        settings.update(tuned)
+        measurements[stage] = measured
+
+    print(f"\n{'setting':<20}{'default':>9}{'current':>9}{'tuned':>9}")
+    for key in DEFAULTS:
+        tuned = settings.get(key, "-")
+        print(f"{key:<20}{DEFAULTS[key]:>9}{current[key]:>9}{tuned:>9}")
+
+    if args.dry_run or not settings:
+        print("\nNothing written.")
+        return
+    write_profile(args.out, settings, measurements)
+    print(f"\nWrote {args.out}; restart the API to load it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Central CPU thread budget for every compute-heavy component.
+
+Why?
+- Each library sized its own thread pool for the whole machine: llama.cpp
+  (n_threads=cpu_count), torch's intra-op pool (MiniLM, cross-encoder,
+  flan-T5, BLIP), Tesseract's OpenMP and numpy's BLAS in shard workers
+- An upload running next to queries then asked for 3-4x the cores that
+  exist; context switches and cache thrash slowed both sides down
+
+One ThreadBudget per process owns CPU_BUDGET cores and splits them
+between two sides:
+
+    queries only  -> query side gets every core
+    ingest only   -> ingest side gets every core
+    both          -> ingest side gets INGEST_SHARE, queries the rest
+
+Concurrent tasks on one side split that side's cores. Components map to
+sides:
+
+    llm    query    llama.cpp decode threads, set before every generation
+    torch  either   torch intra-op threads: the ingest side's share while
+                    an ingest runs, else the query side's
+    ocr    ingest   OMP_THREAD_LIMIT of each tesseract run (subprocess env)
+    embed  ingest   all embedding-pool workers together
+    shards query    BLAS threads of all shard workers together (at spawn)
+
+Configure per deployment with environment variables:
+    CPU_BUDGET=16                     cores to use (default: all; "off" gives
+                                      every component every core, as before)
+    INGEST_SHARE=0.5                  ingest fraction when both sides run
+    THREAD_CAPS="llm=8,ocr=2"         per-component upper bounds
+
+Callers mark work with BUDGET.task("query" | "ingest") and read their
+thread count with BUDGET.threads(component) right before running.
+
+torch.set_num_threads only sizes the parallel regions started by the
+calling thread under OpenMP builds, so task() sizes the request thread and
+long-lived threads that run torch work for others (the reranker batcher,
+the flan-T5 streaming thread) call BUDGET.apply_torch() before each pass.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import os
+import sys
+import threading
+
+
+SIDES = ("query", "ingest")
+COMPONENTS = {"llm": "query", "torch": None, "ocr": "ingest", "embed": "ingest", "shards": "query"}
+
+
+def _parse_caps(spec: str) -> Dict[str, int]:
+    caps = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        if name.strip() not in COMPONENTS:
+            raise ValueError(f"THREAD_CAPS: unknown component {name.strip()!r}")
+        caps[name.strip()] = max(1, int(value))
+    return caps
+
+
+class ThreadBudget:
+    def __init__(self, total: Optional[int] = None, ingest_share: float = 0.5,
+                 caps: Optional[Dict[str, int]] = None, enabled: bool = True):
+        """
+        Args:
+            total:        Cores to hand out (default: os.cpu_count())
+            ingest_share: Fraction of total for the ingest side while
+                          queries run too
+            caps:         Per-component maximum thread counts
+            enabled:      False hands every component all cores (the
+                          previous behaviour; for comparison benchmarks)
+        """
+        self.total = max(1, total or os.cpu_count() or 4)
+        self.ingest_share = min(max(ingest_share, 0.0), 1.0)
+        self.caps = dict(caps or {})
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._active = {side: 0 for side in SIDES}
+        self._local = threading.local()     # torch threads last set on each thread
+
+    @classmethod
+    def from_env(cls) -> "ThreadBudget":
+        raw = os.environ.get("CPU_BUDGET", "").strip().lower()
+        return cls(
+            total=int(raw) if raw.isdigit() else None,
+            ingest_share=float(os.environ.get("INGEST_SHARE", "0.5")),
+            caps=_parse_caps(os.environ.get("THREAD_CAPS", "")),
+            enabled=raw != "off"
+        )
+
+    # ------------------------------------------------------------------
+    # Allocation
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def task(self, side: str) -> Iterator[None]:
+        """Count a running query / ingest task while the block executes."""
+        if side not in SIDES:
+            raise ValueError(f"Unknown budget side: {side!r}")
+        with self._lock:
+            self._active[side] += 1
+        self.apply_torch()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active[side] -= 1
+            self.apply_torch()
+
+    def cores(self, side: str) -> int:
+        """Cores currently assigned to one side (all of them while it runs alone)."""
+        with self._lock:
+            return self._cores(side)
+
+    def threads(self, component: str) -> int:
+        """Thread count for one task of component, given current activity."""
+        with self._lock:
+            return self._threads(component)
+
+    def _cores(self, side: str) -> int:
+        if not self.enabled or not all(self._active.values()) or self.total == 1:
+            return self.total
+        ingest = min(self.total - 1, max(1, round(self.total * self.ingest_share)))
+        return ingest if side == "ingest" else self.total - ingest
+
+    def _threads(self, component: str) -> int:
+        side = COMPONENTS[component]
+        if not self.enabled:
+            return self.total
+        if side is None:   # torch: one pool for the whole process
+            side = "ingest" if self._active["ingest"] else "query"
+        per_task = self._cores(side) // max(1, self._active[side])
+        return max(1, min(per_task, self.caps.get(component, self.total)))
+
+    def apply_torch(self):
+        """Size torch's intra-op threads for the calling thread (if torch is loaded)."""
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        n = self.threads("torch")
+        if getattr(self._local, "torch_threads", None) != n:
+            torch.set_num_threads(n)
+            self._local.torch_threads = n
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "cores": self.total,
+                "ingest_share": self.ingest_share,
+                "active": dict(self._active),
+                "threads": {c: self._threads(c) for c in COMPONENTS},
+                "caps": dict(self.caps),
+            }
+
+
+_llama_threads_warned = False
+
+
+def set_llama_threads(llm, n_threads: int):
+    """Retarget a loaded llama.cpp context to n_threads (best effort)."""
+    global _llama_threads_warned
+    if getattr(llm, "n_threads", None) == n_threads:
+        return
+    try:
+        import llama_cpp
+        llama_cpp.llama_set_n_threads(llm._ctx.ctx, n_threads, n_threads)
+        llm.n_threads = llm.n_threads_batch = n_threads
+    except Exception as e:
+        # older llama-cpp-python: keep the load-time thread count
+        if not _llama_threads_warned:
+            _llama_threads_warned = True
+            print(f"[Budget] Cannot retarget llama.cpp threads ({e}); "
+                  f"keeping the load-time count.")
+
+
+BUDGET = ThreadBudget.from_env()
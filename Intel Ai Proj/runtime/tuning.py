@@ -0,0 +1,55 @@
+"""
+Host tuning profile: batch sizes and model parameters measured per machine.
+
+Why?
+- Embedding / reranker batch sizes, the cross-encoder max_length, llama.cpp
+  n_ctx / n_batch and the OCR DPI were constants tuned on one laptop; the
+  best values differ a lot between an 8-core and a 64-core server
+- `python -m runtime.autotune` measures them on the host and writes
+  storage/tuning.json; every module reads its knob from TUNING at import,
+  so the engine starts with the tuned values
+
+Without a file (or for keys it lacks) the defaults below apply, which are
+the previous hard-coded values. Set TUNING_FILE to use another path.
+"""
+from typing import Dict
+import json
+import os
+
+
+TUNING_FILE = os.environ.get("TUNING_FILE", os.path.join("storage", "tuning.json"))
+
+DEFAULTS = {
+    "embed_batch_size": 64,      # chunks per MiniLM forward batch (ingest)
+    "rerank_batch_size": 32,     # pairs per cross-encoder forward batch
+    "rerank_max_length": 512,    # cross-encoder tokens per (query, chunk) pair
+    "llm_n_ctx": 4096,           # Phi-3 context window
+    "llm_n_batch": 512,          # llama.cpp prompt-eval batch
+    "ocr_dpi": 300,              # page render resolution for Tesseract
+}
+
+
+def load_tuning(path: str = TUNING_FILE) -> Dict[str, int]:
+    """DEFAULTS overlaid with the tuned values in path (if it exists)."""
+    tuning = dict(DEFAULTS)
+    if not os.path.exists(path):
+        return tuning
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for key, value in data.get("settings", {}).items():
+            if key in DEFAULTS and int(value) > 0:
+                tuning[key] = int(value)
+    except Exception as e:
+        print(f"[Tuning] {path} unreadable ({e}); using defaults.")
+        return dict(DEFAULTS)
+
+    tuned_cores = data.get("host", {}).get("cpu_count")
+    if tuned_cores and tuned_cores != os.cpu_count():
+        print(f"[Tuning] {path} was tuned on a {tuned_cores}-core host, this one has "
+              f"{os.cpu_count()}; re-run python -m runtime.autotune.")
+    print(f"[Tuning] Loaded {path} ({data.get('created', 'unknown date')}).")
+    return tuning
+
+
+TUNING = load_tuning()
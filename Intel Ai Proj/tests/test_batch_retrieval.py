@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+
+import pytest
+
+from retrieval.hybrid_retriever import HybridRetriever
+from retrieval.reranker import RerankBatcher
+
+
+CHUNKS = [
+    {"source": "a.pdf", "page": 1, "chunk_index": 0, "text": "The exam date is 12 May 2024."},
+    {"source": "a.pdf", "page": 1, "chunk_index": 1, "text": "Candidates must bring a hall ticket."},
+    {"source": "b.pdf", "page": 2, "chunk_index": 0, "text": "The event report covers the hackathon."},
+    {"source": "b.pdf", "page": 3, "chunk_index": 1, "text": "Prizes were given to three teams at the event."},
+]
+QUERIES = ["exam date", "hall ticket", "hackathon event prizes", "nothing matches"]
+
+
+def test_bm25_batch_search_matches_single_search(tmp_path):
+    pytest.importorskip("rank_bm25")
+    from retrieval.bm25_store import BM25Store
+
+    store = BM25Store(str(tmp_path / "bm25.pkl"))
+    store.build(CHUNKS)
+    assert store.search_batch(QUERIES, n_results=3) == [store.search(q, n_results=3) for q in QUERIES]
+
+
+class _Gen:
+    """Index generation stand-in: dense hits by chunk order, BM25 by word overlap."""
+    gen_id = 1
+    shard_pool = None
+
+    def __init__(self):
+        self.vector_store = self
+        self.bm25_store = self
+        self.document_index = self
+        self.chunk_store = self
+        self.by_id = {str(i): dict(c, chunk_id=str(i)) for i, c in enumerate(CHUNKS)}
+
+    def encode(self, queries):
+        return [None] * len(queries)
+
+    def search_batch(self, queries, *args, n_results=15, sources=None, embeddings=None):
+        if args:   # DocumentIndex.search_batch(queries, embeddings, fanout)
+            return [None] * len(queries)
+        out = []
+        for q in queries:
+            words = set(q.lower().split())
+            hits = [(len(words & set(c["text"].lower().rstrip(".").split())), cid)
+                    for cid, c in self.by_id.items()]
+            out.append([{"chunk_id": cid, "score": float(n)}
+                        for n, cid in sorted(hits, reverse=True) if n][:n_results])
+        return out
+
+    def get_many(self, ids):
+        return [dict(self.by_id[i]) for i in ids]
+
+
+class _Indexes:
+    def __init__(self):
+        self.gen = _Gen()
+
+    @contextmanager
+    def acquire(self):
+        yield self.gen
+
+
+class _CrossEncoder:
+    def predict(self, pairs, batch_size=32):
+        return [float(len(set(q.split()) & set(t.lower().split()))) for q, t in pairs]
+
+
+def test_retrieve_batch_matches_one_query_at_a_time():
+    retriever = HybridRetriever(skip_margin=None, load=False, indexes=_Indexes())
+    retriever.rerank_batcher = RerankBatcher(_CrossEncoder(), window_ms=1)
+
+    batch = retriever.retrieve_batch(QUERIES, top_k=2)
+    retriever.rerank_cache.clear()
+    single = [retriever.retrieve(q, top_k=2) for q in QUERIES]
+
+    assert batch == single
+    assert batch[-1] == []
+    assert all(len(r) <= 2 for r in batch)
+    assert retriever.stats["pairs_scored"] > 0
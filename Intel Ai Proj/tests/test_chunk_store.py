@@ -0,0 +1,58 @@
+from retrieval.chunk_store import chunk_id
+from retrieval.chunk_store import ChunkStore
+
+
+def _chunk(source, idx, text, page=1):
+    return {"source": source, "page": page, "chunk_index": idx, "text": text}
+
+
+def _store(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    store.add([_chunk("b.pdf", 0, "beta zero"), _chunk("a.pdf", 0, "alpha zero"),
+               _chunk("a.pdf", 1, "alpha one", page=2)])
+    return store
+
+
+def test_ids_are_stable_and_lookup_keeps_request_order(tmp_path):
+    store = _store(tmp_path)
+    ids = [chunk_id(_chunk("a.pdf", 1, "")), "missing", chunk_id(_chunk("b.pdf", 0, ""))]
+
+    found = store.get_many(ids)
+    assert [c and c["text"] for c in found] == ["alpha one", None, "beta zero"]
+    assert found[0] == {"chunk_id": ids[0], "text": "alpha one", "page": 2,
+                        "source": "a.pdf", "chunk_index": 1}
+    assert store.get("missing") is None
+
+
+def test_sources_and_iteration_follow_ingestion_order(tmp_path):
+    store = _store(tmp_path)
+    assert store.sources() == ["b.pdf", "a.pdf"]
+    assert [c["text"] for c in store.iter_chunks()] == ["beta zero", "alpha zero", "alpha one"]
+    assert store.count() == 3
+
+
+def test_readding_a_chunk_replaces_it_and_changes_the_digest(tmp_path):
+    store = _store(tmp_path)
+    before = store.digest("a.pdf")
+    assert store.digest("a.pdf") == before
+
+    store.add([_chunk("a.pdf", 1, "alpha one, revised")])
+    assert store.count() == 3
+    assert store.digest("a.pdf") != before
+    assert store.digest("b.pdf") == ChunkStore(store.path).digest("b.pdf")
+
+
+def test_lookups_larger_than_one_sqlite_batch(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    chunks = [_chunk("big.pdf", i, f"text {i}") for i in range(1200)]
+    ids = store.add(chunks)
+    assert [c["text"] for c in store.get_many(ids)] == [c["text"] for c in chunks]
+
+
+def test_backup_and_clear(tmp_path):
+    store = _store(tmp_path)
+    store.backup(str(tmp_path / "copy.db"))
+    assert ChunkStore(str(tmp_path / "copy.db")).count() == 3
+
+    store.clear()
+    assert not (tmp_path / "chunks.db").exists()
@@ -0,0 +1,51 @@
+from generation.context_packer import SEPARATOR, merge_adjacent, pack_context
+
+
+def words(text):
+    """Whitespace token counter (stands in for the model tokenizer)."""
+    return len(text.split())
+
+
+def _chunk(text, idx, page=1, score=1.0, source="doc.pdf"):
+    return {"text": text, "chunk_index": idx, "page": page, "score": score, "source": source}
+
+
+def test_adjacent_chunks_merge_without_overlap():
+    blocks = merge_adjacent([
+        _chunk("one two three four", 0),
+        _chunk("three four five six", 1),
+        _chunk("elsewhere", 5, score=2.0),
+    ])
+    assert [b["text"] for b in blocks] == ["elsewhere", "one two three four five six"]
+
+
+def test_repeated_sentences_are_dropped_within_and_across_blocks():
+    chunks = [
+        _chunk("Alpha is first. Alpha is first. Beta follows.", 0, page=1, score=2.0),
+        _chunk("Beta follows. Gamma ends.", 0, page=2, score=1.0),
+    ]
+    context, _ = pack_context(chunks, words, budget=100)
+    assert context == (
+        "[Page 1] Alpha is first. Beta follows." + SEPARATOR + "[Page 2] Gamma ends."
+    )
+
+
+def test_assembled_context_never_exceeds_the_budget():
+    chunks = [
+        _chunk(f"Sentence number {i} of block {p} is here.", 0, page=p, score=10 - p)
+        for p in range(5) for i in range(3)
+    ]
+    for budget in range(5, 120, 7):
+        context, used = pack_context(chunks, words, budget)
+        assert used == words(context) <= budget
+
+
+def test_oversized_top_sentence_is_truncated_not_dropped():
+    chunks = [_chunk("word " * 50 + "end.", 0)]
+    context, used = pack_context(chunks, words, budget=10)
+    assert context.startswith("[Page 1] word")
+    assert used == 10
+
+
+def test_empty_input_gives_empty_context():
+    assert pack_context([], words, budget=50) == ("", 0)
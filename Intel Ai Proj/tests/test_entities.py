@@ -0,0 +1,48 @@
+from ingestion.entity_extractor import extract_entities
+from retrieval.entity_index import EntityIndex, query_keywords
+
+
+TEXT = (
+    "Hall Ticket. Roll Number: NPTEL24CS101. Exam Date: 12/05/2024 at 10:30 AM. "
+    "Fee paid: Rs. 1,000. Contact exams@nptel.ac.in. Printed on 01/04/2024."
+)
+
+
+def _entities():
+    return extract_entities([{"text": TEXT, "page": 1, "chunk_index": 0, "source": "ticket.pdf"}])
+
+
+def test_extracts_typed_entities_with_context():
+    found = {(e["type"], e["value"]) for e in _entities()}
+    assert {("id", "NPTEL24CS101"), ("date", "12/05/2024"), ("date", "01/04/2024"),
+            ("time", "10:30 AM"), ("amount", "Rs. 1,000"),
+            ("email", "exams@nptel.ac.in")} <= found
+    for e in _entities():
+        assert e["context"][e["offset"]:].startswith(e["value"])
+
+
+def test_query_keywords_drop_stop_words():
+    assert query_keywords("What is the exam date?") == ["exam", "date"]
+
+
+def test_lookup_prefers_the_value_next_to_the_keywords(tmp_path):
+    index = EntityIndex(str(tmp_path / "entities.json"))
+    index.build(_entities())
+
+    assert index.lookup("date", "When is the exam date?")["value"] == "12/05/2024"
+    assert index.lookup("date", "When was it printed?")["value"] == "01/04/2024"
+    assert index.lookup("date", "unrelated words") is None
+    assert index.lookup("date", "what is") is None
+
+
+def test_index_persists_and_clears(tmp_path):
+    path = tmp_path / "entities.json"
+    EntityIndex(str(path)).build(_entities())
+
+    loaded = EntityIndex(str(path))
+    assert loaded.load()
+    assert loaded.count() == len(_entities())
+
+    loaded.clear()
+    assert not path.exists() and loaded.count() == 0
+    assert not EntityIndex(str(path)).load()
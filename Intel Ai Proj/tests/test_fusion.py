@@ -0,0 +1,38 @@
+from retrieval.hybrid_retriever import HybridRetriever, RRF_K
+
+
+def _hit(cid, **scores):
+    return {"chunk_id": cid, **scores}
+
+
+def test_fuse_merges_lists_and_keeps_both_scores():
+    dense = [_hit("a", score=0.9), _hit("b", score=0.8)]
+    bm25 = [_hit("b", bm25_score=7.0), _hit("c", bm25_score=3.0)]
+
+    fused = HybridRetriever.fuse(dense, bm25)
+
+    assert [c["chunk_id"] for c in fused] == ["b", "a", "c"]
+    b = fused[0]
+    assert b["score"] == 0.8 and b["bm25_score"] == 7.0
+    assert b["fusion_score"] == round(1 / (RRF_K + 2) + 1 / (RRF_K + 1), 6)
+    assert fused[1]["fusion_score"] == round(1 / (RRF_K + 1), 6)
+
+
+def test_fuse_of_empty_lists_is_empty():
+    assert HybridRetriever.fuse([], []) == []
+
+
+def _retriever(skip_margin):
+    return HybridRetriever(skip_margin=skip_margin, load=False, indexes=object())
+
+
+def test_clear_winner_needs_the_skip_margin():
+    retriever = _retriever(0.25)
+    assert retriever._is_clear_winner([{"fusion_score": 1.0}, {"fusion_score": 0.7}])
+    assert not retriever._is_clear_winner([{"fusion_score": 1.0}, {"fusion_score": 0.8}])
+    assert retriever._is_clear_winner([{"fusion_score": 0.5}])
+
+
+def test_no_skip_margin_always_reranks():
+    retriever = _retriever(None)
+    assert not retriever._is_clear_winner([{"fusion_score": 1.0}])
@@ -0,0 +1,75 @@
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI                                  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+from fastapi.testclient import TestClient                    # noqa: E402
+
+from api.main import _GZipExceptStreams                       # noqa: E402
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(_GZipExceptStreams, minimum_size=1024)
+
+    @app.get("/big")
+    def big():
+        return JSONResponse({"text": "x" * 5000})
+
+    @app.get("/small")
+    def small():
+        return JSONResponse({"ok": True})
+
+    @app.get("/batch")
+    def batch():
+        lines = (json.dumps({"i": i, "answer": "y" * 500}) + "\n" for i in range(10))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse((f"data: {'z' * 500}\n\n" for _ in range(10)),
+                                 media_type="text/event-stream")
+
+    @app.get("/chunks")
+    def chunks():
+        return StreamingResponse((b"w" * 800 for _ in range(5)), media_type="text/plain")
+
+    return TestClient(app)
+
+
+def _get(client, path):
+    # raw bytes as sent, without the client's transparent decompression
+    with client.stream("GET", path, headers={"Accept-Encoding": "gzip"}) as r:
+        return r, b"".join(r.iter_raw())
+
+
+def test_large_json_is_compressed():
+    r, raw = _get(_app(), "/big")
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) == len(raw)
+    assert json.loads(gzip.decompress(raw)) == {"text": "x" * 5000}
+
+
+def test_small_json_is_left_alone():
+    r, raw = _get(_app(), "/small")
+    assert "content-encoding" not in r.headers
+    assert json.loads(raw) == {"ok": True}
+
+
+@pytest.mark.parametrize("path", ["/batch", "/events"])
+def test_streamed_media_types_are_never_compressed(path):
+    r, raw = _get(_app(), path)
+    assert "content-encoding" not in r.headers
+    assert len(raw) > 1024
+
+
+def test_other_streams_are_compressed_chunk_by_chunk():
+    r, raw = _get(_app(), "/chunks")
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert gzip.decompress(raw) == b"w" * 4000
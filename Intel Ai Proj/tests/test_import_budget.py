@@ -0,0 +1,31 @@
+"""
+Import-time budget of the service entry points (see benchmarks/import_budget.py).
+
+Each entry point is imported in a fresh interpreter; it must stay under its
+budget and must not pull in torch, transformers, sentence-transformers,
+chromadb or llama-cpp. Set IMPORT_BUDGET_SCALE (e.g. 2.0) on slow CI hosts.
+"""
+import importlib.util
+import os
+
+import pytest
+
+from benchmarks.import_budget import ENTRY_POINTS, measure
+
+SCALE = float(os.environ.get("IMPORT_BUDGET_SCALE", "1.0"))
+
+
+def _needs_fastapi(module):
+    return module.startswith("api.") and importlib.util.find_spec("fastapi") is None
+
+
+@pytest.mark.parametrize("module,budget", sorted(ENTRY_POINTS.items()))
+def test_entry_point_imports_fast_and_light(module, budget):
+    if _needs_fastapi(module):
+        pytest.skip("fastapi is not installed")
+    res = measure(module)
+    assert "error" not in res, res.get("error")
+    assert not res["heavy"], f"{module} imports {', '.join(res['heavy'])} at import time"
+    assert res["seconds"] <= budget * SCALE, (
+        f"{module} took {res['seconds']:.3f}s to import (budget {budget * SCALE:.2f}s)"
+    )
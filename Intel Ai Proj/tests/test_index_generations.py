@@ -0,0 +1,88 @@
+import os
+
+from retrieval.index_generations import IndexGenerations
+
+CHUNKS = [{"source": "a.pdf", "page": 1, "chunk_index": 0, "text": "hello"}]
+
+
+def _build(indexes):
+    gen = indexes.new_generation(chroma=False)
+    gen.build_chunks(CHUNKS)
+    return gen
+
+
+def test_publish_swaps_generations_and_collects_after_last_reader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # generation 0 lives in the working directory
+    indexes = IndexGenerations("idx")
+    g1 = _build(indexes)
+    indexes.publish(g1)
+    assert indexes.current() is g1
+
+    with indexes.acquire() as pinned:
+        g2 = _build(indexes)
+        indexes.publish(g2)
+        assert indexes.current() is g2
+        assert pinned is g1 and os.path.isdir(g1.directory)   # still being read
+        assert indexes.stats()["retired_pending"] == [g1.gen_id]
+
+    assert not os.path.exists(g1.directory)
+    assert indexes.stats()["retired_pending"] == []
+
+
+def test_a_new_manager_serves_the_published_generation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    indexes = IndexGenerations("idx")
+    gen = _build(indexes)
+    indexes.publish(gen)
+    leftover = _build(indexes)   # a build that never got published
+    indexes._lease_file.close()  # its process crashed: the lease lock is released
+    indexes._lease_file = None
+
+    reopened = IndexGenerations("idx")
+    assert reopened.current().gen_id == gen.gen_id
+    assert reopened.current().chunk_store.count() == 1
+    assert not os.path.exists(leftover.directory)
+
+
+def test_another_process_build_in_progress_is_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    builder = IndexGenerations("idx")
+    building = _build(builder)
+
+    IndexGenerations("idx")   # e.g. the API starting during an ingest
+
+    assert os.path.isdir(building.directory)
+
+
+def test_serving_process_keeps_its_generation_and_follows_the_pointer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cli = IndexGenerations("idx")
+    g1 = _build(cli)
+    cli.publish(g1)
+    api = IndexGenerations("idx")
+    assert api.current().gen_id == g1.gen_id
+
+    g2 = _build(cli)
+    cli.publish(g2)   # another process publishes: the API still serves g1
+    assert os.path.isdir(g1.directory)
+    assert api.current().gen_id == g1.gen_id
+
+    with api.acquire() as gen:
+        assert gen.gen_id == g2.gen_id
+        assert gen.chunk_store.count() == 1
+    assert not os.path.exists(g1.directory)   # last user gone
+    assert api.stats()["followed"] == 1
+
+
+def test_sharded_generation_leaves_bm25_to_the_shard_workers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    indexes = IndexGenerations("idx")
+    gen = _build(indexes)
+    os.makedirs(os.path.join(gen.directory, "shards"))
+    with open(os.path.join(gen.directory, "shards", "shards.json"), "w") as f:
+        f.write('{"shards": 2}')
+    indexes.publish(gen)
+
+    assert gen.sharded
+    assert indexes.load_bm25()
+    assert gen.bm25_store.bm25 is None
@@ -0,0 +1,54 @@
+import pytest
+
+from monitoring.metrics import Counter, Gauge, Histogram, Registry, _Metric
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("x", "help", registry=None)
+
+
+def test_counter_and_gauge_render_prometheus_text():
+    registry = Registry()
+    hits = Counter("hits_total", "Hits.", ("cache",), registry=registry)
+    depth = Gauge("depth", "Depth.", registry=registry)
+    hits.inc(cache="rerank")
+    hits.inc(2, cache="rerank")
+    hits.inc(cache='gen"q')
+    depth.set(3)
+
+    text = registry.render()
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{cache="rerank"} 3' in text
+    assert 'hits_total{cache="gen\\"q"} 1' in text
+    assert "depth 3" in text
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    gauge = Gauge("g", "G.", registry=None)
+    value = [1]
+    gauge.set_function(lambda: value[0])
+    value[0] = 7
+    assert gauge.samples() == ["g 7"]
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram("lat", "Latency.", ("stage",), buckets=(0.1, 1.0), registry=None)
+    for v in (0.05, 0.5, 0.5, 5.0):
+        hist.observe(v, stage="ocr")
+
+    samples = hist.samples()
+    assert 'lat_bucket{stage="ocr",le="0.1"} 1' in samples
+    assert 'lat_bucket{stage="ocr",le="1"} 3' in samples
+    assert 'lat_bucket{stage="ocr",le="+Inf"} 4' in samples
+    assert 'lat_count{stage="ocr"} 4' in samples
+    assert 'lat_sum{stage="ocr"} 6.05' in samples
+
+
+def test_wrong_labels_and_duplicate_names_are_rejected():
+    registry = Registry()
+    counter = Counter("c", "C.", ("cache",), registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc(stage="x")
+    with pytest.raises(ValueError):
+        Counter("c", "C again.", registry=registry)
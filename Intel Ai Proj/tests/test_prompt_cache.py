@@ -0,0 +1,43 @@
+from generation.prompt_cache import PrefixKVCache
+
+
+class _FakeLlama:
+    """Just enough of llama_cpp.Llama for the prefix cache."""
+
+    def __init__(self):
+        self._input_ids = []
+        self.loads = 0
+
+    def tokenize(self, text, special=False):
+        return list(text)
+
+    def reset(self):
+        self._input_ids = []
+
+    def eval(self, tokens):
+        self._input_ids = self._input_ids + list(tokens)
+
+    def save_state(self):
+        return list(self._input_ids)
+
+    def load_state(self, state):
+        self.loads += 1
+        self._input_ids = list(state)
+
+
+def test_only_restores_count_as_saved_work():
+    llm = _FakeLlama()
+    cache = PrefixKVCache(llm, "sys")
+    cache.warm()
+    cache.prefix_eval_seconds = 0.2
+
+    assert cache.prepare() == 0.0           # prefix still resident after warm()
+    llm.eval(list("context"))
+    assert cache.prepare() == 0.0           # resident prefix + an old suffix
+    llm.reset()
+    assert cache.prepare() == 0.2           # evicted: restored from the snapshot
+
+    stats = cache.stats()
+    assert (stats["requests"], stats["resident_hits"], stats["restores"]) == (3, 2, 1)
+    assert stats["est_saved_ms_total"] == 200.0
+    assert llm.loads == 1
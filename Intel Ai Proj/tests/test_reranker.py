@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from retrieval.reranker import RerankBatcher, RerankCache, chunk_key, normalize_query
+
+
+class FakeCrossEncoder:
+    """Scores a pair by its chunk length; records every predict() call."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def predict(self, pairs, batch_size=32):
+        self.calls.append(list(pairs))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [float(len(chunk)) for _, chunk in pairs]
+
+
+def test_normalize_query():
+    assert normalize_query("  What   IS this?? ") == "what is this"
+
+
+def test_chunk_key_changes_with_content():
+    a = {"source": "doc.pdf", "chunk_index": 3, "text": "old text"}
+    b = dict(a, text="new text")
+    assert chunk_key(a).startswith("doc.pdf#3:")
+    assert chunk_key(a) != chunk_key(b)
+
+
+def test_cache_is_lru_bounded():
+    cache = RerankCache(max_size=2)
+    cache.put(("q", "a", "m"), 1.0)
+    cache.put(("q", "b", "m"), 2.0)
+    assert cache.get(("q", "a", "m")) == 1.0      # a is now most recent
+    cache.put(("q", "c", "m"), 3.0)               # evicts b
+
+    assert cache.get(("q", "b", "m")) is None
+    assert cache.get(("q", "c", "m")) == 3.0
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_batcher_returns_scores_in_caller_order():
+    model = FakeCrossEncoder()
+    batcher = RerankBatcher(model, window_ms=1)
+    pairs = [("q", "xxx"), ("q", "x"), ("q", "xx")]
+
+    assert batcher.predict(pairs) == [3.0, 1.0, 2.0]
+    assert model.calls == [[("q", "x"), ("q", "xx"), ("q", "xxx")]]   # length-sorted
+    assert batcher.predict([]) == []
+
+
+def test_batcher_coalesces_concurrent_callers():
+    model = FakeCrossEncoder()
+    batcher = RerankBatcher(model, window_ms=200)
+    results = {}
+
+    def call(i):
+        results[i] = batcher.predict([("q", "x" * (i + 1))])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: [float(i + 1)] for i in range(4)}
+    assert batcher.coalesced_requests == 4
+    assert batcher.passes < 4
+
+
+def test_batcher_propagates_model_errors():
+    batcher = RerankBatcher(FakeCrossEncoder(fail=True), window_ms=1)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        batcher.predict([("q", "x")])
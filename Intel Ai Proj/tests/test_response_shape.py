@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("fastapi")
+from pydantic import ValidationError
+
+from api.routes.query_routes import QueryRequest
+
+
+SOURCE = {"chunk_id": "abc", "text": "The exam date is 12 May 2024.", "page": 1}
+
+
+def test_snippet_chars_cuts_source_text():
+    body = QueryRequest(query="exam date", snippet_chars=8)
+    assert body.apply([SOURCE])[0]["text"] == "The exam…"
+
+
+@pytest.mark.parametrize("chars", [0, -5])
+def test_snippet_chars_must_be_positive(chars):
+    with pytest.raises(ValidationError):
+        QueryRequest(query="exam date", snippet_chars=chars)
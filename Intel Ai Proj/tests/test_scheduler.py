@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from generation.scheduler import DeadlineExceededError, GenerationScheduler, QueueFullError
+
+
+def _blocker(scheduler):
+    """Occupy the single worker until the returned event is set."""
+    release, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    threading.Thread(target=scheduler.submit, args=(hold,), daemon=True).start()
+    started.wait(5)
+    return release
+
+
+def test_submit_returns_result_and_raises_errors():
+    scheduler = GenerationScheduler()
+    assert scheduler.submit(lambda: 42) == 42
+    with pytest.raises(ValueError):
+        scheduler.submit(lambda: (_ for _ in ()).throw(ValueError("boom")))
+    stats = scheduler.stats()
+    assert (stats["completed"], stats["failed"], stats["queue_depth"]) == (1, 1, 0)
+
+
+def test_identical_keys_in_flight_share_one_run():
+    scheduler = GenerationScheduler()
+    release = _blocker(scheduler)
+    runs, results = [], []
+
+    def generate():
+        runs.append(1)
+        return "answer"
+
+    callers = [threading.Thread(target=lambda: results.append(scheduler.submit(generate, key="q")))
+               for _ in range(3)]
+    for t in callers:
+        t.start()
+    while scheduler.stats()["coalesced"] < 2:
+        time.sleep(0.01)
+    release.set()
+    for t in callers:
+        t.join(5)
+
+    assert results == ["answer"] * 3
+    assert len(runs) == 1
+
+
+def test_full_queue_rejects_immediately():
+    scheduler = GenerationScheduler(max_depth=1)
+    release = _blocker(scheduler)
+    try:
+        with pytest.raises(QueueFullError):
+            scheduler.submit(lambda: None)
+        assert scheduler.at_capacity()
+    finally:
+        release.set()
+
+
+def test_job_past_its_deadline_is_not_run():
+    scheduler = GenerationScheduler()
+    release = _blocker(scheduler)
+    ran = []
+    with pytest.raises(DeadlineExceededError):
+        scheduler.submit(lambda: ran.append(1), deadline_s=0.05)
+    release.set()
+    scheduler.submit(lambda: None)   # the expired job is drained first
+    assert ran == []
+    assert scheduler.stats()["expired"] == 1
+
+
+def test_stream_yields_items_in_order():
+    scheduler = GenerationScheduler()
+    assert list(scheduler.stream(lambda: iter(["a", "b", "c"]))) == ["a", "b", "c"]
+
+
+def test_submit_batch_reports_every_call():
+    scheduler = GenerationScheduler(max_depth=2)
+
+    def fail():
+        raise RuntimeError("bad")
+
+    calls = [(lambda i=i: i * 10, None) for i in range(5)] + [(fail, None), (lambda: 0, 0)]
+    results = {i: (result, error) for i, result, error in scheduler.submit_batch(calls)}
+
+    assert {i: results[i][0] for i in range(5)} == {i: i * 10 for i in range(5)}
+    assert isinstance(results[5][1], RuntimeError)
+    assert results[6] == (0, None)
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("rank_bm25")
+
+from retrieval.bm25_store import BM25Store
+from retrieval.chunk_store import ChunkStore
+from retrieval.mmap_vector_store import MmapVectorStore
+from retrieval.shards import ShardPool, ShardUnavailableError, shard_count, write_shards
+
+
+WORDS = "exam ticket hackathon prize venue report budget schedule team award".split()
+QUERIES = ["exam ticket", "hackathon prize award", "budget schedule", "venue"]
+
+
+@pytest.fixture(scope="module")
+def generation(tmp_path_factory):
+    """An unsharded generation (vectors + BM25) and the same one split in 3 shards."""
+    gen_dir = str(tmp_path_factory.mktemp("g1"))
+    rng = np.random.default_rng(7)
+    chunks = [
+        {"source": f"doc{d}.pdf", "page": 1, "chunk_index": i,
+         "text": " ".join(rng.choice(WORDS, size=12))}
+        for d in range(8) for i in range(6)
+    ]
+    chunk_store = ChunkStore(f"{gen_dir}/chunks.db")
+    ids = chunk_store.add(chunks)
+    vectors = rng.normal(size=(len(ids), 8)).astype(np.float32)
+    MmapVectorStore.write(gen_dir, vectors, ids)
+    bm25 = BM25Store(f"{gen_dir}/bm25_index.pkl")
+    bm25.build(chunks)
+    write_shards(gen_dir, 3, vectors, ids, bm25)
+
+    dense = MmapVectorStore(gen_dir, None, chunk_store)
+    embeddings = rng.normal(size=(len(QUERIES), 8)).astype(np.float32)
+    pool = ShardPool(gen_dir, chunk_store.path, n_threads=1)
+    pool.start()
+    yield gen_dir, dense, bm25, embeddings, pool
+    pool.close()
+
+
+def _ranked(results, score):
+    return [[(r["chunk_id"], round(r[score], 4)) for r in q] for q in results]
+
+
+def test_sharded_search_matches_the_unsharded_generation(generation):
+    gen_dir, dense, bm25, embeddings, pool = generation
+    assert shard_count(gen_dir) == 3
+
+    for sources in (None, [["doc1.pdf", "doc4.pdf"], None, ["doc2.pdf"], ["doc7.pdf"]]):
+        shard_dense, shard_bm25 = pool.search_batch(QUERIES, embeddings, 5, 5, sources)
+        assert _ranked(shard_dense, "score") == _ranked(
+            dense.search_batch(QUERIES, 5, embeddings=embeddings, sources=sources), "score")
+        # global IDF / avgdl: every shard row scores as it would unsharded
+        assert _ranked(shard_bm25, "bm25_score") == _ranked(
+            bm25.search_batch(QUERIES, 5, sources=sources), "bm25_score")
+
+
+def test_a_worker_dying_mid_search_fails_fast_and_is_restarted(generation):
+    _, _, _, embeddings, pool = generation
+    ensure_alive = pool._ensure_alive
+
+    def kill_after_check():
+        ensure_alive()
+        pool._shards[1].process.kill()
+        pool._shards[1].process.join()
+
+    pool._ensure_alive = kill_after_check
+    start = time.monotonic()
+    with pytest.raises(ShardUnavailableError, match="died mid-search"):
+        pool.search_batch(QUERIES, embeddings, 5, 5)
+    assert time.monotonic() - start < 5
+    del pool._ensure_alive
+
+    dense, _ = pool.search_batch(QUERIES, embeddings, 5, 5)
+    assert all(len(d) == 5 for d in dense)
+    assert pool.stats()["restarts"] == 1
@@ -0,0 +1,50 @@
+import time
+
+from generation.summarizer import SummaryBuilder, SummaryStore
+
+
+def _pages(text, source="doc.pdf", n=2):
+    return [{"page": i + 1, "text": f"{text} page {i + 1}", "source": source} for i in range(n)]
+
+
+def _wait(builder):
+    deadline = time.time() + 5
+    while builder.pending and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def _builder(tmp_path, served):
+    calls = []
+
+    def summarize(instruction, parts, max_tokens):
+        calls.append(instruction)
+        return " / ".join(p["text"] for p in parts)
+
+    store = SummaryStore(str(tmp_path / "summaries.json"))
+    return SummaryBuilder(summarize, store, fingerprint=served.get), calls
+
+
+def test_summary_is_served_only_for_the_indexed_text(tmp_path):
+    served = {"doc.pdf": "v1"}
+    builder, _ = _builder(tmp_path, served)
+
+    assert builder.schedule(_pages("old"))
+    _wait(builder)
+    assert builder.current("doc.pdf", "v1")["document"].startswith("old page 1")
+
+    # the same name re-uploaded with new content: the old summary is stale at once
+    served["doc.pdf"] = "v2"
+    assert builder.current("doc.pdf", "v2") is None
+
+
+def test_unchanged_reupload_keeps_summary_without_regenerating(tmp_path):
+    served = {"doc.pdf": "v1"}
+    builder, calls = _builder(tmp_path, served)
+    builder.schedule(_pages("same"))
+    _wait(builder)
+    n_calls = len(calls)
+
+    served["doc.pdf"] = "v1-rebuilt"   # new index generation, same text
+    assert not builder.schedule(_pages("same"))
+    assert len(calls) == n_calls
+    assert builder.current("doc.pdf", "v1-rebuilt") is not None
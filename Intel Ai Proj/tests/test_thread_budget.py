@@ -0,0 +1,75 @@
+import sys
+import threading
+import types
+
+import pytest
+
+from runtime import thread_budget
+from runtime.thread_budget import ThreadBudget, _parse_caps, set_llama_threads
+
+
+def test_a_side_running_alone_gets_every_core():
+    budget = ThreadBudget(total=8)
+    with budget.task("query"):
+        assert budget.threads("llm") == 8
+        assert budget.threads("torch") == 8
+
+
+def test_ingest_share_splits_cores_when_both_sides_run():
+    budget = ThreadBudget(total=8, ingest_share=0.25)
+    with budget.task("query"), budget.task("ingest"):
+        assert budget.cores("ingest") == 2
+        assert budget.cores("query") == 6
+        assert budget.threads("torch") == 2   # the ingest side owns torch while it runs
+    assert budget.stats()["active"] == {"query": 0, "ingest": 0}
+
+
+def test_concurrent_tasks_split_their_side_and_caps_apply():
+    budget = ThreadBudget(total=8, caps={"embed": 3})
+    with budget.task("query"), budget.task("query"):
+        assert budget.threads("llm") == 4
+    with budget.task("ingest"):
+        assert budget.threads("embed") == 3
+
+
+def test_disabled_budget_hands_out_every_core():
+    budget = ThreadBudget(total=8, caps={"llm": 2}, enabled=False)
+    with budget.task("query"), budget.task("ingest"):
+        assert budget.threads("llm") == 8
+
+
+def test_bad_side_and_cap_names_are_rejected():
+    with pytest.raises(ValueError):
+        with ThreadBudget(total=2).task("upload"):
+            pass
+    with pytest.raises(ValueError):
+        _parse_caps("gpu=2")
+    assert _parse_caps("llm=8, ocr=0") == {"llm": 8, "ocr": 1}
+
+
+def test_apply_torch_sizes_each_calling_thread(monkeypatch):
+    calls = []
+    torch = types.SimpleNamespace(
+        set_num_threads=lambda n: calls.append((threading.current_thread().name, n)))
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    budget = ThreadBudget(total=4)
+
+    budget.apply_torch()
+    budget.apply_torch()   # unchanged on this thread: no call
+    worker = threading.Thread(target=budget.apply_torch, name="batcher")
+    worker.start()
+    worker.join()
+
+    assert calls == [("MainThread", 4), ("batcher", 4)]
+
+
+def test_set_llama_threads_warns_once_when_unsupported(monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, "llama_cpp", None)   # import fails
+    monkeypatch.setattr(thread_budget, "_llama_threads_warned", False)
+    llm = types.SimpleNamespace(n_threads=8)
+
+    set_llama_threads(llm, 4)
+    set_llama_threads(llm, 2)
+
+    assert capsys.readouterr().out.count("Cannot retarget llama.cpp threads") == 1
+    assert llm.n_threads == 8
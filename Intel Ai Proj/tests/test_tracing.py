@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from monitoring import tracing
+from monitoring.tracing import DebugSession, bind, current_span, span, traced
+
+
+def _names(node):
+    return [node["name"]] + [n for child in node.get("children", []) for n in _names(child)]
+
+
+def test_spans_are_inert_outside_a_trace():
+    with span("rerank") as s:
+        s.set(pairs=3)
+    assert current_span() is tracing.NULL_SPAN
+    with DebugSession("query") as dbg:
+        with span("inner"):
+            pass
+    assert dbg.report() is None
+
+
+def test_trace_records_nested_spans_and_attributes():
+    @traced("generate")
+    def generate():
+        current_span().set(tokens=12)
+
+    with DebugSession("query", "trace") as dbg:
+        with span("retrieve", top_k=5) as s:
+            s.set(candidates=30)
+        generate()
+
+    report = dbg.report()
+    tree = report["trace"]
+    assert _names(tree) == ["query", "retrieve", "generate"]
+    retrieve, gen = tree["children"]
+    assert retrieve["attrs"] == {"top_k": 5, "candidates": 30}
+    assert gen["attrs"] == {"tokens": 12}
+    assert tree["duration_ms"] >= retrieve["duration_ms"]
+
+
+def test_bind_keeps_the_parent_span_on_another_thread():
+    with DebugSession("query", "trace") as dbg:
+        def work():
+            with span("on_worker"):
+                pass
+        t = threading.Thread(target=bind(work))
+        t.start()
+        t.join()
+    assert _names(dbg.report()["trace"]) == ["query", "on_worker"]
+
+
+def test_profile_mode_writes_folded_stacks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with DebugSession("query", "profile") as dbg:
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            pass
+    report = dbg.report()
+    assert report["samples"] > 0
+    lines = (tmp_path / report["profile"]).read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_unknown_debug_mode_is_rejected():
+    with pytest.raises(ValueError):
+        DebugSession("query", "flame")
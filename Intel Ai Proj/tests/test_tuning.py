@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+
+from runtime import autotune
+from runtime.tuning import DEFAULTS, load_tuning
+
+
+def _write(path, settings, **extra):
+    path.write_text(json.dumps({"settings": settings, **extra}), encoding="utf-8")
+    return str(path)
+
+
+def test_missing_file_gives_the_defaults(tmp_path):
+    assert load_tuning(str(tmp_path / "none.json")) == DEFAULTS
+
+
+def test_tuned_values_overlay_the_defaults(tmp_path):
+    path = _write(tmp_path / "t.json", {"embed_batch_size": 128, "ocr_dpi": "200"})
+    tuning = load_tuning(path)
+    assert tuning["embed_batch_size"] == 128
+    assert tuning["ocr_dpi"] == 200
+    assert tuning["llm_n_ctx"] == DEFAULTS["llm_n_ctx"]
+
+
+def test_unknown_and_non_positive_values_are_ignored(tmp_path):
+    path = _write(tmp_path / "t.json", {"rerank_batch_size": 0, "gpu_layers": 8})
+    assert load_tuning(path) == DEFAULTS
+
+
+def test_unreadable_file_falls_back_to_defaults(tmp_path, capsys):
+    path = tmp_path / "t.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert load_tuning(str(path)) == DEFAULTS
+    assert "unreadable" in capsys.readouterr().out
+
+
+def test_profile_from_another_host_warns(tmp_path, capsys):
+    path = _write(tmp_path / "t.json", {"llm_n_batch": 256},
+                  host={"cpu_count": (os.cpu_count() or 1) + 1})
+    assert load_tuning(path)["llm_n_batch"] == 256
+    assert "re-run python -m runtime.autotune" in capsys.readouterr().out
+
+
+def test_ocr_only_run_does_not_need_a_text_layer(tmp_path, monkeypatch):
+    def no_text(pdf_path, limit):
+        raise SystemExit(f"No text chunks in {pdf_path}")
+
+    monkeypatch.setattr(autotune, "_sample_texts", no_text)
+    monkeypatch.setattr(autotune, "tune_ocr", lambda pdf: ({"ocr_dpi": 200}, {}))
+    out = str(tmp_path / "tuning.json")
+    monkeypatch.setattr(sys, "argv", ["autotune", "scan.pdf", "--only", "ocr", "--out", out])
+
+    autotune.main()
+
+    assert load_tuning(out)["ocr_dpi"] == 200
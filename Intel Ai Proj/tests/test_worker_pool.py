@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from generation.worker_pool import LLMWorkerPool
+
+
+class _LiveProcess:
+    def is_alive(self):
+        return True
+
+
+@pytest.fixture
+def pool():
+    """One-worker pool whose worker is driven by the test instead of Phi-3."""
+    pool = LLMWorkerPool("unused.gguf", n_workers=1, threads_per_worker=1)
+    pool._results = queue.Queue()
+    w = pool._workers[0]
+    w.process, w.jobs, w.cancel = _LiveProcess(), queue.Queue(), threading.Event()
+    w.ready.set()
+    pool._idle.put(w.worker_id)
+    threading.Thread(target=pool._read_results, daemon=True).start()
+    yield pool
+    pool._closed = True
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def _start_stream(pool):
+    stream = pool.stream("prompt", {})
+    pool._results.put(("piece", 0, "a"))
+    assert next(stream) == "a"
+    assert pool._workers[0].jobs.get_nowait()[:2] == ("stream", 0)
+    return stream
+
+
+def test_closing_after_the_last_token_releases_the_worker(pool):
+    stream = _start_stream(pool)
+    pool._results.put(("end", 0, None))
+    _wait(lambda: pool._pending[0].qsize() == 1)   # delivered, never read
+
+    stream.close()
+
+    assert pool.stats()["busy"] == 0
+    assert pool._idle.get_nowait() == 0
+    assert not pool._workers[0].cancel.is_set()
+
+
+def test_closing_mid_stream_cancels_and_waits_for_the_end(pool):
+    stream = _start_stream(pool)
+
+    stream.close()
+
+    w = pool._workers[0]
+    assert w.cancel.is_set()
+    assert pool.stats()["busy"] == 1
+    pool._results.put(("end", 0, None))
+    _wait(lambda: w.current_job is None)
+    assert pool._idle.get_nowait() == 0